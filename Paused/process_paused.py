@@ -5,10 +5,16 @@ Process paused.xlsx:
 2. Add entries from Sheet5 that aren't already in Sheet6
 """
 
+import os
+import sys
+
 import pandas as pd
 import openpyxl
 from openpyxl import load_workbook
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts', 'DataProcessing'))
+from workbook_patcher import patch_sheets
+
 # File path
 file_path = '/home/cmwldaniel/Reporting/Paused/paused.xlsx'
 
@@ -165,8 +171,7 @@ print(f"\n\nFinal Sheet6 has {len(sheet6)} entries")
 
 # Write back to Excel
 print("\n\nWriting to Excel...")
-with pd.ExcelWriter(file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-    sheet6.to_excel(writer, sheet_name='Sheet6', index=False)
+patch_sheets(file_path, {'Sheet6': sheet6})
 
 print("✅ Successfully created Sheet6!")
 print(f"\nSummary:")
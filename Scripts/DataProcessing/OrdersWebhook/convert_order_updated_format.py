@@ -20,13 +20,30 @@ Author: Claude Code
 Date: October 2025
 """
 
+import numpy as np
 import pandas as pd
 import argparse
+import os
 import sys
 from datetime import datetime
 import pytz
 from pathlib import Path
 
+from schema_registry import DECLARED_SCHEMAS, REGISTRY_PATH, SchemaRegistry, detect_mapping
+
+EASTERN_TZ = 'America/New_York'
+EASTERN_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+CHUNK_SIZE = 200_000  # Input rows converted per chunk
+EMPTY_VALUES = ['nan', 'none', '']
+OUTPUT_COLUMNS = ['Datetime Created', 'Datetime Updated', 'order_id', 'updated_status']
+
+# Formats of convert_to_eastern_time not covered by pandas' ISO 8601 parser
+# (2024-01-15T15:30:00Z, 2024-01-15T15:30:00.123Z and 2024-01-15 15:30:00 are)
+NON_ISO_FORMATS = [
+    "%m/%d/%Y %H:%M:%S",            # 01/15/2024 15:30:00
+    "%m/%d/%Y, %I:%M:%S %p",        # 01/15/2024, 3:30:00 PM
+]
+
 
 def convert_to_eastern_time(utc_datetime_str):
     """
@@ -84,6 +101,70 @@ def convert_to_eastern_time(utc_datetime_str):
         return str(utc_datetime_str)
 
 
+_CLOCK_TIMES = None
+
+
+def format_eastern_time(parsed):
+    """
+    Format tz-aware timestamps as Eastern MM/DD/YYYY, HH:MM:SS AM/PM.
+
+    strftime with %I/%p runs per value in pandas, so the date part is formatted
+    once per distinct day and the time part comes from a seconds-of-day table.
+    """
+    global _CLOCK_TIMES
+    if _CLOCK_TIMES is None:
+        _CLOCK_TIMES = (pd.Timestamp('2000-01-01') + pd.to_timedelta(range(86400), unit='s')).strftime(
+            "%I:%M:%S %p").to_numpy(dtype=object)
+
+    wall = parsed.dt.tz_convert(EASTERN_TZ).dt.tz_localize(None).to_numpy()
+    days = wall.astype('datetime64[D]')
+    seconds = (wall - days).astype('timedelta64[s]').astype('int64')
+    unique_days, day_codes = np.unique(days, return_inverse=True)
+    day_text = pd.DatetimeIndex(unique_days).strftime("%m/%d/%Y").to_numpy(dtype=object)
+    return pd.Series(day_text[day_codes] + ', ' + _CLOCK_TIMES[seconds], index=parsed.index)
+
+
+def convert_series_to_eastern_time(values):
+    """
+    Vectorized convert_to_eastern_time for a whole column.
+
+    Each distinct value is parsed once: ISO 8601 first, then the other known
+    formats column-wise, then pandas' mixed-format parser for what is left.
+    Naive timestamps are treated as UTC.
+
+    Args:
+        values (pd.Series): Timestamps (strings or datetimes), no missing values
+
+    Returns:
+        tuple: (pd.Series of Eastern time strings, pd.Series of unparsed values)
+        Unparsed values are passed through unchanged, like convert_to_eastern_time.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques)
+
+    if pd.api.types.is_datetime64_any_dtype(uniques):
+        parsed = uniques if uniques.dt.tz is not None else uniques.dt.tz_localize('UTC')
+    else:
+        text = uniques.astype(str)
+        parsed = pd.to_datetime(text, format='ISO8601', utc=True, errors='coerce')
+        for fmt in NON_ISO_FORMATS:
+            remaining = parsed.isna()
+            if not remaining.any():
+                break
+            attempt = pd.to_datetime(text[remaining], format=fmt, errors='coerce')
+            parsed = parsed.fillna(attempt.dt.tz_localize('UTC'))
+        remaining = parsed.isna()
+        if remaining.any():
+            parsed = parsed.fillna(pd.to_datetime(text[remaining], format='mixed', utc=True, errors='coerce'))
+
+    valid = parsed.notna()
+    converted = uniques.astype(str).astype(object)
+    if valid.any():
+        converted[valid] = format_eastern_time(parsed[valid])
+    unparsed = uniques[parsed.isna()]
+    return pd.Series(converted.values[codes], index=values.index), unparsed
+
+
 def detect_input_format(df):
     """
     Detect the format of the input CSV and map columns to standard names.
@@ -94,171 +175,182 @@ def detect_input_format(df):
     Returns:
         dict: Mapping of standard column names to actual column names
     """
-    columns = df.columns.tolist()
-    column_mapping = {}
-
-    # Common column name variations - prioritize 4-digit Order ID over internal ID
-    order_id_variants = ['Order ID', 'Order_ID', 'order_id', 'order_number', 'id']
-    status_variants = ['status', 'updated_status', 'Status', 'order_status', 'current_status']
-    created_variants = ['created_at', 'createdAt', 'Created At', 'date_created', 'created']
-    updated_variants = ['updated_at', 'updatedAt', 'Updated At', 'date_updated', 'updated', 'modified_at']
-
-    # Special handling for Order ID - prioritize "Order ID" column if it exists
-    if 'Order ID' in columns:
-        column_mapping['order_id'] = 'Order ID'
-    elif 'Order_ID' in columns:
-        column_mapping['order_id'] = 'Order_ID'
-
-    # Find matching columns - prioritize exact matches first
-    for col in columns:
-        col_lower = col.lower().strip()
-
-        # Order ID mapping - only if not already set by special handling
-        if not column_mapping.get('order_id'):
-            for variant in order_id_variants:
-                if col_lower == variant.lower():
-                    column_mapping['order_id'] = col
-                    break
+    return detect_mapping(df.columns.tolist())
 
-            # If no exact match, check partial matches (but avoid matching internal IDs)
-            if not column_mapping.get('order_id'):
-                for variant in order_id_variants:
-                    if variant.lower() in col_lower and 'internal' not in col_lower and 'care_portals' not in col_lower:
-                        column_mapping['order_id'] = col
-                        break
-
-        # Status mapping
-        if not column_mapping.get('status'):
-            for variant in status_variants:
-                if col_lower == variant.lower() or variant.lower() in col_lower:
-                    column_mapping['status'] = col
-                    break
 
-        # Created date mapping
-        if not column_mapping.get('created_at'):
-            for variant in created_variants:
-                if col_lower == variant.lower() or variant.lower() in col_lower:
-                    column_mapping['created_at'] = col
-                    break
+def _clean_text(values):
+    """
+    Stripped text and empty mask (missing or 'nan'/'none'/''), computed once
+    per distinct value since IDs and statuses repeat heavily.
+    """
+    codes, uniques = pd.factorize(values)
+    stripped = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    empty_uniques = stripped.str.lower().isin(EMPTY_VALUES).to_numpy()
+    empty = (codes == -1) | empty_uniques[codes]
+    text = stripped.to_numpy(dtype=object)[codes]
+    return pd.Series(text, index=values.index), pd.Series(empty, index=values.index)
 
-        # Updated date mapping
-        if not column_mapping.get('updated_at'):
-            for variant in updated_variants:
-                if col_lower == variant.lower() or variant.lower() in col_lower:
-                    column_mapping['updated_at'] = col
-                    break
 
-    return column_mapping
+def convert_chunk(chunk, column_mapping, fallback_time):
+    """
+    Convert one input chunk with column operations.
 
+    Args:
+        chunk (pd.DataFrame): Input rows
+        column_mapping (dict): detect_input_format output
+        fallback_time (str): Eastern time used when created_at is missing
 
-def convert_csv_format(input_file, output_file):
+    Returns:
+        tuple: (output DataFrame, stats dict)
+    """
+    order_ids, empty_order_id = _clean_text(chunk[column_mapping['order_id']])
+    statuses, empty_status = _clean_text(chunk[column_mapping['status']])
+    empty_status = ~empty_order_id & empty_status
+    keep = ~(empty_order_id | empty_status)
+    rows = chunk[keep]
+
+    unparsed = []
+    created = pd.Series(fallback_time, index=rows.index, dtype=object)
+    if 'created_at' in column_mapping:
+        values = rows[column_mapping['created_at']]
+        present = values.notna()
+        if present.any():
+            converted, failed = convert_series_to_eastern_time(values[present])
+            created[present] = converted
+            unparsed.append(failed)
+
+    updated = created.copy()
+    if 'updated_at' in column_mapping:
+        values = rows[column_mapping['updated_at']]
+        present = values.notna()
+        if present.any():
+            converted, failed = convert_series_to_eastern_time(values[present])
+            updated[present] = converted
+            unparsed.append(failed)
+
+    output = pd.DataFrame({
+        'Datetime Created': created,
+        'Datetime Updated': updated,
+        'order_id': order_ids[keep],
+        'updated_status': statuses[keep],
+    }, columns=OUTPUT_COLUMNS)
+
+    stats = {
+        'empty_order_id': chunk.index[empty_order_id].tolist(),
+        'empty_status': chunk.index[empty_status].tolist(),
+        'unparsed': pd.concat(unparsed).unique().tolist() if unparsed else [],
+    }
+    return output, stats
+
+
+def _row_numbers(indexes, limit=10):
+    numbers = ', '.join(str(index + 1) for index in indexes[:limit])
+    return numbers + (f", ... ({len(indexes)} total)" if len(indexes) > limit else '')
+
+
+def convert_csv_format(input_file, output_file, chunksize=CHUNK_SIZE, registry=None, schema=None, strict=False):
     """
     Convert CSV from CarePortals_Orders format to order.updated webhook format.
 
+    The input is read and converted in chunks with column operations, so
+    memory stays bounded by the chunk size. Output is written to a
+    temporary file and moved into place once every chunk succeeded.
+
+    The column mapping is resolved from the first chunk by the schema
+    registry (declared layout, cached header fingerprint, or detection) and
+    its dtypes are validated before any row is converted.
+
     Args:
         input_file (str): Path to input CSV file
         output_file (str): Path to output CSV file
+        chunksize (int): Input rows per chunk
+        registry (SchemaRegistry): Registry to resolve the header with
+            (default: in-memory registry, nothing cached on disk)
+        schema (str): Force a declared layout by name
+        strict (bool): Fail on unknown/ambiguous headers, schema drift and dtype errors
 
     Returns:
         dict: Conversion summary statistics
     """
+    partial_file = f"{output_file}.partial"
+    if registry is None:
+        registry = SchemaRegistry(path=None)
     try:
-        # Read input CSV
+        # Read input CSV (IDs and statuses as text, so 1234 never turns into 1234.0)
         print(f"Reading input file: {input_file}")
-        df = pd.read_csv(input_file)
-
-        if df.empty:
+        reader = pd.read_csv(input_file, dtype=str, chunksize=chunksize)
+
+        input_rows = 0
+        output_rows = 0
+        chunks = 0
+        column_mapping = None
+        empty_order_id = []
+        empty_status = []
+        unparsed = set()
+        # Current Eastern time as fallback, computed once for the whole file
+        fallback_time = datetime.now(pytz.timezone(EASTERN_TZ)).strftime(EASTERN_FORMAT)
+
+        for chunk in reader:
+            if column_mapping is None:
+                print(f"Input columns: {list(chunk.columns)}")
+
+                # Resolve and validate column mapping
+                resolved = registry.resolve(chunk, schema=schema, strict=strict)
+                column_mapping = resolved['mapping']
+                print(f"Schema: {resolved['schema'] or 'undeclared'} ({resolved['source']}, "
+                      f"header {resolved['fingerprint'][:12]})")
+                print(f"Detected column mapping: {column_mapping}")
+                for warning in resolved['warnings']:
+                    print(f"Warning: {warning}")
+
+            output_df, stats = convert_chunk(chunk, column_mapping, fallback_time)
+            output_df.to_csv(partial_file, mode='w' if chunks == 0 else 'a', header=chunks == 0, index=False)
+
+            chunks += 1
+            input_rows += len(chunk)
+            output_rows += len(output_df)
+            empty_order_id += stats['empty_order_id']
+            empty_status += stats['empty_status']
+            unparsed.update(stats['unparsed'])
+
+        if input_rows == 0:
             raise ValueError("Input CSV file is empty")
 
-        print(f"Found {len(df)} rows in input file")
-        print(f"Input columns: {list(df.columns)}")
-
-        # Detect column mapping
-        column_mapping = detect_input_format(df)
-        print(f"Detected column mapping: {column_mapping}")
-
-        # Validate required columns
-        required_fields = ['order_id', 'status']
-        missing_fields = []
-
-        for field in required_fields:
-            if field not in column_mapping:
-                missing_fields.append(field)
-
-        if missing_fields:
-            raise ValueError(f"Could not find required columns: {missing_fields}. "
-                           f"Available columns: {list(df.columns)}")
-
-        # Create output dataframe
-        output_data = []
-
-        for index, row in df.iterrows():
-            try:
-                # Extract data using column mapping
-                order_id = str(row[column_mapping['order_id']]).strip()
-                status = str(row[column_mapping['status']]).strip()
-
-                # Handle created_at - use current time if not available
-                if 'created_at' in column_mapping and pd.notna(row[column_mapping['created_at']]):
-                    created_at_eastern = convert_to_eastern_time(row[column_mapping['created_at']])
-                else:
-                    # Use current Eastern time as fallback
-                    current_eastern = datetime.now(pytz.timezone('America/New_York'))
-                    created_at_eastern = current_eastern.strftime("%m/%d/%Y, %I:%M:%S %p")
-
-                # Handle updated_at - use created_at if not available
-                if 'updated_at' in column_mapping and pd.notna(row[column_mapping['updated_at']]):
-                    updated_at_eastern = convert_to_eastern_time(row[column_mapping['updated_at']])
-                else:
-                    updated_at_eastern = created_at_eastern
-
-                # Skip empty order IDs
-                if not order_id or order_id.lower() in ['nan', 'none', '']:
-                    print(f"Warning: Skipping row {index + 1} - empty order_id")
-                    continue
-
-                # Skip empty statuses
-                if not status or status.lower() in ['nan', 'none', '']:
-                    print(f"Warning: Skipping row {index + 1} - empty status")
-                    continue
-
-                # Create output row
-                output_row = {
-                    'Datetime Created': created_at_eastern,
-                    'Datetime Updated': updated_at_eastern,
-                    'order_id': order_id,
-                    'updated_status': status
-                }
-
-                output_data.append(output_row)
+        print(f"Found {input_rows} rows in input file")
+        if empty_order_id:
+            print(f"Warning: Skipping rows {_row_numbers(empty_order_id)} - empty order_id")
+        if empty_status:
+            print(f"Warning: Skipping rows {_row_numbers(empty_status)} - empty status")
+        if unparsed:
+            sample = sorted(unparsed, key=str)[:5]
+            print(f"Warning: Could not convert {len(unparsed)} distinct datetime values (kept as-is): {sample}")
 
-            except Exception as e:
-                print(f"Warning: Error processing row {index + 1}: {e}")
-                continue
-
-        if not output_data:
+        if output_rows == 0:
             raise ValueError("No valid rows were converted. Check your input data format.")
 
-        # Create output DataFrame
-        output_df = pd.DataFrame(output_data)
-
         # Write output CSV
         print(f"Writing output file: {output_file}")
-        output_df.to_csv(output_file, index=False)
+        os.replace(partial_file, output_file)
 
         # Summary statistics
         summary = {
-            'input_rows': len(df),
-            'output_rows': len(output_df),
-            'skipped_rows': len(df) - len(output_df),
+            'input_rows': input_rows,
+            'output_rows': output_rows,
+            'skipped_rows': input_rows - output_rows,
             'input_file': input_file,
             'output_file': output_file,
-            'column_mapping': column_mapping
+            'column_mapping': column_mapping,
+            'schema': resolved['schema'],
+            'schema_source': resolved['source'],
+            'chunks': chunks,
+            'unparsed_datetimes': len(unparsed),
         }
 
         return summary
 
     except Exception as e:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
         raise Exception(f"Error converting CSV format: {e}")
 
 
@@ -271,6 +363,8 @@ def main():
 Examples:
   python convert_order_updated_format.py input.csv output.csv
   python convert_order_updated_format.py /path/to/orders.csv ./webhook_format.csv
+  python convert_order_updated_format.py export.csv output.csv --strict
+  python convert_order_updated_format.py export.csv output.csv --schema careportals_orders.order.updated
 
 Input CSV should contain columns for:
   - order_id (required): Order identifier
@@ -290,6 +384,16 @@ Output CSV will contain:
     parser.add_argument('output_file', help='Path to output CSV file')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Enable verbose output')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE,
+                       help=f'Input rows converted per chunk (default: {CHUNK_SIZE})')
+    parser.add_argument('--schema', choices=sorted(DECLARED_SCHEMAS),
+                       help='Force a declared input layout instead of resolving the header')
+    parser.add_argument('--strict', action='store_true',
+                       help='Fail on unknown or ambiguous headers, schema drift and invalid dtypes')
+    parser.add_argument('--registry', default=str(REGISTRY_PATH),
+                       help=f'Header fingerprint cache file (default: {REGISTRY_PATH.name})')
+    parser.add_argument('--no-registry', action='store_true',
+                       help='Do not read or update the header fingerprint cache')
 
     args = parser.parse_args()
 
@@ -309,7 +413,10 @@ Output CSV will contain:
 
     try:
         # Convert the file
-        summary = convert_csv_format(args.input_file, args.output_file)
+        registry = SchemaRegistry(path=None if args.no_registry else args.registry)
+        summary = convert_csv_format(args.input_file, args.output_file, args.chunksize,
+                                     registry=registry, schema=args.schema, strict=args.strict)
+        registry.save()
 
         # Print summary
         print("\n" + "="*50)
@@ -322,6 +429,9 @@ Output CSV will contain:
         print(f"Skipped rows:   {summary['skipped_rows']}")
 
         if args.verbose:
+            print(f"Chunks:         {summary['chunks']}")
+            print(f"Unparsed dates: {summary['unparsed_datetimes']}")
+            print(f"Schema:         {summary['schema'] or 'undeclared'} ({summary['schema_source']})")
             print(f"\nColumn mapping used:")
             for key, value in summary['column_mapping'].items():
                 print(f"  {key} -> {value}")
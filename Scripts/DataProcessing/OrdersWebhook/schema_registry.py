@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Header-signature schema registry for order.updated conversions.
+
+Resolves the column mapping of an input CSV once per header layout:
+- the header is fingerprinted (SHA-1 of the stripped column names, in order)
+- known CarePortals / Sheets export layouts have declared mappings
+- other headers go through the variant-based detection, and the result is
+  cached by fingerprint in a JSON file, so later files with the same header
+  skip detection entirely
+- the first rows are validated against the expected dtypes (numeric order IDs,
+  parseable timestamps) before anything is converted
+
+With strict=True, unknown headers, ambiguous detections (several columns
+matching one field), headers that look like a declared layout but miss some of
+its columns, and dtype failures raise SchemaError instead of warning.
+
+Usage:
+    registry = SchemaRegistry()
+    resolved = registry.resolve(first_chunk, strict=True)
+    mapping = resolved['mapping']
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+REGISTRY_PATH = Path(__file__).resolve().parent / 'schema_registry.json'
+FIELDS = ['order_id', 'status', 'created_at', 'updated_at']
+REQUIRED_FIELDS = ['order_id', 'status']
+VALIDATION_SAMPLE = 500  # Rows checked per file
+VALID_SHARE = 0.9  # Share of non-empty sample values that must have the expected dtype
+DRIFT_SHARE = 0.5  # Share of a declared layout's columns present before a header counts as that layout
+
+# Common column name variations - prioritize 4-digit Order ID over internal ID
+FIELD_VARIANTS = {
+    'order_id': ['Order ID', 'Order_ID', 'order_id', 'order_number', 'id'],
+    'status': ['status', 'updated_status', 'Status', 'order_status', 'current_status'],
+    'created_at': ['created_at', 'createdAt', 'Created At', 'date_created', 'created'],
+    'updated_at': ['updated_at', 'updatedAt', 'Updated At', 'date_updated', 'updated', 'modified_at'],
+}
+
+# Known export layouts: field -> column, plus the dtype expected for each field
+DECLARED_SCHEMAS = {
+    'careportals_orders.order.updated': {
+        'description': 'CarePortals_Orders spreadsheet order.updated tab (raw webhook log)',
+        'signature': ['Timestamp', 'Trigger', 'ID', 'Order ID', 'Organization', 'Status', 'Customer ID',
+                      'Post Purchase Status', 'Status History', 'Created At', 'Updated At', 'Version'],
+        'mapping': {'order_id': 'Order ID', 'status': 'Status',
+                    'created_at': 'Created At', 'updated_at': 'Updated At'},
+    },
+    'database_careportals.order.updated': {
+        'description': 'Database_CarePortals order.updated tab (webhook output format)',
+        'signature': ['Datetime Created', 'Datetime Updated', 'order_id', 'updated_status'],
+        'mapping': {'order_id': 'order_id', 'status': 'updated_status',
+                    'created_at': 'Datetime Created', 'updated_at': 'Datetime Updated'},
+    },
+    'webhook.standard': {
+        'description': 'Standard order_id,status,created_at,updated_at export',
+        'signature': ['order_id', 'status', 'created_at', 'updated_at'],
+        'mapping': {'order_id': 'order_id', 'status': 'status',
+                    'created_at': 'created_at', 'updated_at': 'updated_at'},
+    },
+    'webhook.titled': {
+        'description': 'Order ID,Status,Created At,Updated At export',
+        'signature': ['Order ID', 'Status', 'Created At', 'Updated At'],
+        'mapping': {'order_id': 'Order ID', 'status': 'Status',
+                    'created_at': 'Created At', 'updated_at': 'Updated At'},
+    },
+}
+
+FIELD_DTYPES = {
+    'order_id': 'order_number',
+    'status': 'text',
+    'created_at': 'datetime',
+    'updated_at': 'datetime',
+}
+
+
+class SchemaError(ValueError):
+    """Input header or values do not match a usable schema"""
+
+
+def header_fingerprint(columns):
+    """Stable fingerprint of a CSV header (column names and order)"""
+    header = '\x1f'.join(str(column).strip() for column in columns)
+    return hashlib.sha1(header.encode('utf-8')).hexdigest()
+
+
+# ============================================================================
+# DETECTION
+# ============================================================================
+
+def _matches(field, column, partial=True):
+    col_lower = column.lower().strip()
+    for variant in FIELD_VARIANTS[field]:
+        variant = variant.lower()
+        if col_lower == variant:
+            return True
+        if partial and variant in col_lower:
+            # Avoid matching internal order IDs
+            if field != 'order_id' or ('internal' not in col_lower and 'care_portals' not in col_lower):
+                return True
+    return False
+
+
+def detect_mapping(columns):
+    """
+    Map standard field names to actual column names by name variants.
+
+    The first column matching a field wins, except that 'Order ID'/'Order_ID'
+    always win for order_id.
+
+    Args:
+        columns (list): Header column names
+
+    Returns:
+        dict: Mapping of standard column names to actual column names
+    """
+    columns = list(columns)
+    column_mapping = {}
+
+    # Special handling for Order ID - prioritize "Order ID" column if it exists
+    if 'Order ID' in columns:
+        column_mapping['order_id'] = 'Order ID'
+    elif 'Order_ID' in columns:
+        column_mapping['order_id'] = 'Order_ID'
+
+    for col in columns:
+        for field in FIELDS:
+            if not column_mapping.get(field) and _matches(field, col):
+                column_mapping[field] = col
+
+    return column_mapping
+
+
+def candidate_columns(columns):
+    """All columns matching each field (more than one means the detection guessed)"""
+    return {field: [col for col in columns if _matches(field, col)] for field in FIELDS}
+
+
+def match_declared(columns, declared=DECLARED_SCHEMAS):
+    """
+    Find the declared layout of a header.
+
+    Returns:
+        tuple: (schema name or None, missing mapped columns of the closest
+        layout when the header looks like it but is incomplete)
+    """
+    present = set(str(column).strip() for column in columns)
+    best = (None, [], 0.0)
+    for name, schema in declared.items():
+        mapped = list(schema['mapping'].values())
+        missing = [column for column in mapped if column not in present]
+        if not missing:
+            return name, []
+        overlap = len(set(schema['signature']) & present) / len(schema['signature'])
+        if overlap >= DRIFT_SHARE and overlap > best[2]:
+            best = (name, missing, overlap)
+    return (best[0], best[1]) if best[0] else (None, [])
+
+
+# ============================================================================
+# VALIDATION
+# ============================================================================
+
+def validate_dtypes(df, mapping, sample_size=VALIDATION_SAMPLE):
+    """
+    Check the first rows of each mapped column against FIELD_DTYPES.
+
+    Returns:
+        list: Problem descriptions (empty when the sample looks right)
+    """
+    problems = []
+    for field, column in mapping.items():
+        if column not in df.columns:
+            problems.append(f"{field}: column '{column}' not in input")
+            continue
+        values = df[column].iloc[:sample_size].dropna().astype(str).str.strip()
+        values = values[values != '']
+        if len(values) == 0:
+            continue
+
+        dtype = FIELD_DTYPES.get(field)
+        if dtype == 'order_number':
+            valid = values.str.fullmatch(r'\d+(\.0)?')
+        elif dtype == 'datetime':
+            valid = pd.to_datetime(values, format='mixed', utc=True, errors='coerce').notna()
+        else:
+            continue
+        share = valid.mean()
+        if share < VALID_SHARE:
+            sample = values[~valid].head(3).tolist()
+            problems.append(f"{field} ('{column}'): only {share:.0%} of sampled values are {dtype}, e.g. {sample}")
+    return problems
+
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+class SchemaRegistry:
+    """Fingerprint -> resolved mapping cache with declared layouts"""
+
+    def __init__(self, path=REGISTRY_PATH, declared=DECLARED_SCHEMAS):
+        self.path = Path(path) if path else None
+        self.declared = declared
+        self.entries = {}
+        if self.path and self.path.exists():
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def save(self):
+        """Write the cache atomically"""
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def _fail(self, message, strict, warnings):
+        if strict:
+            raise SchemaError(message)
+        warnings.append(message)
+
+    def resolve(self, df, schema=None, strict=False):
+        """
+        Resolve and validate the column mapping of an input.
+
+        Args:
+            df (pd.DataFrame): First rows of the input (header + sample)
+            schema (str): Force a declared layout by name
+            strict (bool): Raise SchemaError on unknown/ambiguous/drifted headers
+                and dtype failures instead of warning
+
+        Returns:
+            dict: mapping, schema (name or None), source ('cached', 'declared',
+            'detected' or 'forced'), fingerprint, warnings
+        """
+        columns = [str(column) for column in df.columns]
+        fingerprint = header_fingerprint(columns)
+        warnings = []
+
+        if schema:
+            if schema not in self.declared:
+                raise SchemaError(f"Unknown schema '{schema}'. Declared: {sorted(self.declared)}")
+            name, mapping, source = schema, dict(self.declared[schema]['mapping']), 'forced'
+            missing = [column for column in mapping.values() if column not in columns]
+            if missing:
+                raise SchemaError(f"Input does not match schema '{schema}': missing columns {missing}")
+        elif fingerprint in self.entries:
+            entry = self.entries[fingerprint]
+            name, mapping, source = entry.get('schema'), dict(entry['mapping']), 'cached'
+        else:
+            name, missing = match_declared(columns, self.declared)
+            if name and not missing:
+                mapping, source = dict(self.declared[name]['mapping']), 'declared'
+            else:
+                if name:
+                    self._fail(f"Header looks like '{name}' but is missing {missing} (schema drift)",
+                               strict, warnings)
+                    name = None
+                elif strict:
+                    raise SchemaError(f"Unknown header layout {fingerprint[:12]}: {columns}")
+                mapping, source = detect_mapping(columns), 'detected'
+                for field, matches in candidate_columns(columns).items():
+                    if len(matches) > 1 and field in mapping:
+                        self._fail(f"{field}: several candidate columns {matches}, using '{mapping[field]}'",
+                                   strict, warnings)
+
+        missing_fields = [field for field in REQUIRED_FIELDS if field not in mapping]
+        if missing_fields:
+            raise SchemaError(f"Could not find required columns: {missing_fields}. Available columns: {columns}")
+
+        for problem in validate_dtypes(df, mapping):
+            self._fail(problem, strict, warnings)
+
+        # Only clean resolutions are cached, so guessed mappings keep warning
+        if not warnings:
+            now = datetime.now().isoformat(timespec='seconds')
+            entry = self.entries.setdefault(fingerprint, {
+                'schema': name, 'mapping': mapping, 'columns': columns, 'first_seen': now, 'files': 0})
+            entry['last_seen'] = now
+            entry['files'] += 1
+            if source == 'forced':
+                entry.update({'schema': name, 'mapping': mapping})
+
+        return {
+            'mapping': mapping,
+            'schema': name,
+            'source': source,
+            'fingerprint': fingerprint,
+            'warnings': warnings,
+        }
@@ -0,0 +1,141 @@
+"""
+Offline benchmark of stripe_exporter.py against mock_stripe.py.
+
+Runs each exporter mode in a fresh temporary directory against the same
+synthetic account and reports API calls per endpoint, wall time and peak
+Python memory (tracemalloc).
+
+Modes:
+    full         Serial streaming export (no prior state)
+    parallel     --parallel full export
+    incremental  --incremental after a full export and NEW_FRACTION new charges/refunds
+    events       --events after a full export and NEW_FRACTION changed charges
+
+Usage:
+    python3 benchmark_exporter.py
+    python3 benchmark_exporter.py --charges 100000 --refunds 8000 --latency 0.05 --modes full,parallel
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mock_stripe import MockStripe
+
+MODES = ['full', 'parallel', 'incremental', 'events']
+NEW_FRACTION = 0.01  # Share of objects added/changed before incremental and events runs
+
+
+def load_exporter(mock: MockStripe, args):
+    """Import stripe_exporter against the mock with benchmark settings."""
+    os.environ['STRIPE_API_KEY'] = 'sk_test_mock_benchmark_key'
+    mock.install()
+    exporter = importlib.reload(sys.modules['stripe_exporter']) if 'stripe_exporter' in sys.modules \
+        else importlib.import_module('stripe_exporter')
+    if args.no_delay:
+        exporter.RATE_LIMIT_DELAY = 0
+    exporter.rate_limiter = exporter.RateLimiter(args.requests_per_second)
+    return exporter
+
+
+def run_exporter(exporter, argv):
+    """Run stripe_exporter.main with argv, output suppressed."""
+    sys.argv = ['stripe_exporter.py'] + argv
+    with contextlib.redirect_stdout(io.StringIO()):
+        exporter.main()
+
+
+def prepare(mode, mock, exporter):
+    """Bring the working directory and mock to the starting point of a mode."""
+    if mode not in ('incremental', 'events'):
+        return
+    run_exporter(exporter, [])
+    now = int(time.time())
+    new_charges = max(1, int(len(mock._collections['Charge'].items) * NEW_FRACTION))
+    if mode == 'incremental':
+        mock.add_charges(new_charges, now - 50, now - 10)
+        mock.add_refunds(max(1, new_charges // 10), now)
+    else:
+        # Old charges refunded or disputed after the export
+        changed = [charge for charge in mock._collections['Charge'].items[-new_charges:]
+                   if charge.status == 'succeeded']
+        for charge in changed:
+            charge['disputed'] = True
+        mock.add_events(changed, 'charge.updated', now)
+
+
+def benchmark_mode(mode, args):
+    mock = MockStripe.seeded(charges=args.charges, refunds=args.refunds, customers=args.customers,
+                             latency=args.latency, rate_limit=args.rate_limit, error_rate=args.error_rate)
+    argv = {'full': [], 'parallel': ['--parallel', '--workers', str(args.workers)],
+            'incremental': ['--incremental'], 'events': ['--events']}[mode]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            exporter = load_exporter(mock, args)
+            prepare(mode, mock, exporter)
+            mock.reset_calls()
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            error = ''
+            try:
+                run_exporter(exporter, argv)
+            except SystemExit as e:
+                error = f'exit {e.code}'
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            os.chdir(cwd)
+
+    return {
+        'mode': mode,
+        'calls': mock.total_calls(),
+        'by_endpoint': dict(mock.calls),
+        'seconds': elapsed,
+        'peak_mb': peak / 1024 / 1024,
+        'error': error,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark stripe_exporter.py against a local Stripe mock')
+    parser.add_argument('--charges', type=int, default=10000)
+    parser.add_argument('--refunds', type=int, default=1000)
+    parser.add_argument('--customers', type=int, default=3000)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds per mock request')
+    parser.add_argument('--rate-limit', type=int, default=None, help='Mock requests/second before 429s')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of a random 429')
+    parser.add_argument('--requests-per-second', type=float, default=100,
+                        help="Exporter's shared rate limiter setting")
+    parser.add_argument('--workers', type=int, default=8, help='Workers for --parallel')
+    parser.add_argument('--no-delay', action='store_true', help='Set RATE_LIMIT_DELAY to 0')
+    parser.add_argument('--modes', default=','.join(MODES), help=f"Comma separated: {', '.join(MODES)}")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    print(f"Benchmarking stripe_exporter.py: {args.charges} charges, {args.refunds} refunds, "
+          f"{args.customers} customers, {args.latency * 1000:.0f} ms latency")
+    print(f"{'mode':<12} {'calls':>7} {'seconds':>9} {'peak MB':>9}  endpoints")
+
+    for mode in args.modes.split(','):
+        result = benchmark_mode(mode.strip(), args)
+        endpoints = ', '.join(f"{name}={count}" for name, count in sorted(result['by_endpoint'].items()))
+        status = f"  [{result['error']}]" if result['error'] else ''
+        print(f"{result['mode']:<12} {result['calls']:>7} {result['seconds']:>9.2f} "
+              f"{result['peak_mb']:>9.1f}  {endpoints}{status}")
+
+
+if __name__ == "__main__":
+    main()
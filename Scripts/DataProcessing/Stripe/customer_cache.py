@@ -0,0 +1,57 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable
+
+CUSTOMER_CACHE_PATH = "stripe_customer_cache.db"  # Persistent customer email cache
+CUSTOMER_CACHE_TTL = 30 * 24 * 3600  # Seconds before a cached email is refreshed
+
+
+class CustomerCache:
+    """On-disk customer_id -> email cache with TTL-based refresh."""
+
+    def __init__(self, path: str = CUSTOMER_CACHE_PATH, ttl: float = CUSTOMER_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS customers ('
+            'customer_id TEXT PRIMARY KEY, email TEXT NOT NULL, fetched_at REAL NOT NULL)')
+        self.conn.commit()
+
+    def get_many(self, customer_ids: Iterable[str]) -> Dict[str, str]:
+        """Return cached emails that are still within the TTL."""
+        customer_ids = list(customer_ids)
+        fresh_after = time.time() - self.ttl
+        found = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for i in range(0, len(customer_ids), 500):
+                chunk = customer_ids[i:i + 500]
+                placeholders = ', '.join('?' for _ in chunk)
+                rows = self.conn.execute(
+                    f'SELECT customer_id, email FROM customers '
+                    f'WHERE fetched_at >= ? AND customer_id IN ({placeholders})',
+                    [fresh_after] + chunk).fetchall()
+                found.update(rows)
+        return found
+
+    def put_many(self, emails: Dict[str, str]) -> None:
+        """Store fetched emails (empty string = customer has no email)."""
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                'INSERT INTO customers (customer_id, email, fetched_at) VALUES (?, ?, ?) '
+                'ON CONFLICT (customer_id) DO UPDATE SET email = excluded.email, fetched_at = excluded.fetched_at',
+                [(customer_id, email, now) for customer_id, email in emails.items()])
+            self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
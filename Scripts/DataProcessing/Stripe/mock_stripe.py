@@ -0,0 +1,297 @@
+"""
+Local stand-in for the parts of the Stripe API used by stripe_exporter.py.
+
+Implements Charge.list/retrieve, Refund.list, Customer.retrieve,
+Account.retrieve and Event.list over synthetic data, with Stripe's
+pagination semantics (newest first, limit <= 100, starting_after,
+ending_before, created[gt|gte|lt|lte] filters, expand=['data.charge'] and
+Event types filters), per-endpoint call counters, configurable latency and
+rate-limit errors.
+
+Usage:
+    from mock_stripe import MockStripe
+    mock = MockStripe.seeded(charges=20000, refunds=2000, customers=5000, latency=0.02)
+    mock.install()          # sys.modules['stripe'] = mock, before importing stripe_exporter
+    import stripe_exporter
+"""
+
+import bisect
+import random
+import sys
+import threading
+import time
+import types
+from collections import Counter, deque
+from typing import List
+
+DAY = 24 * 3600
+
+
+class StripeError(Exception):
+    """Base class of the mock errors (mirrors stripe.error.StripeError)."""
+
+
+class RateLimitError(StripeError):
+    pass
+
+
+class InvalidRequestError(StripeError):
+    pass
+
+
+class MockObject(dict):
+    """Dict with attribute access, like stripe.StripeObject (missing attributes raise)."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class _Collection:
+    """Objects sorted newest first, with O(log n) created-range and cursor lookups."""
+
+    def __init__(self, objects: List[MockObject] = None):
+        self.items = []
+        self.neg_created = []
+        self.position = {}
+        self.add(objects or [])
+
+    def add(self, objects: List[MockObject]) -> None:
+        self.items.extend(objects)
+        self.items.sort(key=lambda obj: (-obj.created, obj.id))
+        self.neg_created = [-obj.created for obj in self.items]
+        self.position = {obj.id: i for i, obj in enumerate(self.items)}
+
+    def get(self, object_id: str):
+        i = self.position.get(object_id)
+        return self.items[i] if i is not None else None
+
+    def page(self, limit=10, starting_after=None, ending_before=None, created=None, items=None):
+        items = self.items if items is None else items
+        neg_created = self.neg_created if items is self.items else [-obj.created for obj in items]
+        position = self.position if items is self.items else {obj.id: i for i, obj in enumerate(items)}
+        limit = max(1, min(int(limit or 10), 100))
+
+        start, end = 0, len(items)
+        if isinstance(created, dict):
+            if 'lt' in created:
+                start = max(start, bisect.bisect_right(neg_created, -created['lt']))
+            if 'lte' in created:
+                start = max(start, bisect.bisect_left(neg_created, -created['lte']))
+            if 'gt' in created:
+                end = min(end, bisect.bisect_left(neg_created, -created['gt']))
+            if 'gte' in created:
+                end = min(end, bisect.bisect_right(neg_created, -created['gte']))
+        elif created is not None:
+            start = bisect.bisect_left(neg_created, -created)
+            end = bisect.bisect_right(neg_created, -created)
+
+        if ending_before:
+            if ending_before not in position:
+                raise InvalidRequestError(f"No such object: '{ending_before}'")
+            end = min(end, position[ending_before])
+            first = max(start, end - limit)
+            return MockObject(object='list', data=items[first:end], has_more=first > start)
+
+        if starting_after:
+            if starting_after not in position:
+                raise InvalidRequestError(f"No such object: '{starting_after}'")
+            start = max(start, position[starting_after] + 1)
+        last = min(end, start + limit)
+        return MockObject(object='list', data=items[start:last], has_more=last < end)
+
+
+class _Endpoint:
+    """One resource namespace (stripe.Charge, stripe.Refund, ...)."""
+
+    def __init__(self, mock: 'MockStripe', name: str):
+        self._mock = mock
+        self._name = name
+
+    def list(self, limit=10, starting_after=None, ending_before=None, created=None, expand=None, types=None, **_):
+        self._mock._request(f'{self._name}.list')
+        if self._name == 'Event':
+            return self._mock._list_events(limit, starting_after, ending_before, created, types)
+        collection = self._mock._collections[self._name]
+        page = collection.page(limit, starting_after, ending_before, created)
+        if self._name == 'Refund' and expand and 'data.charge' in expand:
+            page['data'] = [self._mock._expand_charge(refund) for refund in page.data]
+        return page
+
+    def retrieve(self, object_id=None, **_):
+        self._mock._request(f'{self._name}.retrieve')
+        if self._name == 'Account':
+            return self._mock.account
+        obj = self._mock._collections[self._name].get(object_id)
+        if obj is None:
+            raise InvalidRequestError(f"No such {self._name.lower()}: '{object_id}'")
+        return obj
+
+
+class MockStripe(types.ModuleType):
+    """Module-shaped fake of the stripe package."""
+
+    def __init__(self, latency: float = 0.0, rate_limit: int = None, error_rate: float = 0.0,
+                 seed: int = 7, account_created: int = None):
+        """
+        Args:
+            latency: Seconds slept per request
+            rate_limit: Requests per second above which RateLimitError is raised
+            error_rate: Probability of a RateLimitError on any request
+        """
+        super().__init__('stripe')
+        self.api_key = None
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.account = MockObject(id='acct_mock', object='account',
+                                  created=account_created or int(time.time()) - 3 * 365 * DAY)
+        self.error = types.SimpleNamespace(StripeError=StripeError, RateLimitError=RateLimitError,
+                                           InvalidRequestError=InvalidRequestError)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self._collections = {name: _Collection() for name in ('Charge', 'Refund', 'Customer', 'Event')}
+        self._events_by_types = {}
+        for name in ('Charge', 'Refund', 'Customer', 'Account', 'Event'):
+            setattr(self, name, _Endpoint(self, name))
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    def _request(self, endpoint: str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._recent.append(now)
+            while self._recent and self._recent[0] <= now - 1.0:
+                self._recent.popleft()
+            limited = (self.rate_limit is not None and len(self._recent) > self.rate_limit) or \
+                (self.error_rate and self._random.random() < self.error_rate)
+            self.calls[endpoint] += 1
+            if limited:
+                self.calls['rate_limited'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if limited:
+            raise RateLimitError(f"Request rate limit exceeded ({endpoint})")
+
+    def _expand_charge(self, refund: MockObject) -> MockObject:
+        expanded = MockObject(refund)
+        expanded['charge'] = self._collections['Charge'].get(refund.charge)
+        return expanded
+
+    def _list_events(self, limit, starting_after, ending_before, created, types_filter):
+        events = self._collections['Event']
+        if types_filter:
+            key = tuple(sorted(types_filter))
+            if key not in self._events_by_types:
+                self._events_by_types[key] = [event for event in events.items if event.type in key]
+            return events.page(limit, starting_after, ending_before, created, self._events_by_types[key])
+        return events.page(limit, starting_after, ending_before, created)
+
+    def reset_calls(self) -> None:
+        self.calls.clear()
+
+    def total_calls(self) -> int:
+        return sum(count for endpoint, count in self.calls.items() if endpoint != 'rate_limited')
+
+    def install(self) -> 'MockStripe':
+        """Replace the stripe module for code imported afterwards."""
+        sys.modules['stripe'] = self
+        return self
+
+    # ------------------------------------------------------------------
+    # Synthetic data
+    # ------------------------------------------------------------------
+
+    def add_customers(self, count: int) -> List[MockObject]:
+        start = len(self._collections['Customer'].items)
+        created = int(time.time())
+        customers = [MockObject(id=f'cus_{i:08d}', object='customer', created=created,
+                                email=f'customer{i}@example.com')
+                     for i in range(start, start + count)]
+        self._collections['Customer'].add(customers)
+        return customers
+
+    def add_charges(self, count: int, created_from: int, created_to: int) -> List[MockObject]:
+        rng = self._random
+        customers = self._collections['Customer'].items
+        start = len(self._collections['Charge'].items)
+        charges = []
+        for i in range(start, start + count):
+            customer = rng.choice(customers).id if customers and rng.random() < 0.8 else None
+            status = 'succeeded' if rng.random() < 0.95 else 'failed'
+            amount = rng.choice([24900, 34900, 65800, 104700])
+            charges.append(MockObject(
+                id=f'ch_{i:010d}', object='charge', amount=amount, currency='usd', status=status,
+                created=rng.randint(created_from, created_to),
+                description=f'Order #{100000 + i}', customer=customer,
+                receipt_email=f'receipt{i}@example.com' if customer is None else None,
+                statement_descriptor=None, calculated_statement_descriptor='CMWL',
+                metadata=MockObject(resourceId=f'{i:024x}') if rng.random() < 0.9 else MockObject(),
+                refunded=False, amount_refunded=0, payment_intent=f'pi_{i:010d}',
+                payment_method=f'pm_{i:010d}', balance_transaction=f'txn_{i:010d}',
+                application_fee_amount=None,
+                failure_code=None if status == 'succeeded' else 'card_declined',
+                failure_message=None if status == 'succeeded' else 'Your card was declined.',
+                outcome=MockObject(network_status='approved_by_network', risk_level='normal',
+                                   type='authorized', seller_message='Payment complete.'),
+                disputed=False,
+                billing_details=MockObject(address=MockObject(postal_code=f'{rng.randint(10000, 99999)}')),
+                receipt_url=f'https://pay.stripe.com/receipts/{i}',
+                payment_method_details=MockObject(type='card', card=MockObject(
+                    brand=rng.choice(['visa', 'mastercard', 'amex']), last4=f'{rng.randint(0, 9999):04d}')),
+            ))
+        self._collections['Charge'].add(charges)
+        return charges
+
+    def add_refunds(self, count: int, max_created: int = None) -> List[MockObject]:
+        rng = self._random
+        succeeded = [charge for charge in self._collections['Charge'].items
+                     if charge.status == 'succeeded' and not charge.refunded]
+        max_created = max_created or int(time.time())
+        start = len(self._collections['Refund'].items)
+        refunds = []
+        for i, charge in enumerate(rng.sample(succeeded, min(count, len(succeeded))), start):
+            charge['refunded'] = True
+            charge['amount_refunded'] = charge.amount
+            refunds.append(MockObject(
+                id=f're_{i:010d}', object='refund', charge=charge.id, amount=charge.amount,
+                currency='usd', status='succeeded',
+                created=min(max_created, charge.created + rng.randint(DAY, 20 * DAY)),
+                reason=rng.choice([None, 'requested_by_customer', 'duplicate']),
+                receipt_number=None, balance_transaction=f'txn_r{i:010d}',
+                payment_intent=charge.payment_intent, metadata=MockObject(),
+                destination_details=MockObject(type='card', card=MockObject(reference_status='available')),
+            ))
+        self._collections['Refund'].add(refunds)
+        return refunds
+
+    def add_events(self, objects: List[MockObject], event_type: str, created: int = None) -> List[MockObject]:
+        """Record one event per object (snapshot copied now, like Stripe)."""
+        start = len(self._collections['Event'].items)
+        events = [MockObject(id=f'evt_{i:010d}', object='event', type=event_type,
+                             created=created or obj.created, data=MockObject(object=MockObject(obj)))
+                  for i, obj in enumerate(objects, start)]
+        self._collections['Event'].add(events)
+        self._events_by_types = {}
+        return events
+
+    @classmethod
+    def seeded(cls, charges: int = 10000, refunds: int = 1000, customers: int = 3000,
+               days: int = 365, **kwargs) -> 'MockStripe':
+        """Mock with synthetic customers, charges, refunds and their last-30-day events."""
+        mock = cls(**kwargs)
+        now = int(time.time())
+        mock.add_customers(customers)
+        created_charges = mock.add_charges(charges, now - days * DAY, now - 60)
+        created_refunds = mock.add_refunds(refunds, now - 30)
+        recent = now - 30 * DAY
+        mock.add_events([charge for charge in created_charges if charge.created >= recent and
+                         charge.status == 'succeeded'], 'charge.succeeded')
+        mock.add_events([refund for refund in created_refunds if refund.created >= recent], 'refund.created')
+        return mock
@@ -1,10 +1,16 @@
 import stripe
+import argparse
 import csv
+import json
 import os
+import sys
 from datetime import datetime
 from typing import List, Dict, Any
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from customer_cache import CustomerCache, CUSTOMER_CACHE_PATH
 
 # Load environment variables
 load_dotenv()
@@ -13,25 +19,47 @@ load_dotenv()
 STRIPE_API_KEY = os.getenv('STRIPE_API_KEY')
 CHARGES_CSV_PATH = "stripe_charges.csv"  # Path where charges CSV will be saved
 REFUNDS_CSV_PATH = "stripe_refunds.csv"  # Path where refunds CSV will be saved
+SYNC_STATE_PATH = "stripe_sync_state.json"  # Per-stream created watermarks for incremental runs
+EXPORT_CHECKPOINT_PATH = "stripe_export_checkpoint.json"  # Cursor of an unfinished export (--resume)
 RATE_LIMIT_DELAY = 0.1  # Delay between API calls to respect rate limits
+MAX_WORKERS = 8  # Concurrent API calls for customer lookups
+MAX_REQUESTS_PER_SECOND = 20  # Shared limit across all workers
+STRIPE_EPOCH = 1293840000  # 2011-01-01, lower bound when the account has no created timestamp
+SLICES_PER_WORKER = 4  # Parallel exports split each stream into MAX_WORKERS * SLICES_PER_WORKER created ranges
+EVENT_RETENTION_DAYS = 30  # Stripe only lists events from the last 30 days
+
+# Events whose object snapshot changes an exported charge or refund (Event.list has no wildcards)
+SYNC_EVENT_TYPES = [
+    'charge.succeeded', 'charge.captured', 'charge.updated', 'charge.refunded',
+    'charge.dispute.created', 'charge.dispute.closed',
+    'charge.refund.updated', 'refund.created', 'refund.updated', 'refund.failed',
+]
 
 # Initialize Stripe
 stripe.api_key = STRIPE_API_KEY
 
+class RateLimiter:
+    """Thread-safe limiter spacing API calls evenly across all workers."""
+    
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+    
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+rate_limiter = RateLimiter(MAX_REQUESTS_PER_SECOND)
+
 def unix_to_datetime(unix_timestamp: int) -> str:
     """Convert Unix timestamp to readable datetime string."""
     return datetime.fromtimestamp(unix_timestamp).strftime('%Y-%m-%d %H:%M:%S')
 
-def get_customer_email(customer_id: str) -> str:
-    """Fetch customer email by customer ID."""
-    try:
-        if customer_id:
-            customer = stripe.Customer.retrieve(customer_id)
-            return customer.get('email', '') or ''
-    except Exception as e:
-        print(f"Error fetching customer {customer_id}: {e}")
-    return ''
-
 def extract_metadata_resource_id(metadata: Dict) -> str:
     """Extract resourceId from metadata if it exists."""
     if metadata and isinstance(metadata, dict):
@@ -51,191 +79,318 @@ def safe_get_nested(obj, *keys, default=''):
     except:
         return default
 
-def get_all_charges() -> List[Dict[str, Any]]:
-    """Fetch all successful charges from Stripe."""
-    print("Fetching charges...")
-    all_charges = []
+def charge_to_row(charge) -> Dict[str, Any]:
+    """Convert a Stripe Charge object into a charges CSV row."""
+    # Extract payment method info safely
+    payment_method_type = safe_get_nested(charge, 'payment_method_details', 'type')
+    card_brand = safe_get_nested(charge, 'payment_method_details', 'card', 'brand')
+    card_last4 = safe_get_nested(charge, 'payment_method_details', 'card', 'last4')
+    
+    return {
+        'charge_id': charge.id,
+        'amount': charge.amount / 100,  # Convert from cents to dollars
+        'currency': charge.currency.upper(),
+        'status': charge.status,
+        'datetime': unix_to_datetime(charge.created),
+        'created': charge.created,  # Unix timestamp, used for sync watermarks
+        'description': charge.description or '',
+        'customer_id': charge.customer or '',
+        'email': '',  # Will be populated later
+        'payment_method_type': payment_method_type,
+        'card_brand': card_brand,
+        'card_last4': card_last4,
+        'receipt_email': charge.receipt_email or '',
+        'statement_descriptor': charge.statement_descriptor or '',
+        'calculated_statement_descriptor': safe_get_nested(charge, 'calculated_statement_descriptor'),
+        'metadata_resource_id': extract_metadata_resource_id(charge.metadata),
+        'metadata': str(dict(charge.metadata)) if charge.metadata else '',
+        'refunded': charge.refunded,
+        'amount_refunded': charge.amount_refunded / 100 if charge.amount_refunded else 0,
+        'payment_intent_id': charge.payment_intent or '',
+        'payment_method_id': charge.payment_method or '',
+        'balance_transaction': safe_get_nested(charge, 'balance_transaction'),
+        'application_fee_amount': charge.application_fee_amount / 100 if charge.application_fee_amount else 0,
+        'failure_code': charge.failure_code or '',
+        'failure_message': charge.failure_message or '',
+        'network_status': safe_get_nested(charge, 'outcome', 'network_status'),
+        'risk_level': safe_get_nested(charge, 'outcome', 'risk_level'),
+        'outcome_type': safe_get_nested(charge, 'outcome', 'type'),
+        'seller_message': safe_get_nested(charge, 'outcome', 'seller_message'),
+        'disputed': charge.disputed,
+        'billing_address_postal_code': safe_get_nested(charge, 'billing_details', 'address', 'postal_code'),
+        'receipt_url': safe_get_nested(charge, 'receipt_url'),
+    }
+
+def created_filter(created_gte: int = None) -> Dict[str, Any]:
+    """List parameters restricting results to objects created at or after created_gte."""
+    return {'created': {'gte': created_gte}} if created_gte else {}
+
+def iter_charge_pages(created_gte: int = None, starting_after: str = None):
+    """
+    Page through successful charges, newest first.
+    
+    Yields:
+        tuple: (charge rows of the page, cursor to resume after this page)
+    
+    API errors are raised, so a failed export is never mistaken for a complete one.
+    """
     has_more = True
-    starting_after = None
     
     while has_more:
         try:
             charges = stripe.Charge.list(
                 limit=100,
                 starting_after=starting_after,
+                **created_filter(created_gte),
             )
-            
-            # Filter for successful charges only
-            successful_charges = [charge for charge in charges.data if charge.status == 'succeeded']
-            
-            for charge in successful_charges:
-                # Extract payment method info safely
-                payment_method_type = safe_get_nested(charge, 'payment_method_details', 'type')
-                card_brand = safe_get_nested(charge, 'payment_method_details', 'card', 'brand')
-                card_last4 = safe_get_nested(charge, 'payment_method_details', 'card', 'last4')
-                
-                transaction_data = {
-                    'charge_id': charge.id,
-                    'amount': charge.amount / 100,  # Convert from cents to dollars
-                    'currency': charge.currency.upper(),
-                    'status': charge.status,
-                    'datetime': unix_to_datetime(charge.created),
-                    'description': charge.description or '',
-                    'customer_id': charge.customer or '',
-                    'email': '',  # Will be populated later
-                    'payment_method_type': payment_method_type,
-                    'card_brand': card_brand,
-                    'card_last4': card_last4,
-                    'receipt_email': charge.receipt_email or '',
-                    'statement_descriptor': charge.statement_descriptor or '',
-                    'calculated_statement_descriptor': safe_get_nested(charge, 'calculated_statement_descriptor'),
-                    'metadata_resource_id': extract_metadata_resource_id(charge.metadata),
-                    'metadata': str(dict(charge.metadata)) if charge.metadata else '',
-                    'refunded': charge.refunded,
-                    'amount_refunded': charge.amount_refunded / 100 if charge.amount_refunded else 0,
-                    'payment_intent_id': charge.payment_intent or '',
-                    'payment_method_id': charge.payment_method or '',
-                    'balance_transaction': safe_get_nested(charge, 'balance_transaction'),
-                    'application_fee_amount': charge.application_fee_amount / 100 if charge.application_fee_amount else 0,
-                    'failure_code': charge.failure_code or '',
-                    'failure_message': charge.failure_message or '',
-                    'network_status': safe_get_nested(charge, 'outcome', 'network_status'),
-                    'risk_level': safe_get_nested(charge, 'outcome', 'risk_level'),
-                    'outcome_type': safe_get_nested(charge, 'outcome', 'type'),
-                    'seller_message': safe_get_nested(charge, 'outcome', 'seller_message'),
-                    'disputed': charge.disputed,
-                    'billing_address_postal_code': safe_get_nested(charge, 'billing_details', 'address', 'postal_code'),
-                    'receipt_url': safe_get_nested(charge, 'receipt_url'),
-                }
-                all_charges.append(transaction_data)
-            
-            has_more = charges.has_more
-            if has_more and charges.data:
-                starting_after = charges.data[-1].id
-            
-            print(f"Fetched {len(successful_charges)} charges (Total: {len(all_charges)})")
-            time.sleep(RATE_LIMIT_DELAY)
-            
         except Exception as e:
-            print(f"Error fetching charges: {e}")
-            import traceback
-            traceback.print_exc()
-            break
-    
+            print(f"Error fetching charges after {starting_after}: {e}")
+            raise
+        
+        # Filter for successful charges only
+        successful_charges = [charge_to_row(charge) for charge in charges.data if charge.status == 'succeeded']
+        
+        has_more = charges.has_more and bool(charges.data)
+        if charges.data:
+            starting_after = charges.data[-1].id
+        
+        yield successful_charges, starting_after
+        time.sleep(RATE_LIMIT_DELAY)
+
+def get_all_charges(created_gte: int = None) -> List[Dict[str, Any]]:
+    """Fetch all successful charges from Stripe (optionally only those created since created_gte)."""
+    print("Fetching charges...")
+    all_charges = []
+    for page, _ in iter_charge_pages(created_gte):
+        all_charges.extend(page)
+        print(f"Fetched {len(page)} charges (Total: {len(all_charges)})")
     return all_charges
 
-def get_all_refunds() -> List[Dict[str, Any]]:
-    """Fetch all refunds from Stripe."""
-    print("Fetching refunds...")
-    all_refunds = []
+def charge_context(charge) -> Dict[str, str]:
+    """Refund fields taken from the original charge (Stripe Charge object)."""
+    charge_metadata = charge.metadata or {}
+    return {
+        'description': charge.description or '',
+        'customer_id': charge.customer or '',
+        'metadata_resource_id': extract_metadata_resource_id(charge_metadata),
+        'metadata': str(dict(charge_metadata)) if charge_metadata else '',
+    }
+
+def build_charge_lookup(charges: List[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+    """Map charge_id -> refund fields from charges already fetched by get_all_charges."""
+    return {
+        charge['charge_id']: {
+            'description': charge['description'],
+            'customer_id': charge['customer_id'],
+            'metadata_resource_id': charge['metadata_resource_id'],
+            'metadata': charge['metadata'],
+        }
+        for charge in charges
+    }
+
+def fetch_missing_charges(charge_ids: set, charge_lookup: Dict[str, Dict[str, str]]) -> None:
+    """Retrieve charges not found in the lookup, once per charge ID."""
+    if not charge_ids:
+        return
+    print(f"Retrieving {len(charge_ids)} charges not found in the export...")
+    for charge_id in sorted(charge_ids):
+        try:
+            charge_lookup[charge_id] = charge_context(stripe.Charge.retrieve(charge_id))
+        except Exception as e:
+            print(f"Warning: Could not fetch original charge {charge_id}: {e}")
+        time.sleep(RATE_LIMIT_DELAY)
+
+def refund_to_row(refund, charge_id: str) -> Dict[str, Any]:
+    """Convert a Stripe Refund object into a refunds CSV row (charge fields filled by enrich_refunds)."""
+    return {
+        'refund_id': refund.id,
+        'charge_id': charge_id,  # Links back to the original charge
+        'amount': refund.amount / 100,  # Positive amount for refunds
+        'currency': refund.currency.upper(),
+        'status': refund.status,
+        'datetime': unix_to_datetime(refund.created),
+        'created': refund.created,  # Unix timestamp, used for sync watermarks
+        'reason': refund.reason or '',
+        'description': '',  # From original charge
+        'customer_id': '',  # From original charge
+        'email': '',  # Will be populated later
+        'receipt_number': safe_get_nested(refund, 'receipt_number'),
+        'balance_transaction': safe_get_nested(refund, 'balance_transaction'),
+        'payment_intent_id': safe_get_nested(refund, 'payment_intent'),
+        'metadata_resource_id': '',  # From original charge
+        'metadata': '',  # From original charge
+        'refund_metadata': str(dict(refund.metadata)) if refund.metadata else '',
+        'destination_details_type': safe_get_nested(refund, 'destination_details', 'type'),
+        'destination_reference_status': safe_get_nested(refund, 'destination_details', 'card', 'reference_status'),
+    }
+
+def enrich_refunds(refunds: List[Dict[str, Any]], charge_lookup: Dict[str, Dict[str, str]]) -> int:
+    """
+    Fill original charge fields on refund rows from charge_lookup.
+    
+    Charges missing from the lookup are retrieved once per distinct charge ID
+    (and added to the lookup). Returns the number of charges retrieved.
+    """
+    missing = {refund['charge_id'] for refund in refunds
+               if refund['charge_id'] and refund['charge_id'] not in charge_lookup}
+    fetch_missing_charges(missing, charge_lookup)
+    
+    for refund in refunds:
+        refund.update(charge_lookup.get(refund['charge_id'], {}))
+    return len(missing)
+
+def iter_refund_pages(charge_lookup: Dict[str, Dict[str, str]], created_gte: int = None,
+                      starting_after: str = None, expand: List[str] = None):
+    """
+    Page through refunds, newest first.
+    
+    Charges expanded on the list call are added to charge_lookup; rows are not
+    enriched yet (see enrich_refunds).
+    
+    Yields:
+        tuple: (refund rows of the page, cursor to resume after this page, charges expanded)
+    """
     has_more = True
-    starting_after = None
     
     while has_more:
         try:
             refunds = stripe.Refund.list(
                 limit=100,
                 starting_after=starting_after,
+                expand=expand or [],
+                **created_filter(created_gte),
             )
-            
-            for refund in refunds.data:
-                # Get the original charge details for additional context
-                original_charge = None
-                charge_description = ''
-                charge_metadata = {}
-                customer_id = ''
-                
-                try:
-                    original_charge = stripe.Charge.retrieve(refund.charge)
-                    charge_description = original_charge.description or ''
-                    charge_metadata = original_charge.metadata or {}
-                    customer_id = original_charge.customer or ''
-                except Exception as e:
-                    print(f"Warning: Could not fetch original charge {refund.charge}: {e}")
-                
-                transaction_data = {
-                    'refund_id': refund.id,
-                    'charge_id': refund.charge,  # Links back to the original charge
-                    'amount': refund.amount / 100,  # Positive amount for refunds
-                    'currency': refund.currency.upper(),
-                    'status': refund.status,
-                    'datetime': unix_to_datetime(refund.created),
-                    'reason': refund.reason or '',
-                    'description': charge_description,  # From original charge
-                    'customer_id': customer_id,  # From original charge
-                    'email': '',  # Will be populated later
-                    'receipt_number': safe_get_nested(refund, 'receipt_number'),
-                    'balance_transaction': safe_get_nested(refund, 'balance_transaction'),
-                    'payment_intent_id': safe_get_nested(refund, 'payment_intent'),
-                    'metadata_resource_id': extract_metadata_resource_id(charge_metadata),
-                    'metadata': str(dict(charge_metadata)) if charge_metadata else '',
-                    'refund_metadata': str(dict(refund.metadata)) if refund.metadata else '',
-                    'destination_details_type': safe_get_nested(refund, 'destination_details', 'type'),
-                    'destination_reference_status': safe_get_nested(refund, 'destination_details', 'card', 'reference_status'),
-                }
-                all_refunds.append(transaction_data)
-            
-            has_more = refunds.has_more
-            if has_more and refunds.data:
-                starting_after = refunds.data[-1].id
-            
-            print(f"Fetched {len(refunds.data)} refunds (Total: {len(all_refunds)})")
-            time.sleep(RATE_LIMIT_DELAY)
-            
         except Exception as e:
-            print(f"Error fetching refunds: {e}")
-            import traceback
-            traceback.print_exc()
-            break
+            print(f"Error fetching refunds after {starting_after}: {e}")
+            raise
+        
+        page = []
+        expanded = 0
+        for refund in refunds.data:
+            charge_id = refund.charge
+            if charge_id and not isinstance(charge_id, str):
+                # Expanded Charge object
+                if charge_id.id not in charge_lookup:
+                    charge_lookup[charge_id.id] = charge_context(charge_id)
+                    expanded += 1
+                charge_id = charge_id.id
+            
+            page.append(refund_to_row(refund, charge_id))
+        
+        has_more = refunds.has_more and bool(refunds.data)
+        if refunds.data:
+            starting_after = refunds.data[-1].id
+        
+        yield page, starting_after, expanded
+        time.sleep(RATE_LIMIT_DELAY)
+
+def get_all_refunds(charge_lookup: Dict[str, Dict[str, str]] = None,
+                    created_gte: int = None) -> List[Dict[str, Any]]:
+    """
+    Fetch all refunds from Stripe.
+    
+    Original charge details come from charge_lookup (charges already fetched),
+    then from the charge expanded on the list call, and only for charges found
+    in neither from one deduplicated retrieval each.
+    """
+    print("Fetching refunds...")
+    all_refunds = []
+    charge_lookup = dict(charge_lookup or {})
+    from_export = len(charge_lookup)
+    expanded = 0
+    # Expanding the charge makes list pages heavier, only do it when there is no export to look in
+    expand = [] if charge_lookup else ['data.charge']
+    
+    for page, _, page_expanded in iter_refund_pages(charge_lookup, created_gte, expand=expand):
+        all_refunds.extend(page)
+        expanded += page_expanded
+        print(f"Fetched {len(page)} refunds (Total: {len(all_refunds)})")
+    
+    retrieved = enrich_refunds(all_refunds, charge_lookup)
+    print(f"Original charges: {from_export} from export, {expanded} expanded, {retrieved} retrieved")
     
     return all_refunds
 
-def populate_customer_emails(transactions: List[Dict[str, Any]]) -> None:
-    """Populate email addresses for transactions with customer IDs."""
-    print("Populating customer emails...")
-    customer_cache = {}  # Cache to avoid duplicate API calls
+def fetch_customer_email(customer_id: str):
+    """Fetch one customer email under the shared rate limiter (None on error, not cached)."""
+    rate_limiter.wait()
+    try:
+        customer = stripe.Customer.retrieve(customer_id)
+        return customer.get('email', '') or ''
+    except Exception as e:
+        print(f"Error fetching customer {customer_id}: {e}")
+        return None
+
+def populate_customer_emails(transactions: List[Dict[str, Any]], cache: CustomerCache = None,
+                             verbose: bool = True) -> None:
+    """
+    Populate email addresses for transactions with customer IDs.
+    
+    Customers in the on-disk cache (within its TTL) are not looked up again;
+    the rest are fetched on a bounded worker pool and written back to the cache.
+    """
+    if verbose:
+        print("Populating customer emails...")
+    customer_ids = {transaction['customer_id'] for transaction in transactions
+                    if transaction.get('customer_id') and not transaction.get('email')}
+    
+    emails = cache.get_many(customer_ids) if cache else {}
+    missing = sorted(customer_ids - emails.keys())
+    if verbose:
+        print(f"Customers: {len(customer_ids)} ({len(emails)} cached, {len(missing)} to fetch)")
+    
+    if missing:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            fetched = dict(zip(missing, executor.map(fetch_customer_email, missing)))
+        fetched = {customer_id: email for customer_id, email in fetched.items() if email is not None}
+        if cache:
+            cache.put_many(fetched)
+        emails.update(fetched)
     
     for transaction in transactions:
         customer_id = transaction.get('customer_id')
         if customer_id and not transaction.get('email'):
-            if customer_id in customer_cache:
-                transaction['email'] = customer_cache[customer_id]
-            else:
-                email = get_customer_email(customer_id)
-                customer_cache[customer_id] = email
-                transaction['email'] = email
-                time.sleep(RATE_LIMIT_DELAY)
+            transaction['email'] = emails.get(customer_id, '')
         
         # Use receipt_email if no customer email found
         if not transaction['email'] and transaction.get('receipt_email'):
             transaction['email'] = transaction['receipt_email']
 
+# CSV headers for charges
+CHARGE_HEADERS = [
+    'charge_id', 'amount', 'currency', 'status', 'datetime', 'description', 
+    'customer_id', 'email', 'payment_method_type', 'card_brand', 'card_last4',
+    'receipt_email', 'statement_descriptor', 'calculated_statement_descriptor',
+    'metadata_resource_id', 'metadata', 'refunded', 'amount_refunded', 
+    'payment_intent_id', 'payment_method_id', 'balance_transaction', 
+    'application_fee_amount', 'failure_code', 'failure_message', 
+    'network_status', 'risk_level', 'outcome_type', 'seller_message', 
+    'disputed', 'billing_address_postal_code', 'receipt_url'
+]
+
+# CSV headers for refunds
+REFUND_HEADERS = [
+    'refund_id', 'charge_id', 'amount', 'currency', 'status', 'datetime', 
+    'reason', 'description', 'customer_id', 'email', 'receipt_number', 
+    'balance_transaction', 'payment_intent_id', 'metadata_resource_id', 
+    'metadata', 'refund_metadata', 'destination_details_type', 
+    'destination_reference_status'
+]
+
 def save_charges_to_csv(charges: List[Dict[str, Any]], file_path: str) -> None:
     """Save charges to CSV file."""
     if not charges:
         print("No charges to save.")
         return
     
-    # Define CSV headers for charges
-    headers = [
-        'charge_id', 'amount', 'currency', 'status', 'datetime', 'description', 
-        'customer_id', 'email', 'payment_method_type', 'card_brand', 'card_last4',
-        'receipt_email', 'statement_descriptor', 'calculated_statement_descriptor',
-        'metadata_resource_id', 'metadata', 'refunded', 'amount_refunded', 
-        'payment_intent_id', 'payment_method_id', 'balance_transaction', 
-        'application_fee_amount', 'failure_code', 'failure_message', 
-        'network_status', 'risk_level', 'outcome_type', 'seller_message', 
-        'disputed', 'billing_address_postal_code', 'receipt_url'
-    ]
-    
     try:
         with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=headers)
+            writer = csv.DictWriter(csvfile, fieldnames=CHARGE_HEADERS)
             writer.writeheader()
             
             for charge in charges:
                 # Ensure all fields exist with default empty values
-                row = {header: charge.get(header, '') for header in headers}
+                row = {header: charge.get(header, '') for header in CHARGE_HEADERS}
                 writer.writerow(row)
         
         print(f"Successfully saved {len(charges)} charges to {file_path}")
@@ -249,23 +404,14 @@ def save_refunds_to_csv(refunds: List[Dict[str, Any]], file_path: str) -> None:
         print("No refunds to save.")
         return
     
-    # Define CSV headers for refunds
-    headers = [
-        'refund_id', 'charge_id', 'amount', 'currency', 'status', 'datetime', 
-        'reason', 'description', 'customer_id', 'email', 'receipt_number', 
-        'balance_transaction', 'payment_intent_id', 'metadata_resource_id', 
-        'metadata', 'refund_metadata', 'destination_details_type', 
-        'destination_reference_status'
-    ]
-    
     try:
         with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=headers)
+            writer = csv.DictWriter(csvfile, fieldnames=REFUND_HEADERS)
             writer.writeheader()
             
             for refund in refunds:
                 # Ensure all fields exist with default empty values
-                row = {header: refund.get(header, '') for header in headers}
+                row = {header: refund.get(header, '') for header in REFUND_HEADERS}
                 writer.writerow(row)
         
         print(f"Successfully saved {len(refunds)} refunds to {file_path}")
@@ -273,56 +419,557 @@ def save_refunds_to_csv(refunds: List[Dict[str, Any]], file_path: str) -> None:
     except Exception as e:
         print(f"Error saving refunds CSV file: {e}")
 
-def main():
-    """Main function to orchestrate the data extraction and CSV creation."""
-    print("Starting Stripe transaction export...")
-    print(f"API Key: {STRIPE_API_KEY[:12]}..." if len(STRIPE_API_KEY) > 12 else "API Key not set")
+def load_csv_rows(file_path: str) -> List[Dict[str, Any]]:
+    """Load a previously exported CSV (empty list if it does not exist yet)."""
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
+        return list(csv.DictReader(csvfile))
+
+def upsert_rows(existing: List[Dict[str, Any]], new: List[Dict[str, Any]], key: str):
+    """
+    Upsert new rows into existing rows by key (new rows win).
     
-    # Validate API key
-    if not STRIPE_API_KEY or STRIPE_API_KEY == "sk_test_your_api_key_here":
-        print("ERROR: Please set your Stripe API key in the STRIPE_API_KEY variable.")
-        return
+    Returns:
+        tuple: (rows sorted by datetime, most recent first; inserted count; updated count)
+    """
+    rows = {row[key]: row for row in existing}
+    inserted = sum(1 for row in new if row[key] not in rows)
+    rows.update({row[key]: row for row in new})
+    merged = sorted(rows.values(), key=lambda x: x['datetime'], reverse=True)
+    return merged, inserted, len({row[key] for row in new}) - inserted
+
+def load_sync_state(file_path: str) -> Dict[str, Any]:
+    """Load per-stream watermarks ({} before the first run)."""
+    if not os.path.exists(file_path):
+        return {}
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_sync_state(state: Dict[str, Any], file_path: str) -> None:
+    """Write watermarks atomically so an interrupted run keeps the previous state."""
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, file_path)
+
+def stream_watermark(rows: List[Dict[str, Any]], key: str, previous: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Newest created timestamp of a stream plus the IDs created in that second.
+    
+    The next run lists created >= watermark and skips those IDs, so objects
+    sharing the watermark second are neither missed nor fetched twice.
+    """
+    if not rows:
+        return previous or {}
+    newest = max(row['created'] for row in rows)
+    if previous and previous.get('created', 0) > newest:
+        return previous
+    last_ids = [row[key] for row in rows if row['created'] == newest]
+    if previous and previous.get('created') == newest:
+        last_ids = sorted(set(last_ids) | set(previous.get('last_ids', [])))
+    return {'created': newest, 'last_ids': last_ids, 'synced_at': unix_to_datetime(int(time.time()))}
+
+def skip_seen(rows: List[Dict[str, Any]], key: str, watermark: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Drop rows already exported by the previous run (same watermark second)."""
+    seen = set(watermark.get('last_ids', []))
+    return [row for row in rows if row[key] not in seen]
+
+def time_slices(created_gte: int, created_lt: int, count: int) -> List[tuple]:
+    """Split [created_gte, created_lt) into up to count contiguous ranges, newest first."""
+    count = max(1, min(count, created_lt - created_gte))
+    step = (created_lt - created_gte) / count
+    bounds = sorted({created_gte + int(i * step) for i in range(count)} | {created_lt})
+    return list(reversed(list(zip(bounds[:-1], bounds[1:]))))
+
+def fetch_slice(list_fn, created_gte: int, created_lt: int) -> List[Any]:
+    """Page one created range serially under the shared rate limiter (errors are raised)."""
+    objects = []
+    has_more = True
+    starting_after = None
+    
+    while has_more:
+        rate_limiter.wait()
+        page = list_fn(
+            limit=100,
+            starting_after=starting_after,
+            created={'gte': created_gte, 'lt': created_lt},
+        )
+        objects.extend(page.data)
+        has_more = page.has_more and bool(page.data)
+        if page.data:
+            starting_after = page.data[-1].id
+    
+    return objects
+
+def merge_slices(slice_results: List[List[Any]]) -> List[Any]:
+    """
+    Concatenate slice results (newest slice first) dropping duplicate IDs.
+    
+    Slices are disjoint created ranges and each keeps Stripe's order, so the
+    result has the same newest-first order as a serial listing.
+    """
+    seen = set()
+    merged = []
+    for objects in slice_results:
+        for obj in objects:
+            if obj.id not in seen:
+                seen.add(obj.id)
+                merged.append(obj)
+    return merged
+
+def fetch_parallel(charges_since: int, refunds_since: int, workers: int = MAX_WORKERS) -> tuple:
+    """
+    Fetch charges and refunds concurrently, each split into created-range slices.
+    
+    Every slice is paged independently on one worker pool under the global
+    rate limiter, so a backfill scales with allowed concurrency instead of the
+    number of pages. Refund rows still need enrich_refunds.
+    
+    Returns:
+        tuple: (charge rows, refund rows), newest first
+    """
+    created_lt = int(time.time()) + 1
+    slice_count = workers * SLICES_PER_WORKER
+    charge_slices = time_slices(charges_since, created_lt, slice_count)
+    refund_slices = time_slices(refunds_since, created_lt, slice_count)
+    print(f"Fetching charges and refunds in parallel "
+          f"({len(charge_slices)} + {len(refund_slices)} slices, {workers} workers)...")
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        charge_futures = [executor.submit(fetch_slice, stripe.Charge.list, gte, lt) for gte, lt in charge_slices]
+        refund_futures = [executor.submit(fetch_slice, stripe.Refund.list, gte, lt) for gte, lt in refund_slices]
+        charge_objects = merge_slices([future.result() for future in charge_futures])
+        refund_objects = merge_slices([future.result() for future in refund_futures])
+    
+    # Filter for successful charges only
+    charges = [charge_to_row(charge) for charge in charge_objects if charge.status == 'succeeded']
+    refunds = [refund_to_row(refund, refund.charge) for refund in refund_objects]
+    print(f"Fetched {len(charges)} charges and {len(refunds)} refunds")
+    return charges, refunds
+
+def latest_event_checkpoint() -> Dict[str, Any]:
+    """Checkpoint at the newest sync event, so event syncs continue from this export."""
+    events = stripe.Event.list(limit=1, types=SYNC_EVENT_TYPES)
+    if not events.data:
+        return {}
+    return {'last_event_id': events.data[0].id, 'last_event_created': events.data[0].created}
+
+def get_events_since(last_event_id: str = None) -> List[Any]:
+    """
+    Fetch sync events newer than last_event_id, oldest first.
+    
+    Without a checkpoint every retained event is listed. Errors are raised so
+    the checkpoint is never advanced past events that were not fetched.
+    """
+    print("Fetching events...")
+    events = []
+    has_more = True
+    cursor = last_event_id
+    
+    while has_more:
+        if last_event_id:
+            # ending_before pages towards newer events; each page is newest first
+            page = stripe.Event.list(limit=100, types=SYNC_EVENT_TYPES, ending_before=cursor)
+            events.extend(reversed(page.data))
+            if page.data:
+                cursor = page.data[0].id
+        else:
+            page = stripe.Event.list(limit=100, types=SYNC_EVENT_TYPES, starting_after=cursor)
+            events[:0] = reversed(page.data)
+            if page.data:
+                cursor = page.data[-1].id
+        
+        has_more = page.has_more and bool(page.data)
+        print(f"Fetched {len(page.data)} events (Total: {len(events)})")
+        time.sleep(RATE_LIMIT_DELAY)
+    
+    return events
+
+def apply_events(events: List[Any], charges: Dict[str, Dict[str, Any]],
+                 refunds: Dict[str, Dict[str, Any]]) -> Dict[str, set]:
+    """
+    Apply event object snapshots to charges/refunds keyed by object ID.
+    
+    Events are applied oldest first and each one replaces the whole row, so
+    re-applying the same events is idempotent. Returns the touched IDs.
+    """
+    touched = {'charges': set(), 'refunds': set()}
+    for event in sorted(events, key=lambda event: event.created):
+        obj = event.data.object
+        if obj.object == 'charge':
+            # The export only keeps successful charges
+            if obj.status == 'succeeded':
+                charges[obj.id] = charge_to_row(obj)
+                touched['charges'].add(obj.id)
+        elif obj.object == 'refund':
+            refunds[obj.id] = refund_to_row(obj, obj.charge)
+            touched['refunds'].add(obj.id)
+        elif obj.object == 'dispute' and obj.charge in charges:
+            charges[obj.charge]['disputed'] = True
+            touched['charges'].add(obj.charge)
+    return touched
+
+def run_event_sync(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply charge.*/refund.* events since the checkpoint to the CSV exports."""
+    checkpoint = state.get('events', {})
+    if not checkpoint:
+        print(f"No event checkpoint: applying every retained event (last {EVENT_RETENTION_DAYS} days)")
+    elif checkpoint['last_event_created'] < time.time() - EVENT_RETENTION_DAYS * 24 * 3600:
+        print(f"ERROR: Event checkpoint is older than {EVENT_RETENTION_DAYS} days and those events are gone; "
+              f"run a full or --incremental export first.")
+        return None
     
+    events = get_events_since(checkpoint.get('last_event_id'))
+    charges = {row['charge_id']: row for row in load_csv_rows(CHARGES_CSV_PATH)}
+    refunds = {row['refund_id']: row for row in load_csv_rows(REFUNDS_CSV_PATH)}
+    touched = apply_events(events, charges, refunds)
+    
+    touched_charges = [charges[charge_id] for charge_id in touched['charges']]
+    touched_refunds = [refunds[refund_id] for refund_id in touched['refunds']]
+    enrich_refunds(touched_refunds, build_charge_lookup(charges.values()))
+    with CustomerCache(CUSTOMER_CACHE_PATH) as customer_cache:
+        populate_customer_emails(touched_charges, customer_cache)
+        populate_customer_emails(touched_refunds, customer_cache)
+    
+    save_charges_to_csv(sorted(charges.values(), key=lambda x: x['datetime'], reverse=True), CHARGES_CSV_PATH)
+    save_refunds_to_csv(sorted(refunds.values(), key=lambda x: x['datetime'], reverse=True), REFUNDS_CSV_PATH)
+    
+    print(f"\n=== EVENT SYNC SUMMARY ===")
+    print(f"Events applied: {len(events)}")
+    print(f"Charges touched: {len(touched_charges)}")
+    print(f"Refunds touched: {len(touched_refunds)}")
+    
+    if events:
+        newest = events[-1]
+        return {'last_event_id': newest.id, 'last_event_created': newest.created}
+    return checkpoint
+
+class PartialCSV:
+    """
+    CSV written page by page to <path>.partial and promoted only when complete.
+    
+    Every page is flushed and fsynced and its end offset returned, so a resumed
+    run can truncate rows written after the last checkpoint.
+    """
+    
+    def __init__(self, path: str, headers: List[str], resume_offset: int = None):
+        self.path = path
+        self.partial_path = path + '.partial'
+        self.headers = headers
+        if resume_offset is not None and os.path.exists(self.partial_path):
+            self.file = open(self.partial_path, 'r+', newline='', encoding='utf-8')
+            self.file.truncate(resume_offset)
+            self.file.seek(resume_offset)
+            self.writer = csv.DictWriter(self.file, fieldnames=headers)
+        else:
+            self.file = open(self.partial_path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.file, fieldnames=headers)
+            self.writer.writeheader()
+    
+    def write_page(self, rows: List[Dict[str, Any]]) -> int:
+        # Ensure all fields exist with default empty values
+        self.writer.writerows({header: row.get(header, '') for header in self.headers} for row in rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+    
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+
+def export_stream(name: str, writer: PartialCSV, pages, process_page, key: str,
+                  checkpoint: Dict[str, Any], checkpoint_path: str) -> Dict[str, Any]:
+    """
+    Write one stream page by page, checkpointing the cursor after every page.
+    
+    Args:
+        pages: Callable(starting_after) returning a page iterator
+        process_page: Callable(rows) -> rows ready to write (dedupe, enrichment)
+    """
+    stream = checkpoint[name]
     try:
-        # Test API connection
-        account = stripe.Account.retrieve()
-        print(f"✓ Successfully connected to Stripe API (Account: {account.id})")
-    except Exception as e:
-        print(f"ERROR: Failed to connect to Stripe API: {e}")
-        return
+        for page, cursor, *_ in pages(stream.get('starting_after')):
+            page = process_page(page)
+            stream['offset'] = writer.write_page(page)
+            stream['starting_after'] = cursor
+            stream['rows'] += len(page)
+            stream['watermark'] = stream_watermark(page, key, stream.get('watermark'))
+            save_sync_state(checkpoint, checkpoint_path)
+            print(f"Fetched {len(page)} {name} (Total: {stream['rows']})")
+    finally:
+        writer.close()
+    return stream
+
+def promote_stream(path: str, headers: List[str], key: str, incremental: bool) -> tuple:
+    """
+    Atomically replace the final CSV with a finished stream (<path>.partial).
+    
+    Full exports are already newest first and are renamed into place;
+    incremental ones are upserted into the existing CSV first.
+    
+    Returns:
+        tuple: (inserted count, updated count)
+    """
+    partial_path = path + '.partial'
+    if not incremental:
+        os.replace(partial_path, path)
+        return None, None
+    
+    existing = load_csv_rows(path)
+    rows, inserted, updated = upsert_rows(existing, load_csv_rows(partial_path), key)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', newline='', encoding='utf-8') as csvfile:
+        csv_writer = csv.DictWriter(csvfile, fieldnames=headers)
+        csv_writer.writeheader()
+        csv_writer.writerows({header: row.get(header, '') for header in headers} for row in rows)
+    os.replace(temp_path, path)
+    os.remove(partial_path)
+    return inserted, updated
+
+def finish_stream(name: str, path: str, headers: List[str], key: str,
+                  checkpoint: Dict[str, Any], checkpoint_path: str, incremental: bool) -> tuple:
+    """
+    Promote a fully fetched stream and mark it done.
     
-    # Fetch all data
-    charges = get_all_charges()
-    refunds = get_all_refunds()
+    'fetched' is checkpointed before the CSV is replaced, so a run stopped
+    between the two resumes here: with the .partial gone the CSV was already
+    promoted, and nothing is paged on from the last cursor into an empty file.
+    
+    Returns:
+        tuple: (inserted count, updated count)
+    """
+    stream = checkpoint[name]
+    stream['fetched'] = True
+    save_sync_state(checkpoint, checkpoint_path)
+    if os.path.exists(path + '.partial'):
+        changes = promote_stream(path, headers, key, incremental)
+    else:
+        changes = (None, None)
+    stream['done'] = True
+    save_sync_state(checkpoint, checkpoint_path)
+    return changes
+
+def csv_totals(file_path: str) -> tuple:
+    """Row count and amount total of a CSV, streamed."""
+    count = 0
+    total = 0.0
+    if os.path.exists(file_path):
+        with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile):
+                count += 1
+                total += float(row['amount'] or 0)
+    return count, total
+
+def new_export_checkpoint(args, state: Dict[str, Any]) -> Dict[str, Any]:
+    """Starting point of a streaming export: mode, watermarks and empty stream cursors."""
+    checkpoint = {
+        'incremental': args.incremental,
+        'started_at': unix_to_datetime(int(time.time())),
+        # Events from here on are picked up by the next --events run
+        'event_checkpoint': latest_event_checkpoint(),
+    }
+    for name in ('charges', 'refunds'):
+        mark = state.get(name, {}) if args.incremental else {}
+        checkpoint[name] = {'since': mark, 'starting_after': None, 'offset': None, 'rows': 0,
+                            'watermark': mark, 'fetched': False, 'done': False}
+    return checkpoint
+
+def run_streaming_export(args, state: Dict[str, Any]) -> None:
+    """Serial export writing each page to disk as it arrives (resumable)."""
+    checkpoint = load_sync_state(args.checkpoint) if args.resume else {}
+    if args.resume and not checkpoint:
+        print("No unfinished export to resume, starting a new one.")
+    if checkpoint:
+        args.incremental = checkpoint['incremental']
+        print(f"Resuming export started {checkpoint['started_at']} "
+              f"(charges: {checkpoint['charges']['rows']} rows, refunds: {checkpoint['refunds']['rows']} rows)")
+    else:
+        checkpoint = new_export_checkpoint(args, state)
+        save_sync_state(checkpoint, args.checkpoint)
+    
+    charge_mark = checkpoint['charges']['since']
+    refund_mark = checkpoint['refunds']['since']
+    if args.incremental:
+        print(f"Incremental sync: charges since {unix_to_datetime(charge_mark['created']) if charge_mark else 'the beginning'}, "
+              f"refunds since {unix_to_datetime(refund_mark['created']) if refund_mark else 'the beginning'}")
+    
+    changes = {}
+    with CustomerCache(CUSTOMER_CACHE_PATH) as customer_cache:
+        def with_emails(rows):
+            populate_customer_emails(rows, customer_cache, verbose=False)
+            return rows
+        
+        # Charges
+        if not checkpoint['charges']['done']:
+            if not checkpoint['charges'].get('fetched'):
+                print("Fetching charges...")
+                writer = PartialCSV(CHARGES_CSV_PATH, CHARGE_HEADERS, checkpoint['charges']['offset'])
+                export_stream(
+                    'charges', writer,
+                    lambda cursor: iter_charge_pages(charge_mark.get('created'), cursor),
+                    lambda rows: with_emails(skip_seen(rows, 'charge_id', charge_mark)),
+                    'charge_id', checkpoint, args.checkpoint)
+            changes['charges'] = finish_stream('charges', CHARGES_CSV_PATH, CHARGE_HEADERS, 'charge_id',
+                                               checkpoint, args.checkpoint, args.incremental)
+        
+        # Refunds (original charge details from the finished charges CSV)
+        if not checkpoint['refunds']['done']:
+            if not checkpoint['refunds'].get('fetched'):
+                print("Fetching refunds...")
+                charge_lookup = build_charge_lookup(load_csv_rows(CHARGES_CSV_PATH))
+                
+                def enrich_page(rows):
+                    rows = skip_seen(rows, 'refund_id', refund_mark)
+                    enrich_refunds(rows, charge_lookup)
+                    return with_emails(rows)
+                
+                writer = PartialCSV(REFUNDS_CSV_PATH, REFUND_HEADERS, checkpoint['refunds']['offset'])
+                export_stream(
+                    'refunds', writer,
+                    lambda cursor: iter_refund_pages(charge_lookup, refund_mark.get('created'), cursor),
+                    enrich_page, 'refund_id', checkpoint, args.checkpoint)
+            changes['refunds'] = finish_stream('refunds', REFUNDS_CSV_PATH, REFUND_HEADERS, 'refund_id',
+                                               checkpoint, args.checkpoint, args.incremental)
+    
+    new_state = dict(state)
+    new_state.update({
+        'charges': checkpoint['charges']['watermark'],
+        'refunds': checkpoint['refunds']['watermark'],
+    })
+    if not args.incremental or not state.get('events'):
+        new_state['events'] = checkpoint['event_checkpoint']
+    save_sync_state(new_state, args.state)
+    os.remove(args.checkpoint)
+    
+    print_summary(args, changes)
+
+def run_parallel_export(args, account, state: Dict[str, Any]) -> None:
+    """Concurrent time-sliced export, held in memory and written once at the end."""
+    # Events from here on are picked up by the next --events run
+    event_checkpoint = latest_event_checkpoint()
+    
+    charge_mark = state.get('charges', {}) if args.incremental else {}
+    refund_mark = state.get('refunds', {}) if args.incremental else {}
+    existing_charges = load_csv_rows(CHARGES_CSV_PATH) if args.incremental else []
+    existing_refunds = load_csv_rows(REFUNDS_CSV_PATH) if args.incremental else []
+    
+    # Nothing can be older than the account itself
+    account_created = safe_get_nested(account, 'created', default=None) or STRIPE_EPOCH
+    charges, refunds = fetch_parallel(charge_mark.get('created', account_created),
+                                      refund_mark.get('created', account_created), args.workers)
+    charges = skip_seen(charges, 'charge_id', charge_mark)
+    refunds = skip_seen(refunds, 'refund_id', refund_mark)
+    # Refunds of older charges are resolved from the existing charges CSV
+    charge_lookup = build_charge_lookup(existing_charges)
+    charge_lookup.update(build_charge_lookup(charges))
+    enrich_refunds(refunds, charge_lookup)
     
     print(f"Total charges fetched: {len(charges)}")
     print(f"Total refunds fetched: {len(refunds)}")
     
     # Populate customer emails for both charges and refunds
-    if charges:
-        populate_customer_emails(charges)
-        # Sort charges by datetime (most recent first)
-        charges.sort(key=lambda x: x['datetime'], reverse=True)
+    with CustomerCache(CUSTOMER_CACHE_PATH) as customer_cache:
+        if charges:
+            populate_customer_emails(charges, customer_cache)
+        
+        if refunds:
+            populate_customer_emails(refunds, customer_cache)
+    
+    new_state = dict(state)
+    new_state.update({
+        'charges': stream_watermark(charges, 'charge_id', charge_mark),
+        'refunds': stream_watermark(refunds, 'refund_id', refund_mark),
+    })
+    if not args.incremental or not state.get('events'):
+        new_state['events'] = event_checkpoint
     
-    if refunds:
-        populate_customer_emails(refunds)
-        # Sort refunds by datetime (most recent first)
-        refunds.sort(key=lambda x: x['datetime'], reverse=True)
+    # Upsert into the existing exports (full runs start from empty), most recent first
+    charges, charges_inserted, charges_updated = upsert_rows(existing_charges, charges, 'charge_id')
+    refunds, refunds_inserted, refunds_updated = upsert_rows(existing_refunds, refunds, 'refund_id')
     
     # Save to separate CSV files
     save_charges_to_csv(charges, CHARGES_CSV_PATH)
     save_refunds_to_csv(refunds, REFUNDS_CSV_PATH)
+    save_sync_state(new_state, args.state)
     
-    # Print summary
-    total_charge_amount = sum(charge['amount'] for charge in charges)
-    total_refund_amount = sum(refund['amount'] for refund in refunds)
+    print_summary(args, {'charges': (charges_inserted, charges_updated),
+                         'refunds': (refunds_inserted, refunds_updated)})
+
+def print_summary(args, changes: Dict[str, tuple]) -> None:
+    """Print totals of the final CSVs (and inserted/updated counts of incremental runs)."""
+    charge_count, total_charge_amount = csv_totals(CHARGES_CSV_PATH)
+    refund_count, total_refund_amount = csv_totals(REFUNDS_CSV_PATH)
     
     print(f"\n=== EXPORT SUMMARY ===")
-    print(f"Charges: {len(charges)} (Total: ${total_charge_amount:,.2f})")
-    print(f"Refunds: {len(refunds)} (Total: ${total_refund_amount:,.2f})")
+    if args.incremental:
+        for name, (inserted, updated) in changes.items():
+            print(f"New/updated {name}: +{inserted} / {updated}")
+    print(f"Charges: {charge_count} (Total: ${total_charge_amount:,.2f})")
+    print(f"Refunds: {refund_count} (Total: ${total_refund_amount:,.2f})")
     print(f"Net Revenue: ${total_charge_amount - total_refund_amount:,.2f}")
     print(f"Charges CSV saved to: {os.path.abspath(CHARGES_CSV_PATH)}")
     print(f"Refunds CSV saved to: {os.path.abspath(REFUNDS_CSV_PATH)}")
+    print(f"Sync state saved to: {os.path.abspath(args.state)}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export Stripe charges and refunds to CSV')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only fetch objects created since the last run and upsert them into the CSVs')
+    parser.add_argument('--events', action='store_true',
+                        help='Apply charge/refund events since the last checkpoint (catches changes to old objects)')
+    parser.add_argument('--parallel', action='store_true',
+                        help='Fetch charges and refunds concurrently in created-range slices')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Worker threads for --parallel')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the last unfinished export from its checkpointed cursor')
+    parser.add_argument('--state', default=SYNC_STATE_PATH, help='Sync state file (watermarks)')
+    parser.add_argument('--checkpoint', default=EXPORT_CHECKPOINT_PATH, help='Export checkpoint file (--resume)')
+    return parser.parse_args()
+
+def main():
+    """Main function to orchestrate the data extraction and CSV creation."""
+    args = parse_args()
+    print("Starting Stripe transaction export...")
+    print(f"API Key: {STRIPE_API_KEY[:12]}..." if STRIPE_API_KEY and len(STRIPE_API_KEY) > 12 else "API Key not set")
+    
+    # Validate API key
+    if not STRIPE_API_KEY or STRIPE_API_KEY == "sk_test_your_api_key_here":
+        print("ERROR: Please set your Stripe API key in the STRIPE_API_KEY variable.")
+        return
+    
+    try:
+        # Test API connection
+        account = stripe.Account.retrieve()
+        print(f"✓ Successfully connected to Stripe API (Account: {account.id})")
+    except Exception as e:
+        print(f"ERROR: Failed to connect to Stripe API: {e}")
+        return
+    
+    state = load_sync_state(args.state)
+    
+    if args.events:
+        checkpoint = run_event_sync(state)
+        if checkpoint is not None:
+            state['events'] = checkpoint
+            save_sync_state(state, args.state)
+            print(f"Sync state saved to: {os.path.abspath(args.state)}")
+        return
+    
+    if args.parallel:
+        if args.resume:
+            print("ERROR: --resume is only available for serial exports (without --parallel).")
+            return
+        run_parallel_export(args, account, state)
+        return
+    
+    try:
+        run_streaming_export(args, state)
+    except Exception as e:
+        print(f"ERROR: Export interrupted: {e}")
+        print(f"Progress is checkpointed in {os.path.abspath(args.checkpoint)}; "
+              f"run again with --resume to continue. CSVs of unfinished streams were not modified.")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+"""
+Local SQLite store for the CarePortals database
+
+Creates a SQLite database from DatabaseDesign/MySQL/CAREPORTALS_MYSQL_DDL.sql
+(translated to SQLite at load time) and keeps it as the canonical data layer:
+- Indexed tables matching the MySQL design (KEY/UNIQUE KEY -> CREATE INDEX)
+- Transactional upserts keyed on each table's natural key
+- Bulk loaders from Database_CarePortals.xlsx sheets and CSV exports
+- On-demand export back to an Excel workbook
+
+Pipelines can query and update individual rows here instead of re-reading and
+re-serializing the whole workbook on every run.
+
+Usage:
+    python3 Scripts/DataProcessing/careportals_store.py init
+    python3 Scripts/DataProcessing/careportals_store.py load-workbook [GoogleSheets/Database_CarePortals.xlsx]
+    python3 Scripts/DataProcessing/careportals_store.py load-csv CarePortals/Data/order_tracking_full_log_ET.csv
+    python3 Scripts/DataProcessing/careportals_store.py export [GoogleSheets/Database_CarePortals_export.xlsx]
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from workbook_cache import read_sheets, sheet_names
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DDL_PATH = REPO_ROOT / 'DatabaseDesign' / 'MySQL' / 'CAREPORTALS_MYSQL_DDL.sql'
+DEFAULT_STORE_PATH = REPO_ROOT / 'GoogleSheets' / 'careportals.db'
+DEFAULT_WORKBOOK_PATH = REPO_ROOT / 'GoogleSheets' / 'Database_CarePortals.xlsx'
+DEFAULT_EXPORT_PATH = REPO_ROOT / 'GoogleSheets' / 'Database_CarePortals_export.xlsx'
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Natural keys of the append-only logs. The DDL only gives them a surrogate
+# AUTO_INCREMENT id, so the store adds a UNIQUE index on these columns and
+# reloading the same sheet/CSV upserts instead of duplicating every row.
+LOG_KEYS = {
+    'order_status_updates': ['order_id', 'status_updated_at', 'updated_status'],
+    'subscriptions_audit_log': ['subscription_id', 'webhook_received_at', 'trigger_type', 'status'],
+    'error_logs': ['occurred_at', 'error_type', 'error_message'],
+}
+
+# Natural key used as the upsert conflict target for each table
+TABLE_KEYS = {
+    'customers': ['customer_id'],
+    'addresses': ['address_id'],
+    'products': ['product_id'],
+    'coupons': ['coupon_code'],
+    'orders': ['order_id'],
+    'payments': ['charge_id'],
+    'refunds': ['stripe_refund_id'],
+    'subscriptions_active': ['subscription_id'],
+    'subscriptions_paused': ['subscription_id'],
+    'subscriptions_cancelled': ['subscription_id'],
+    'orders_cancelled': ['order_id'],
+    **LOG_KEYS,
+}
+
+SUBSCRIPTION_COLUMNS = {
+    'SubscriptionID': 'subscription_id',
+    'CustomerID': 'customer_id',
+    'ProductID': 'product_id',
+    'Cycle': 'cycle',
+    'Status': 'status',
+    'Datetime Created': 'created_at',
+    'Last Updated': 'updated_at',
+}
+
+# Database_CarePortals.xlsx sheet -> (table, sheet column -> table column)
+SHEET_MAPPINGS = {
+    'customers': ('customers', {}),
+    'addresses': ('addresses', {}),
+    'products': ('products', {'Short_name': 'short_name'}),
+    'coupons': ('coupons', {'coupon_id': 'coupon_code'}),
+    'order.created': ('orders', {'coupon': 'coupon_code'}),
+    'payment_succesful': ('payments', {
+        'order_number': 'order_id',
+        'customer_id': 'stripe_customer_id',
+        'datetime': 'created_at',
+    }),
+    'refund.created': ('refunds', {
+        'refund_id': 'stripe_refund_id',
+        'datetime': 'created_at',
+    }),
+    'subscription.active': ('subscriptions_active', SUBSCRIPTION_COLUMNS),
+    'subscription.paused': ('subscriptions_paused', SUBSCRIPTION_COLUMNS),
+    'subscription.cancelled': ('subscriptions_cancelled', SUBSCRIPTION_COLUMNS),
+    'subscription.full_log': ('subscriptions_audit_log', dict(SUBSCRIPTION_COLUMNS, **{
+        'Datetime Received': 'webhook_received_at',
+        'Trigger Type': 'trigger_type',
+        'Raw Data': 'raw_data',
+    })),
+    'order.updated': ('order_status_updates', {
+        'Datetime Created': 'order_created_at',
+        'Datetime Updated': 'status_updated_at',
+    }),
+    'order.cancelled': ('orders_cancelled', {'deleted_at': 'cancelled_at'}),
+    'Subscription_Errors': ('error_logs', {
+        'Timestamp': 'occurred_at',
+        'Error Type': 'error_type',
+        'Error Message': 'error_message',
+        'Raw Data': 'raw_data',
+        'Trigger': 'trigger_source',
+    }),
+}
+
+# Known CSV exports -> (table, CSV column -> table column)
+CSV_MAPPINGS = {
+    'order_tracking_full_log_ET.csv': ('order_status_updates', {
+        'Order #': 'order_id',
+        'Created Date': 'order_created_at',
+        'Last Update': 'status_updated_at',
+        'Status': 'updated_status',
+    }),
+}
+
+
+# ============================================================================
+# DDL TRANSLATION (MySQL -> SQLite)
+# ============================================================================
+
+def _split_top_level(text, separator=','):
+    """Split on separator outside parentheses and quoted strings"""
+    parts, depth, quote, current = [], 0, None, []
+    for char in text:
+        if quote:
+            current.append(char)
+            if char == quote:
+                quote = None
+            continue
+        if char in ("'", '"'):
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if ''.join(current).strip():
+        parts.append(''.join(current).strip())
+    return parts
+
+
+def _strip_sql_comments(sql):
+    """Remove -- line comments and DELIMITER blocks (stored procedures)"""
+    sql = re.sub(r'DELIMITER //.*?DELIMITER ;', '', sql, flags=re.S)
+    return '\n'.join(line for line in sql.splitlines() if not line.strip().startswith('--'))
+
+
+def _translate_column(definition, autoincrement_pk):
+    """Translate one MySQL column definition to SQLite"""
+    definition = re.sub(r"\s+COMMENT\s+'(?:[^']|'')*'", '', definition)
+    definition = re.sub(r'\s+ON UPDATE CURRENT_TIMESTAMP', '', definition, flags=re.I)
+    definition = re.sub(r'\bDEFAULT TRUE\b', 'DEFAULT 1', definition, flags=re.I)
+    definition = re.sub(r'\bDEFAULT FALSE\b', 'DEFAULT 0', definition, flags=re.I)
+
+    name, column_type, rest = (definition.split(None, 2) + [''])[:3]
+    base_type = column_type.upper().split('(')[0]
+    if base_type in ('BIGINT', 'INT', 'INTEGER', 'SMALLINT', 'TINYINT', 'BOOLEAN'):
+        sqlite_type = 'INTEGER'
+    elif base_type in ('DECIMAL', 'FLOAT', 'DOUBLE'):
+        sqlite_type = 'REAL'
+    elif base_type in ('TIMESTAMP', 'DATETIME'):
+        # Stored as 'YYYY-MM-DD HH:MM:SS'; the declared type lets exports parse it back
+        sqlite_type = 'TIMESTAMP'
+    else:
+        # VARCHAR/CHAR/TEXT/ENUM/JSON are stored as TEXT
+        # (ENUM values are not enforced: live sheets contain values outside them)
+        sqlite_type = 'TEXT'
+
+    if name == autoincrement_pk:
+        return f'{name} INTEGER PRIMARY KEY AUTOINCREMENT'
+
+    rest = re.sub(r'\bAUTO_INCREMENT\b', '', rest, flags=re.I)
+    return f'{name} {sqlite_type} {rest}'.strip()
+
+
+def _translate_create_table(statement):
+    """Translate a CREATE TABLE statement, returning table DDL + index DDL"""
+    header, body = statement.split('(', 1)
+    table = header.split()[-1]
+    body = body[:body.rindex(')')]
+    items = _split_top_level(body)
+
+    primary_key = None
+    for item in items:
+        match = re.match(r'PRIMARY KEY\s*\(([^)]*)\)', item, flags=re.I)
+        if match:
+            primary_key = [c.strip() for c in match.group(1).split(',')]
+
+    autoincrement_pk = None
+    for item in items:
+        if re.search(r'\bAUTO_INCREMENT\b', item, flags=re.I):
+            autoincrement_pk = item.split()[0]
+
+    columns, constraints, indexes = [], [], []
+    for item in items:
+        upper = item.upper()
+        index_match = re.match(r'(UNIQUE\s+)?KEY\s+(\w+)\s*\(([^)]*)\)', item, flags=re.I)
+        if index_match:
+            unique = 'UNIQUE ' if index_match.group(1) else ''
+            indexes.append(
+                f'CREATE {unique}INDEX IF NOT EXISTS {table}_{index_match.group(2)} '
+                f'ON {table} ({index_match.group(3)})'
+            )
+        elif upper.startswith('PRIMARY KEY'):
+            if primary_key != [autoincrement_pk]:
+                constraints.append(item)
+        elif upper.startswith('CONSTRAINT'):
+            constraints.append(' '.join(item.split()))
+        else:
+            columns.append(_translate_column(item, autoincrement_pk))
+
+    table_sql = f'CREATE TABLE IF NOT EXISTS {table} (\n    ' + ',\n    '.join(columns + constraints) + '\n)'
+    return table_sql, indexes
+
+
+def translate_mysql_ddl(sql):
+    """
+    Translate the CarePortals MySQL DDL into SQLite statements.
+
+    Args:
+        sql (str): MySQL DDL script
+
+    Returns:
+        list: SQLite statements (tables, then indexes, then views)
+    """
+    tables, indexes, views = [], [], []
+    for statement in _split_top_level(_strip_sql_comments(sql), ';'):
+        upper = statement.upper()
+        if upper.startswith('CREATE TABLE'):
+            table_sql, table_indexes = _translate_create_table(statement)
+            tables.append(table_sql)
+            indexes.extend(table_indexes)
+        elif upper.startswith('CREATE VIEW'):
+            views.append(re.sub(r'^CREATE VIEW', 'CREATE VIEW IF NOT EXISTS', statement, flags=re.I))
+        # CREATE DATABASE / USE / GRANT have no SQLite equivalent
+    return tables + indexes + views
+
+
+# ============================================================================
+# VALUE CONVERSION
+# ============================================================================
+
+def _to_sql_frame(df):
+    """Convert a DataFrame into SQLite-friendly python values (None for blanks)"""
+    converted = pd.DataFrame(index=df.index)
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime(TIMESTAMP_FORMAT)
+        elif pd.api.types.is_bool_dtype(series):
+            series = series.astype('Int64')
+        elif pd.api.types.is_float_dtype(series):
+            values = series.dropna()
+            # Excel stores integer columns with blanks as float (e.g. card_last4 5056.0)
+            if len(values) > 0 and np.all(np.mod(values, 1) == 0):
+                series = series.astype('Int64')
+        elif series.dtype == object:
+            series = series.map(
+                lambda value: value.strftime(TIMESTAMP_FORMAT) if isinstance(value, pd.Timestamp) else value)
+        converted[column] = series.astype(object).where(series.notna(), None)
+    return converted
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class CarePortalsStore:
+    """SQLite-backed CarePortals database created from the MySQL DDL"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, ddl_path=DDL_PATH):
+        self.path = str(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._columns = {}
+        if not self.table_exists('customers'):
+            self.create_schema(ddl_path)
+        self._ensure_log_keys()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def create_schema(self, ddl_path=DDL_PATH):
+        """Create every table, index and view from the MySQL DDL"""
+        with open(ddl_path, 'r', encoding='utf-8') as f:
+            statements = translate_mysql_ddl(f.read())
+        with self.transaction() as conn:
+            for statement in statements:
+                conn.execute(statement)
+            # Store metadata: column order of each loaded sheet, used by exports
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS store_sheet_layouts ('
+                'sheet_name TEXT PRIMARY KEY, columns TEXT NOT NULL)')
+        self._columns = {}
+
+    def _ensure_log_keys(self):
+        """Create the LOG_KEYS unique indexes (dropping repeats left by older appending loads)"""
+        existing = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        with self.transaction() as conn:
+            for table, key in LOG_KEYS.items():
+                index = f'{table}_natural_key'
+                if index in existing:
+                    continue
+                columns = ', '.join(key)
+                conn.execute(f'DELETE FROM {table} WHERE rowid NOT IN '
+                             f'(SELECT MIN(rowid) FROM {table} GROUP BY {columns})')
+                conn.execute(f'CREATE UNIQUE INDEX {index} ON {table} ({columns})')
+
+    @contextmanager
+    def transaction(self):
+        """Commit on success, roll back everything on error"""
+        try:
+            yield self.conn
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def table_exists(self, table):
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        return row is not None
+
+    def table_info(self, table):
+        """Return [(name, notnull, default, pk)] for a table (cached)"""
+        if table not in self._columns:
+            rows = self.conn.execute(f'PRAGMA table_info({table})').fetchall()
+            self._columns[table] = [(row[1], row[3], row[4], row[5]) for row in rows]
+            self._columns[(table, 'timestamps')] = [row[1] for row in rows if row[2] == 'TIMESTAMP']
+        return self._columns[table]
+
+    def timestamp_columns(self, table):
+        self.table_info(table)
+        return self._columns[(table, 'timestamps')]
+
+    def columns(self, table):
+        return [name for name, _, _, _ in self.table_info(table)]
+
+    def query(self, sql, params=()):
+        """Run a SELECT and return a DataFrame"""
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def _prepare(self, table, df):
+        """Select table columns, convert values and drop rows violating NOT NULL"""
+        table_columns = self.columns(table)
+        df = df[[c for c in df.columns if c in table_columns]]
+        df = _to_sql_frame(df)
+
+        required = [name for name, notnull, default, pk in self.table_info(table)
+                    if notnull and default is None]
+        missing_required = [c for c in required if c not in df.columns]
+        if missing_required:
+            raise ValueError(f"{table}: missing required columns {missing_required}")
+
+        valid = df[required].notna().all(axis=1) if required else pd.Series(True, index=df.index)
+        return df[valid], int((~valid).sum())
+
+    def upsert(self, table, df, key=None, conn=None):
+        """
+        Insert or update rows in one transaction.
+
+        Rows are matched on the table's natural key (TABLE_KEYS) unless key is
+        given; tables without a key are appended. Rows missing NOT NULL values
+        are skipped and counted; rows repeating a key within df are collapsed
+        to the last one and counted as duplicates.
+
+        Args:
+            table (str): Target table
+            df (pd.DataFrame): Rows using table column names
+            key (list): Conflict target override
+            conn: Open connection to join an outer transaction
+
+        Returns:
+            dict: {'written': n, 'skipped': n, 'duplicates': n}
+        """
+        key = key if key is not None else TABLE_KEYS.get(table)
+        rows, skipped = self._prepare(table, df)
+        duplicates = 0
+        if key:
+            repeated = rows.duplicated(subset=key, keep='last')
+            duplicates = int(repeated.sum())
+            rows = rows[~repeated]
+        if len(rows) == 0:
+            return {'written': 0, 'skipped': skipped, 'duplicates': duplicates}
+
+        columns = list(rows.columns)
+        placeholders = ', '.join('?' for _ in columns)
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        if key:
+            updates = [f'{c} = excluded.{c}' for c in columns if c not in key]
+            if 'updated_at' in self.columns(table) and 'updated_at' not in columns:
+                updates.append('updated_at = CURRENT_TIMESTAMP')
+            action = f"DO UPDATE SET {', '.join(updates)}" if updates else 'DO NOTHING'
+            sql += f" ON CONFLICT ({', '.join(key)}) {action}"
+
+        values = list(rows.itertuples(index=False, name=None))
+        if conn is not None:
+            conn.executemany(sql, values)
+        else:
+            with self.transaction() as tx:
+                tx.executemany(sql, values)
+        return {'written': len(values), 'skipped': skipped, 'duplicates': duplicates}
+
+    def replace_table(self, table, df):
+        """Replace all rows of a table in one transaction"""
+        with self.transaction() as conn:
+            conn.execute(f'DELETE FROM {table}')
+            return self.upsert(table, df, conn=conn)
+
+    def delete(self, table, column, values, conn=None):
+        """Delete rows whose column is in values"""
+        values = list(values)
+        if not values:
+            return 0
+        placeholders = ', '.join('?' for _ in values)
+        sql = f'DELETE FROM {table} WHERE {column} IN ({placeholders})'
+        if conn is not None:
+            return conn.execute(sql, values).rowcount
+        with self.transaction() as tx:
+            return tx.execute(sql, values).rowcount
+
+    def load_frame(self, table, df, column_mapping=None, replace=False):
+        """
+        Load a sheet/CSV frame: upsert on the natural key (reloading a source
+        is idempotent), or replace a log table's rows when replace=True
+        """
+        df = df.rename(columns=column_mapping or {})
+        if replace and table in LOG_KEYS:
+            return self.replace_table(table, df)
+        return self.upsert(table, df)
+
+    def load_workbook(self, workbook_path=DEFAULT_WORKBOOK_PATH, sheets=None, replace=False):
+        """
+        Bulk load Database_CarePortals.xlsx sheets into their tables.
+
+        Args:
+            replace (bool): Replace the rows of the log tables (LOG_KEYS)
+                instead of upserting into them
+
+        Returns:
+            dict: sheet -> {'table', 'written', 'skipped', 'duplicates'} (or {'error'})
+        """
+        available = sheet_names(workbook_path)
+        wanted = [name for name in sheets or SHEET_MAPPINGS if name in available and name in SHEET_MAPPINGS]
+        workbook = read_sheets(workbook_path, wanted)
+        results = {}
+        for sheet_name in wanted:
+            table, column_mapping = SHEET_MAPPINGS[sheet_name]
+            try:
+                df = workbook[sheet_name]
+                counts = self.load_frame(table, df, column_mapping, replace=replace)
+                self.save_sheet_layout(sheet_name, list(df.columns))
+                results[sheet_name] = dict(counts, table=table)
+            except (sqlite3.Error, ValueError) as e:
+                results[sheet_name] = {'table': table, 'error': str(e)}
+        return results
+
+    def load_csv(self, csv_path, table=None, column_mapping=None, replace=False):
+        """Bulk load a CSV export (known layouts are mapped automatically)"""
+        if table is None:
+            csv_name = os.path.basename(csv_path)
+            if csv_name not in CSV_MAPPINGS:
+                raise ValueError(f"Unknown CSV layout '{csv_name}' (pass --table); "
+                                 f"known files: {', '.join(CSV_MAPPINGS)}")
+            table, column_mapping = CSV_MAPPINGS[csv_name]
+        df = pd.read_csv(csv_path)
+        return dict(self.load_frame(table, df, column_mapping, replace=replace), table=table)
+
+    def save_sheet_layout(self, sheet_name, columns):
+        """Remember a sheet's column order so exports reproduce it"""
+        with self.transaction() as conn:
+            conn.execute(
+                'INSERT INTO store_sheet_layouts (sheet_name, columns) VALUES (?, ?) '
+                'ON CONFLICT (sheet_name) DO UPDATE SET columns = excluded.columns',
+                (sheet_name, json.dumps([str(c) for c in columns])))
+
+    def sheet_layout(self, sheet_name):
+        row = self.conn.execute(
+            'SELECT columns FROM store_sheet_layouts WHERE sheet_name = ?', (sheet_name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def read_sheet(self, sheet_name):
+        """Read a table back using its workbook sheet column names"""
+        table, column_mapping = SHEET_MAPPINGS[sheet_name]
+        surrogate = [name for name, _, _, pk in self.table_info(table)
+                     if pk and name not in TABLE_KEYS.get(table, [])]
+        df = self.query(f'SELECT * FROM {table}').drop(columns=surrogate)
+        for column in self.timestamp_columns(table):
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+        df = df.rename(
+            columns={v: k for k, v in column_mapping.items()})
+        layout = self.sheet_layout(sheet_name)
+        return df.reindex(columns=layout) if layout else df
+
+    def export_workbook(self, output_path=DEFAULT_EXPORT_PATH, sheets=None):
+        """Write the store back out as an Excel workbook (on demand)"""
+        sheets = sheets or list(SHEET_MAPPINGS)
+        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+            for sheet_name in sheets:
+                self.read_sheet(sheet_name).to_excel(writer, sheet_name=sheet_name, index=False)
+        return output_path
+
+    def foreign_key_violations(self):
+        """Return rows that break the DDL foreign keys (not enforced on load)"""
+        rows = self.conn.execute('PRAGMA foreign_key_check').fetchall()
+        return pd.DataFrame(rows, columns=['table', 'rowid', 'parent', 'fkid'])
+
+
+def _load_notes(result):
+    """' (n skipped, n duplicate keys)' suffix for a load result, or ''"""
+    notes = []
+    if result['skipped']:
+        notes.append(f"{result['skipped']} skipped")
+    if result.get('duplicates'):
+        notes.append(f"{result['duplicates']} duplicate keys collapsed")
+    return f" ({', '.join(notes)})" if notes else ''
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Local SQLite store for the CarePortals database')
+    parser.add_argument('--db', default=str(DEFAULT_STORE_PATH), help='SQLite database path')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('init', help='Create the schema from the MySQL DDL')
+
+    load_workbook = subparsers.add_parser('load-workbook', help='Load Database_CarePortals.xlsx sheets')
+    load_workbook.add_argument('workbook', nargs='?', default=str(DEFAULT_WORKBOOK_PATH))
+    load_workbook.add_argument('--replace', action='store_true',
+                               help='Replace the rows of the log tables instead of upserting')
+
+    load_csv = subparsers.add_parser('load-csv', help='Load a CSV export')
+    load_csv.add_argument('csv_path')
+    load_csv.add_argument('--table', help='Target table (required for unknown layouts)')
+    load_csv.add_argument('--replace', action='store_true',
+                          help='Replace the rows of the target log table instead of upserting')
+
+    export = subparsers.add_parser('export', help='Export the store to an Excel workbook')
+    export.add_argument('output', nargs='?', default=str(DEFAULT_EXPORT_PATH))
+
+    args = parser.parse_args()
+
+    with CarePortalsStore(args.db) as store:
+        if args.command == 'init':
+            print(f"✅ Schema ready: {args.db}")
+        elif args.command == 'load-workbook':
+            print(f"📂 Loading {args.workbook} into {args.db}")
+            for sheet_name, result in store.load_workbook(args.workbook, replace=args.replace).items():
+                if 'error' in result:
+                    print(f"  ❌ {sheet_name} → {result['table']}: {result['error']}")
+                else:
+                    print(f"  ✅ {sheet_name} → {result['table']}: {result['written']} rows{_load_notes(result)}")
+        elif args.command == 'load-csv':
+            try:
+                result = store.load_csv(args.csv_path, table=args.table, replace=args.replace)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                print(f"❌ Error: {e}")
+                return 1
+            print(f"✅ {args.csv_path} → {result['table']}: {result['written']} rows{_load_notes(result)}")
+        elif args.command == 'export':
+            print(f"✅ Exported to {store.export_workbook(args.output)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Chunked single-pass data profiler
+
+Streams a CSV (or takes DataFrames) chunk by chunk and keeps mergeable
+per-column statistics, so every completeness and range check comes out of
+one read:
+- null / empty counts (NaN-like tokens vs empty strings)
+- numeric count, invalid values, min, max, mean, sum, zeros
+- top-k values and distinct count (exact up to MAX_TRACKED_VALUES)
+- date count, invalid values, min, max, recent count and samples
+
+Column kinds (numeric, date, text) are inferred from the first non-empty
+values seen, or forced with numeric_columns/date_columns. Profiles of
+separate chunks or files merge with DataProfiler.merge, and report() returns
+a JSON-serializable dict that can be saved and diffed between runs.
+
+Usage:
+    python data_profiler.py Stripe/stripe_charges.csv --output charges_profile.json
+    python data_profiler.py Stripe/stripe_charges.csv --diff charges_profile.json
+
+    from data_profiler import profile_csv
+    report = profile_csv('stripe_charges.csv')
+"""
+
+import argparse
+import json
+import math
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+CHUNK_SIZE = 100_000
+TOP_K = 10
+MAX_TRACKED_VALUES = 10_000  # Distinct values counted exactly per column before pruning
+KIND_THRESHOLD = 0.9  # Share of parseable values needed to treat a column as numeric/date
+RECENT_DAYS = 7
+SAMPLE_SIZE = 3
+NULL_TOKENS = {'nan', 'NaN', 'None', 'none', 'null', 'NULL', 'NaT', '<NA>'}
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+NUMERIC = 'numeric'
+DATE = 'date'
+TEXT = 'text'
+
+
+class ColumnProfile:
+    """Mergeable statistics for one column"""
+
+    def __init__(self, name, kind=None, top_k=TOP_K, reference_time=None, recent_days=RECENT_DAYS):
+        self.name = name
+        self.kind = kind
+        self.top_k = top_k
+        self.recent_after = (reference_time or datetime.now()) - timedelta(days=recent_days)
+        self.recent_days = recent_days
+        self.count = 0
+        self.nulls = 0
+        self.empty = 0
+        self.invalid = 0
+        self.valid = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.zeros = 0
+        self.recent = 0
+        self.samples = []
+        self.values = Counter()
+        self.approximate = False
+
+    # ------------------------------------------------------------------
+    # Update
+    # ------------------------------------------------------------------
+
+    def update(self, series):
+        """Add one chunk of values"""
+        self.count += len(series)
+        is_text = series.dtype == object or pd.api.types.is_string_dtype(series)
+        if is_text:
+            text = series.astype(object)
+            nulls = text.isin(NULL_TOKENS) | text.isna()
+            empty = text == ''
+        else:
+            nulls = series.isna()
+            empty = pd.Series(False, index=series.index)
+        self.nulls += int(nulls.sum())
+        self.empty += int(empty.sum())
+
+        present = series[~(nulls | empty)]
+        if len(present) == 0:
+            return
+        if self.kind is None:
+            self.kind = infer_kind(present)
+
+        if self.kind == NUMERIC:
+            self._update_numeric(present)
+        elif self.kind == DATE:
+            self._update_dates(present)
+        self._update_values(present)
+
+    def _update_range(self, low, high):
+        self.minimum = low if self.minimum is None else min(self.minimum, low)
+        self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+    def _update_numeric(self, present):
+        numbers = pd.to_numeric(present, errors='coerce')
+        valid = numbers.dropna()
+        self.invalid += len(numbers) - len(valid)
+        if len(valid):
+            self.valid += len(valid)
+            self.total += float(valid.sum())
+            self.zeros += int((valid == 0).sum())
+            self._update_range(float(valid.min()), float(valid.max()))
+
+    def _update_dates(self, present):
+        dates = parse_dates(present)
+        valid = dates.dropna()
+        self.invalid += len(dates) - len(valid)
+        if len(valid):
+            self.valid += len(valid)
+            self.recent += int((valid > self.recent_after).sum())
+            self._update_range(valid.min().to_pydatetime(), valid.max().to_pydatetime())
+            if len(self.samples) < SAMPLE_SIZE:
+                self.samples += [value.to_pydatetime() for value in valid.iloc[:SAMPLE_SIZE - len(self.samples)]]
+
+    def _update_values(self, present):
+        if self.kind == DATE:
+            return
+        counts = present.astype(str).value_counts()
+        if len(counts) > MAX_TRACKED_VALUES:
+            # High-cardinality chunk (IDs): only its most frequent values can reach the top-k
+            counts = counts.iloc[:MAX_TRACKED_VALUES // 2]
+            self.approximate = True
+        self.values.update(counts.to_dict())
+        self._prune()
+
+    def _prune(self):
+        """Keep the most frequent values once the column gets high-cardinality"""
+        if len(self.values) > MAX_TRACKED_VALUES:
+            self.values = Counter(dict(self.values.most_common(MAX_TRACKED_VALUES // 2)))
+            self.approximate = True
+
+    # ------------------------------------------------------------------
+    # Merge / report
+    # ------------------------------------------------------------------
+
+    def merge(self, other):
+        """Fold another profile of the same column into this one"""
+        self.kind = self.kind or other.kind
+        for attribute in ('count', 'nulls', 'empty', 'invalid', 'valid', 'total', 'zeros', 'recent'):
+            setattr(self, attribute, getattr(self, attribute) + getattr(other, attribute))
+        if other.minimum is not None:
+            self._update_range(other.minimum, other.maximum)
+        self.samples = (self.samples + other.samples)[:SAMPLE_SIZE]
+        self.values.update(other.values)
+        self.approximate = self.approximate or other.approximate
+        self._prune()
+        return self
+
+    def report(self):
+        missing = self.nulls + self.empty
+        report = {
+            'kind': self.kind or TEXT,
+            'count': self.count,
+            'nulls': self.nulls,
+            'empty': self.empty,
+            'missing': missing,
+            'missing_pct': round(missing / self.count * 100, 2) if self.count else 0.0,
+        }
+        if self.kind == NUMERIC:
+            report.update({
+                'valid': self.valid,
+                'invalid': self.invalid,
+                'min': _number(self.minimum),
+                'max': _number(self.maximum),
+                'mean': _number(self.total / self.valid) if self.valid else None,
+                'sum': _number(self.total),
+                'zeros': self.zeros,
+            })
+        elif self.kind == DATE:
+            report.update({
+                'valid': self.valid,
+                'invalid': self.invalid,
+                'min': self.minimum.strftime(DATE_FORMAT) if self.minimum else None,
+                'max': self.maximum.strftime(DATE_FORMAT) if self.maximum else None,
+                f'recent_{self.recent_days}d': self.recent,
+                'samples': [value.strftime(DATE_FORMAT) for value in self.samples],
+            })
+        if self.kind != DATE:
+            report.update({
+                'distinct': len(self.values),
+                'distinct_approximate': self.approximate,
+                'top_values': [[value, count] for value, count in self.values.most_common(self.top_k)],
+            })
+        return report
+
+
+def _number(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return round(value, 6)
+
+
+def parse_dates(values):
+    """Parse date strings (ISO first, mixed formats as fallback)"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    dates = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    if dates.isna().mean() > 1 - KIND_THRESHOLD:
+        dates = pd.to_datetime(values, errors='coerce', format='mixed')
+    if getattr(dates.dt, 'tz', None) is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates
+
+
+def infer_kind(present):
+    """numeric, date or text from the non-empty values of a column"""
+    if pd.api.types.is_bool_dtype(present):
+        return TEXT
+    if pd.api.types.is_numeric_dtype(present):
+        return NUMERIC
+    if pd.api.types.is_datetime64_any_dtype(present):
+        return DATE
+    sample = present.iloc[:1000].astype(str)
+    if pd.to_numeric(sample, errors='coerce').notna().mean() >= KIND_THRESHOLD:
+        return NUMERIC
+    if sample.str.contains(r'\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4}', regex=True).mean() >= KIND_THRESHOLD \
+            and parse_dates(sample).notna().mean() >= KIND_THRESHOLD:
+        return DATE
+    return TEXT
+
+
+class DataProfiler:
+    """Per-column profiles over any number of chunks"""
+
+    def __init__(self, top_k=TOP_K, numeric_columns=(), date_columns=(), reference_time=None,
+                 recent_days=RECENT_DAYS):
+        self.top_k = top_k
+        self.kinds = dict({column: NUMERIC for column in numeric_columns},
+                          **{column: DATE for column in date_columns})
+        self.reference_time = reference_time or datetime.now()
+        self.recent_days = recent_days
+        self.columns = {}
+        self.rows = 0
+        self.chunks = 0
+
+    def _column(self, name):
+        if name not in self.columns:
+            self.columns[name] = ColumnProfile(name, self.kinds.get(name), self.top_k,
+                                               self.reference_time, self.recent_days)
+        return self.columns[name]
+
+    def update(self, df):
+        """Add one chunk (DataFrame)"""
+        self.rows += len(df)
+        self.chunks += 1
+        for name in df.columns:
+            self._column(name).update(df[name])
+        return self
+
+    def merge(self, other):
+        """Fold another profiler (e.g. of another chunk range) into this one"""
+        self.rows += other.rows
+        self.chunks += other.chunks
+        for name, column in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(column)
+            else:
+                self.columns[name] = column
+        return self
+
+    def report(self, source=None):
+        return {
+            'source': source,
+            'profiled_at': self.reference_time.strftime(DATE_FORMAT),
+            'rows': self.rows,
+            'chunks': self.chunks,
+            'columns': {name: column.report() for name, column in self.columns.items()},
+        }
+
+
+def profile_csv(path, chunksize=CHUNK_SIZE, **kwargs):
+    """
+    Profile a CSV in one streaming pass.
+
+    Args:
+        path (str): CSV path
+        chunksize (int): Rows per chunk
+        **kwargs: DataProfiler options (top_k, numeric_columns, date_columns, ...)
+
+    Returns:
+        dict: Profile report
+    """
+    profiler = DataProfiler(**kwargs)
+    for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize):
+        profiler.update(chunk)
+    return profiler.report(str(path))
+
+
+def profile_frame(df, **kwargs):
+    """Profile an in-memory DataFrame"""
+    return DataProfiler(**kwargs).update(df).report()
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def diff_reports(old, new):
+    """
+    Compare two profile reports.
+
+    Returns:
+        list: (column, statistic, old value, new value) for every changed statistic,
+        with '(column)' as statistic for added/removed columns
+    """
+    changes = []
+    if old.get('rows') != new.get('rows'):
+        changes.append(('*', 'rows', old.get('rows'), new.get('rows')))
+    old_columns, new_columns = old.get('columns', {}), new.get('columns', {})
+    for name in sorted(set(old_columns) | set(new_columns)):
+        if name not in new_columns or name not in old_columns:
+            changes.append((name, '(column)', name in old_columns, name in new_columns))
+            continue
+        for statistic in sorted(set(old_columns[name]) | set(new_columns[name])):
+            before, after = old_columns[name].get(statistic), new_columns[name].get(statistic)
+            if before != after:
+                changes.append((name, statistic, before, after))
+    return changes
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Single-pass CSV profiler with JSON reports')
+    parser.add_argument('csv', help='CSV file to profile')
+    parser.add_argument('--output', help='Save the JSON report here')
+    parser.add_argument('--diff', help='Compare with a previously saved JSON report')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--top-k', type=int, default=TOP_K)
+    parser.add_argument('--numeric', action='append', default=[], help='Force a numeric column (repeatable)')
+    parser.add_argument('--date', action='append', default=[], help='Force a date column (repeatable)')
+    args = parser.parse_args()
+
+    report = profile_csv(args.csv, args.chunksize, top_k=args.top_k,
+                         numeric_columns=args.numeric, date_columns=args.date)
+    print(f"📊 {args.csv}: {report['rows']} rows, {len(report['columns'])} columns, {report['chunks']} chunks")
+    for name, column in report['columns'].items():
+        line = f"   {name}: {column['kind']}, {column['missing']} missing ({column['missing_pct']:.1f}%)"
+        if column['kind'] in (NUMERIC, DATE) and column.get('min') is not None:
+            line += f", {column['min']} → {column['max']}"
+        print(line)
+
+    if args.diff:
+        changes = diff_reports(load_report(args.diff), report)
+        print(f"\n🔍 {len(changes)} changes since {args.diff}")
+        for name, statistic, before, after in changes:
+            print(f"   {name}.{statistic}: {before} → {after}")
+
+    if args.output:
+        save_report(report, args.output)
+        print(f"\n✅ Report saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
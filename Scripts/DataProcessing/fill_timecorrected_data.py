@@ -13,6 +13,7 @@ This script:
 import pandas as pd
 import sys
 import os
+from workbook_cache import read_sheets
 
 def main():
     print("=== FILLING DATA_TIMECORRECTED.CSV ===")
@@ -33,20 +34,23 @@ def main():
         # Read relevant sheets from Excel file
         print(f"\nReading Excel file: {excel_file}")
 
+        # Read the four sheets in one pass (cached per workbook version)
+        sheets = read_sheets(excel_file, ['order.created', 'customers', 'addresses', 'products'])
+
         # Read order.created sheet for product_id and customer_id mapping
-        orders_df = pd.read_excel(excel_file, sheet_name='order.created')
+        orders_df = sheets['order.created']
         print(f"Orders sheet: {len(orders_df)} rows")
 
         # Read customers sheet for customer details
-        customers_df = pd.read_excel(excel_file, sheet_name='customers')
+        customers_df = sheets['customers']
         print(f"Customers sheet: {len(customers_df)} rows")
 
         # Read addresses sheet for state information
-        addresses_df = pd.read_excel(excel_file, sheet_name='addresses')
+        addresses_df = sheets['addresses']
         print(f"Addresses sheet: {len(addresses_df)} rows")
 
         # Read products sheet for product names
-        products_df = pd.read_excel(excel_file, sheet_name='products')
+        products_df = sheets['products']
         print(f"Products sheet: {len(products_df)} rows")
 
         print("\n=== MERGING DATA ===")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Keyed upsert engine for Database_CarePortals.xlsx sheets
+
+Aligns an incoming frame with an existing sheet on a key column and applies
+column-level merge policies as vectorized operations:
+- KEEP: existing values are never touched (default)
+- FILL_IF_EMPTY: only blank existing cells take the incoming value
+- OVERWRITE: incoming non-blank values replace existing ones
+
+Keys not present in the existing sheet are appended in a single concat.
+A change report (inserted keys, updated keys and per-cell changes) is returned
+so callers can print or persist what happened.
+
+Usage:
+    from keyed_upsert import keyed_upsert, FILL_IF_EMPTY, OVERWRITE
+    merged_df, report = keyed_upsert(existing_df, new_df, 'SubscriptionID',
+                                     {'CustomerID': FILL_IF_EMPTY, 'Status': OVERWRITE})
+"""
+
+import pandas as pd
+
+KEEP = 'keep'
+FILL_IF_EMPTY = 'fill_if_empty'
+OVERWRITE = 'overwrite'
+
+CHANGE_COLUMNS = ['column', 'old_value', 'new_value']
+
+
+def _empty_report(key):
+    """Report with no inserts and no updates"""
+    return {
+        'key': key,
+        'inserted': [],
+        'updated': [],
+        'changes': pd.DataFrame(columns=[key] + CHANGE_COLUMNS),
+    }
+
+
+def keyed_upsert(existing_df, new_df, key, policies=None):
+    """
+    Upsert new_df into existing_df by key.
+
+    Args:
+        existing_df (pd.DataFrame): Current sheet contents
+        new_df (pd.DataFrame): Incoming rows (last row wins on duplicate keys)
+        key (str): Column both frames are aligned on
+        policies (dict): column -> KEEP | FILL_IF_EMPTY | OVERWRITE
+
+    Returns:
+        tuple: (merged DataFrame, change report dict)
+    """
+    policies = policies or {}
+    report = _empty_report(key)
+
+    if len(new_df) == 0:
+        return existing_df.copy(), report
+
+    incoming = new_df.drop_duplicates(subset=[key], keep='last')
+
+    if len(existing_df) == 0:
+        report['inserted'] = incoming[key].tolist()
+        return incoming.reset_index(drop=True), report
+
+    merged = existing_df.reset_index(drop=True)
+
+    # Only the first occurrence of a key is updated, like the row-by-row merge did
+    matched = ~merged[key].duplicated(keep='first') & merged[key].isin(incoming[key])
+    matched_rows = merged.index[matched]
+    aligned = incoming.set_index(key).reindex(merged.loc[matched_rows, key])
+    aligned.index = matched_rows
+
+    changes = []
+    for column, policy in policies.items():
+        if policy == KEEP or column not in aligned.columns:
+            continue
+        if policy not in (FILL_IF_EMPTY, OVERWRITE):
+            raise ValueError(f"Unknown merge policy for {column}: {policy}")
+
+        if column not in merged.columns:
+            merged[column] = None
+
+        current = merged.loc[matched_rows, column]
+        candidate = aligned[column]
+
+        if policy == FILL_IF_EMPTY:
+            changed = current.isna() & candidate.notna()
+        else:
+            changed = candidate.notna() & (current.isna() | (current != candidate))
+
+        if not changed.any():
+            continue
+
+        changed_rows = changed.index[changed]
+        changes.append(pd.DataFrame({
+            key: merged.loc[changed_rows, key].values,
+            'column': column,
+            'old_value': current[changed_rows].values,
+            'new_value': candidate[changed_rows].values,
+        }))
+
+        replacement = candidate[changed_rows].reindex(merged.index)
+        merged[column] = merged[column].mask(replacement.notna(), replacement)
+
+    if changes:
+        report['changes'] = pd.concat(changes, ignore_index=True)
+        report['updated'] = report['changes'][key].drop_duplicates().tolist()
+
+    # Append every new key in a single concat
+    new_rows = incoming[~incoming[key].isin(merged[key])]
+    if len(new_rows) > 0:
+        report['inserted'] = new_rows[key].tolist()
+        merged = pd.concat([merged, new_rows], ignore_index=True)
+
+    return merged, report
+
+
+def summarize_report(report):
+    """Return {'inserted': n, 'updated': n, '<column>': n, ...} counts"""
+    summary = {
+        'inserted': len(report['inserted']),
+        'updated': len(report['updated']),
+    }
+    if len(report['changes']) > 0:
+        summary.update(report['changes']['column'].value_counts().to_dict())
+    return summary
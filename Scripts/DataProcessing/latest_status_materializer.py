@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Incremental latest-status view of an append-only order log
+
+Keeps one row per order (the most recent log row, plus the time the order
+was first seen) and applies only the rows appended to the log since the
+last run:
+- a checkpoint stores the byte offset read up to, the header and a hash of
+  the log's first bytes
+- each run seeks to the offset, parses the new complete lines and merges
+  their latest row per order into the state table
+- if the log was truncated or rewritten (size below the offset or a
+  different head hash), the state is rebuilt from the start
+
+Supported logs (same layouts as order_event_store.py):
+- order_tracking_full_log_ET.csv  -> order_tracking_latest_orders_ET.csv
+- order.updated CSV exports (Order ID / Timestamp), e.g. for latest_updated_order.csv
+
+The state (log columns + First Seen) and checkpoint are written next to the
+output as <output>.state.csv and <output>.checkpoint.json.
+
+Usage:
+    python latest_status_materializer.py
+    python latest_status_materializer.py --log "../../CarePortals/Data/CarePortals_Orders - order.updated.csv" \\
+        --output ../../CarePortals/Data/latest_updated_order.csv
+    python latest_status_materializer.py --rebuild
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from order_event_store import FULL_LOG_PATH, SOURCE_LAYOUTS
+
+LATEST_PATH = FULL_LOG_PATH.with_name('order_tracking_latest_orders_ET.csv')
+FIRST_SEEN_COLUMN = 'First Seen'
+HEAD_BYTES = 64 * 1024  # Prefix hashed to detect a rewritten log
+
+
+def state_paths(output_path):
+    """(state CSV, checkpoint JSON) paths for an output file"""
+    output_path = Path(output_path)
+    return (output_path.with_name(output_path.stem + '.state.csv'),
+            output_path.with_name(output_path.stem + '.checkpoint.json'))
+
+
+def _head_hash(path, length):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read(min(length, HEAD_BYTES))).hexdigest()
+
+
+def _parse_times(values, time_format):
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(uniques, format=time_format, errors='coerce')
+    failed = parsed.isna()
+    if failed.any():
+        parsed = parsed.where(~failed, pd.to_datetime(uniques, format='mixed', errors='coerce'))
+    return pd.Series(pd.DatetimeIndex(parsed).values[codes], index=values.index)
+
+
+def detect_layout(columns):
+    """(order column, time column, time format) of a log header"""
+    for order_column, _, time_column, time_format in SOURCE_LAYOUTS:
+        if order_column in columns and time_column in columns:
+            return order_column, time_column, time_format
+    raise ValueError(f"Unrecognized order log layout: {list(columns)}")
+
+
+class LatestStatusMaterializer:
+    """Latest row per order, maintained from newly appended log rows"""
+
+    def __init__(self, log_path=FULL_LOG_PATH, output_path=LATEST_PATH):
+        self.log_path = Path(log_path)
+        self.output_path = Path(output_path)
+        self.state_path, self.checkpoint_path = state_paths(output_path)
+
+    # ------------------------------------------------------------------
+    # Checkpoint
+    # ------------------------------------------------------------------
+
+    def load_checkpoint(self):
+        """Checkpoint dict if it is still valid for the current log, else None"""
+        if not self.checkpoint_path.exists() or not self.state_path.exists():
+            return None
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('log') != str(self.log_path.resolve()):
+            return None
+        if self.log_path.stat().st_size < checkpoint['offset']:
+            return None  # Truncated
+        if _head_hash(self.log_path, checkpoint['offset']) != checkpoint['head_sha1']:
+            return None  # Rewritten
+        return checkpoint
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def read_new_rows(self, offset, header):
+        """
+        Parse complete lines appended after `offset`.
+
+        Returns:
+            tuple: (DataFrame of new rows, header line bytes, new offset)
+        """
+        with open(self.log_path, 'rb') as f:
+            if header is None:
+                header = f.readline()
+                offset = max(offset, len(header))
+            f.seek(offset)
+            data = f.read()
+
+        # The checkpoint stops before an unterminated last line, so it is read
+        # again next run (re-applying a row is idempotent); a partially written
+        # line without its time column is dropped by merge()
+        end = data.rfind(b'\n') + 1
+        if not data.strip():
+            return pd.DataFrame(), header, offset + end
+
+        rows = pd.read_csv(io.BytesIO(header + data), dtype=str, keep_default_na=False)
+        return rows, header, offset + end
+
+    # ------------------------------------------------------------------
+    # Merge
+    # ------------------------------------------------------------------
+
+    def merge(self, state, rows):
+        """
+        Merge new log rows into the state table.
+
+        The latest row per order wins (ties: the row appended last); First
+        Seen keeps the earliest time the order appeared.
+        """
+        order_column, time_column, time_format = detect_layout(rows.columns)
+        order_key = pd.to_numeric(rows[order_column], errors='coerce')
+        times = _parse_times(rows[time_column], time_format)
+        valid = order_key.notna() & times.notna()
+        rows, order_key, times = rows[valid], order_key[valid], times[valid]
+        if rows.empty:
+            return state, 0
+
+        rows = rows.assign(_key=order_key.values, _time=times.values)
+        rows = rows.sort_values('_time', kind='stable')
+        first_seen = rows.groupby('_key')['_time'].min()
+        latest = rows.drop_duplicates('_key', keep='last').set_index('_key')
+        latest[FIRST_SEEN_COLUMN] = first_seen.reindex(latest.index)
+
+        if state is None or state.empty:
+            return latest, len(latest)
+
+        # Only orders in the new rows are touched
+        known = latest.index.intersection(state.index)
+        previous = state.loc[known]
+        latest.loc[known, FIRST_SEEN_COLUMN] = previous[FIRST_SEEN_COLUMN].where(
+            previous[FIRST_SEEN_COLUMN] < latest.loc[known, FIRST_SEEN_COLUMN], latest.loc[known, FIRST_SEEN_COLUMN])
+        # An out-of-order append older than the current row keeps the current row
+        stale = known[(previous['_time'] > latest.loc[known, '_time']).to_numpy()]
+        row_columns = latest.columns.difference([FIRST_SEEN_COLUMN])
+        latest.loc[stale, row_columns] = previous.loc[stale, row_columns]
+
+        return pd.concat([state.drop(index=known), latest]), len(latest)
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    def _load_state(self):
+        state = pd.read_csv(self.state_path, dtype=str, keep_default_na=False)
+        state['_key'] = pd.to_numeric(state['_key'])
+        state['_time'] = pd.to_datetime(state['_time'])
+        state[FIRST_SEEN_COLUMN] = pd.to_datetime(state[FIRST_SEEN_COLUMN])
+        return state.set_index('_key')
+
+    def refresh(self, rebuild=False):
+        """
+        Apply new log rows and rewrite the latest view.
+
+        Returns:
+            dict: new_rows, updated_orders, orders, offset, rebuilt
+        """
+        checkpoint = None if rebuild else self.load_checkpoint()
+        if checkpoint:
+            state = self._load_state()
+            offset, header = checkpoint['offset'], checkpoint['header'].encode()
+        else:
+            state, offset, header = None, 0, None
+
+        rows, header, offset = self.read_new_rows(offset, header)
+        updated = 0
+        if len(rows):
+            state, updated = self.merge(state, rows)
+        if state is None:
+            raise ValueError(f"No order rows in {self.log_path}")
+        if len(rows) or not checkpoint:
+            self._write(state, header, offset)
+        return {
+            'new_rows': len(rows),
+            'updated_orders': updated,
+            'orders': len(state),
+            'offset': offset,
+            'rebuilt': checkpoint is None,
+        }
+
+    def _write(self, state, header, offset):
+        """Write view, state and checkpoint (each via a temporary file)"""
+        state = state.sort_index()
+        columns = [column for column in next(csv.reader([header.decode()])) if column in state.columns]
+
+        for path, frame in ((self.output_path, state[columns]),
+                            (self.state_path, state.reset_index())):
+            temp_path = f"{path}.partial"
+            frame.to_csv(temp_path, index=False)
+            os.replace(temp_path, path)
+
+        checkpoint = {
+            'log': str(self.log_path.resolve()),
+            'offset': offset,
+            'header': header.decode(),
+            'head_sha1': _head_hash(self.log_path, offset),
+            'orders': len(state),
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        temp_path = f"{self.checkpoint_path}.partial"
+        with open(temp_path, 'w') as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(temp_path, self.checkpoint_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incrementally refresh the latest-status-per-order view of an order log')
+    parser.add_argument('--log', default=str(FULL_LOG_PATH), help='Append-only order log CSV')
+    parser.add_argument('--output', default=str(LATEST_PATH), help='Latest-status view CSV')
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the checkpoint and rebuild from the start')
+    args = parser.parse_args()
+
+    start = time.time()
+    try:
+        result = LatestStatusMaterializer(args.log, args.output).refresh(rebuild=args.rebuild)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    mode = 'full rebuild' if result['rebuilt'] else 'incremental'
+    print(f"✅ Latest view refreshed ({mode}) in {time.time() - start:.2f}s: {args.output}")
+    print(f"   New log rows: {result['new_rows']:,}")
+    print(f"   Orders updated: {result['updated_orders']:,}")
+    print(f"   Orders in view: {result['orders']:,}")
+
+
+if __name__ == "__main__":
+    main()
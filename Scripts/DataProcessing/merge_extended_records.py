@@ -19,6 +19,76 @@ import numpy as np
 from datetime import datetime
 import os
 import sys
+import time
+from keyed_upsert import keyed_upsert, summarize_report
+from workbook_cache import read_sheets
+from workbook_patcher import patch_sheets
+
+ORDER_KEY = 'care_portals_internal_order_id'
+CUSTOMER_KEY = 'customer_id'
+CUSTOMER_COLUMNS = ['customer_id', 'first_name', 'last_name', 'email', 'phone']
+
+# order.created columns copied from the cleaned CSV
+ORDER_FIELDS = ['created_at', 'order_id', 'care_portals_internal_order_id', 'customer_id']
+
+# Copied when the CSV has the column, otherwise filled with the default
+ORDER_FIELD_DEFAULTS = {
+    'source': '',
+    'total_amount': 0,
+    'discount_amount': 0,
+    'base_amount': 0,
+    'credit_used_amount': 0,
+}
+
+# Fields that CSV doesn't have - leave blank as specified
+ORDER_BLANK_FIELDS = {
+    'shipping_address_id': '',
+    'pharmacy_assigned': '',
+    'product_id': '',
+    'coupon': '',
+    'discount_reduction_amount': 0,
+    'discount_reduction_type': '',
+}
+
+def _key_text(value):
+    """Key as stripped text (1310.0 -> '1310', blanks -> None) so str and numeric keys compare"""
+    if pd.isna(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() or None
+
+def anti_join(df, existing_df, key):
+    """
+    Split df into rows whose key is not in existing_df and rows whose key is.
+
+    A left merge against the distinct existing keys with indicator=True.
+    Both key columns are compared as text (a numeric or all-blank sheet
+    column still matches CSV strings); blank keys never match.
+
+    Returns:
+        tuple: (new rows, matched rows) - both in df's original order
+    """
+    existing_keys = existing_df[key].astype(object).map(_key_text).dropna().drop_duplicates().to_frame()
+    keys = df[key].astype(object).map(_key_text).to_frame()
+    joined = keys.merge(existing_keys, on=key, how='left', indicator=True)
+    is_new = (joined['_merge'] == 'left_only').to_numpy()
+    return df[is_new].copy(), df[~is_new]
+
+def coerce_to_schema(df, reference_df):
+    """Cast columns to the reference sheet's numeric/datetime dtypes (blanks -> NaN/NaT)"""
+    df = df.copy()
+    for column, dtype in reference_df.dtypes.items():
+        if column not in df.columns:
+            continue
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+        elif pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            values = pd.to_numeric(df[column].replace('', np.nan), errors='coerce')
+            if pd.api.types.is_integer_dtype(dtype) and values.notna().all():
+                values = values.astype(dtype)
+            df[column] = values
+    return df
 
 def load_data():
     """Load all required data files"""
@@ -31,16 +101,18 @@ def load_data():
     # Load existing database
     db_file = 'GoogleSheets/Database_CarePortals.xlsx'
     
+    sheets = read_sheets(db_file, ['order.created', 'customers', 'products'])
+
     # Load existing orders
-    existing_orders_df = pd.read_excel(db_file, sheet_name='order.created')
+    existing_orders_df = sheets['order.created']
     print(f"✅ Existing orders: {len(existing_orders_df)} rows")
     
     # Load existing customers  
-    existing_customers_df = pd.read_excel(db_file, sheet_name='customers')
+    existing_customers_df = sheets['customers']
     print(f"✅ Existing customers: {len(existing_customers_df)} rows")
     
     # Load products for reference
-    products_df = pd.read_excel(db_file, sheet_name='products')
+    products_df = sheets['products']
     print(f"✅ Products: {len(products_df)} rows")
     
     return extended_df, existing_orders_df, existing_customers_df, products_df
@@ -91,17 +163,14 @@ def find_new_orders(extended_clean, existing_orders_df):
     """Find orders that don't exist in the database"""
     print("🔍 Finding new orders to add...")
     
-    existing_order_ids = set(existing_orders_df['care_portals_internal_order_id'].values)
-    extended_order_ids = set(extended_clean['care_portals_internal_order_id'].values)
-    
-    new_order_ids = extended_order_ids - existing_order_ids
-    new_orders = extended_clean[extended_clean['care_portals_internal_order_id'].isin(new_order_ids)].copy()
+    # extended_clean is already unique per care_portals_internal_order_id
+    new_orders, duplicate_orders = anti_join(extended_clean, existing_orders_df, ORDER_KEY)
     
     print(f"📊 Analysis Results:")
-    print(f"   - Existing orders in DB: {len(existing_order_ids)}")
-    print(f"   - Orders in extended file: {len(extended_order_ids)}")
+    print(f"   - Existing orders in DB: {existing_orders_df[ORDER_KEY].nunique()}")
+    print(f"   - Orders in extended file: {len(extended_clean)}")
     print(f"   - New orders to add: {len(new_orders)}")
-    print(f"   - Duplicate orders (skipped): {len(extended_order_ids & existing_order_ids)}")
+    print(f"   - Duplicate orders (skipped): {len(duplicate_orders)}")
     
     return new_orders
 
@@ -109,20 +178,15 @@ def find_new_customers(extended_clean, existing_customers_df):
     """Find customers that don't exist in the database"""
     print("👥 Finding new customers to add...")
     
-    existing_customer_ids = set(existing_customers_df['customer_id'].values)
-    
     # Get unique customers from extended data
-    customer_data = extended_clean[['customer_id', 'first_name', 'last_name', 'email', 'phone']].drop_duplicates(subset=['customer_id'])
-    extended_customer_ids = set(customer_data['customer_id'].values)
-    
-    new_customer_ids = extended_customer_ids - existing_customer_ids
-    new_customers = customer_data[customer_data['customer_id'].isin(new_customer_ids)].copy()
+    customer_data = extended_clean[CUSTOMER_COLUMNS].drop_duplicates(subset=[CUSTOMER_KEY])
+    new_customers, known_customers = anti_join(customer_data, existing_customers_df, CUSTOMER_KEY)
     
     print(f"📊 Customer Analysis:")
-    print(f"   - Existing customers in DB: {len(existing_customer_ids)}")
-    print(f"   - Customers in extended file: {len(extended_customer_ids)}")
+    print(f"   - Existing customers in DB: {existing_customers_df[CUSTOMER_KEY].nunique()}")
+    print(f"   - Customers in extended file: {len(customer_data)}")
     print(f"   - New customers to add: {len(new_customers)}")
-    print(f"   - Existing customers (skipped): {len(extended_customer_ids & existing_customer_ids)}")
+    print(f"   - Existing customers (skipped): {len(known_customers)}")
     
     return new_customers
 
@@ -134,32 +198,15 @@ def prepare_orders_for_database(new_orders, existing_orders_df):
     db_columns = list(existing_orders_df.columns)
     print(f"📋 Database order schema has {len(db_columns)} columns")
     
-    # Create new dataframe with database schema
-    orders_to_add = pd.DataFrame(columns=db_columns)
+    # Map available fields, fill constants and align to the sheet's columns in one pass
+    orders_to_add = new_orders.reindex(columns=ORDER_FIELDS + list(ORDER_FIELD_DEFAULTS))
+    missing_defaults = {column: value for column, value in ORDER_FIELD_DEFAULTS.items()
+                        if column not in new_orders.columns}
+    orders_to_add = orders_to_add.assign(**missing_defaults, **ORDER_BLANK_FIELDS)
+    orders_to_add = orders_to_add.reindex(columns=db_columns).reset_index(drop=True)
     
-    for idx, order in new_orders.iterrows():
-        new_row = {}
-        
-        # Map available fields
-        new_row['created_at'] = order['created_at']
-        new_row['order_id'] = order['order_id']
-        new_row['care_portals_internal_order_id'] = order['care_portals_internal_order_id']
-        new_row['customer_id'] = order['customer_id']
-        new_row['source'] = order.get('source', '')
-        new_row['total_amount'] = order.get('total_amount', 0)
-        new_row['discount_amount'] = order.get('discount_amount', 0)
-        new_row['base_amount'] = order.get('base_amount', 0)
-        new_row['credit_used_amount'] = order.get('credit_used_amount', 0)
-        
-        # Fields that CSV doesn't have - leave blank as specified
-        new_row['shipping_address_id'] = ''  # CSV doesn't have shipping address
-        new_row['pharmacy_assigned'] = ''    # CSV doesn't have pharmacy
-        new_row['product_id'] = ''           # CSV doesn't have product info
-        new_row['coupon'] = ''
-        new_row['discount_reduction_amount'] = 0
-        new_row['discount_reduction_type'] = ''
-        
-        orders_to_add = pd.concat([orders_to_add, pd.DataFrame([new_row])], ignore_index=True)
+    # Same dtypes as the existing sheet (numeric blanks become empty cells)
+    orders_to_add = coerce_to_schema(orders_to_add, existing_orders_df)
     
     print(f"✅ Prepared {len(orders_to_add)} orders for insertion")
     return orders_to_add
@@ -184,25 +231,25 @@ def update_database(orders_to_add, customers_to_add, existing_orders_df, existin
     """Update the database with new records"""
     print("💾 Updating database...")
     
-    # Combine existing and new data
-    updated_orders = pd.concat([existing_orders_df, orders_to_add], ignore_index=True)
-    updated_customers = pd.concat([existing_customers_df, customers_to_add], ignore_index=True)
+    # Combine existing and new data - existing records are never overwritten
+    updated_orders, orders_report = keyed_upsert(existing_orders_df, orders_to_add, 'care_portals_internal_order_id')
+    updated_customers, customers_report = keyed_upsert(existing_customers_df, customers_to_add, 'customer_id')
     
     # Write updated data back to Excel
     db_file = 'GoogleSheets/Database_CarePortals.xlsx'
     
-    with pd.ExcelWriter(db_file, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-        # Update order.created sheet
-        updated_orders.to_excel(writer, sheet_name='order.created', index=False)
-        print(f"✅ Updated order.created: {len(existing_orders_df)} → {len(updated_orders)} rows")
-        
-        # Update customers sheet
-        updated_customers.to_excel(writer, sheet_name='customers', index=False)
-        print(f"✅ Updated customers: {len(existing_customers_df)} → {len(updated_customers)} rows")
+    # Only these two sheets are rewritten; the rest of the workbook is copied unchanged
+    patch_sheets(db_file, {'order.created': updated_orders, 'customers': updated_customers})
+    print(f"✅ Updated order.created: {len(existing_orders_df)} → {len(updated_orders)} rows (+{len(orders_report['inserted'])} new)")
+    print(f"✅ Updated customers: {len(existing_customers_df)} → {len(updated_customers)} rows (+{len(customers_report['inserted'])} new)")
     
-    return updated_orders, updated_customers
+    changes = {
+        'order.created': summarize_report(orders_report),
+        'customers': summarize_report(customers_report),
+    }
+    return updated_orders, updated_customers, changes
 
-def create_summary_report(orders_to_add, customers_to_add):
+def create_summary_report(orders_to_add, customers_to_add, changes, elapsed):
     """Create a summary report of the merge operation"""
     print("📋 Creating summary report...")
     
@@ -214,9 +261,10 @@ def create_summary_report(orders_to_add, customers_to_add):
 **Source File**: GoogleSheets/extended_record.csv
 
 ## 📊 Summary Statistics
-- **New Orders Added**: {len(orders_to_add)}
-- **New Customers Added**: {len(customers_to_add)}
-- **Total Processing Time**: {datetime.now()}
+- **New Orders Added**: {changes['order.created']['inserted']}
+- **New Customers Added**: {changes['customers']['inserted']}
+- **Existing Records Updated**: {changes['order.created']['updated'] + changes['customers']['updated']}
+- **Total Processing Time**: {elapsed:.2f}s
 
 ## 🔄 Data Mappings Applied
 - **Datetime Purchase** → **created_at** (with timezone conversion)
@@ -235,8 +283,8 @@ def create_summary_report(orders_to_add, customers_to_add):
 - No existing records were overwritten
 
 ## 📈 Database Growth
-- **order.created** sheet: +{len(orders_to_add)} records
-- **customers** sheet: +{len(customers_to_add)} records
+- **order.created** sheet: +{changes['order.created']['inserted']} records
+- **customers** sheet: +{changes['customers']['inserted']} records
 
 ---
 Generated by merge_extended_records.py
@@ -252,6 +300,8 @@ def main():
     print("🚀 Starting Extended Records Merge Process")
     print("="*60)
     
+    start = time.time()
+    
     try:
         # Load data
         extended_df, existing_orders_df, existing_customers_df, products_df = load_data()
@@ -272,10 +322,10 @@ def main():
         customers_to_add = prepare_customers_for_database(new_customers, existing_customers_df) if len(new_customers) > 0 else pd.DataFrame()
         
         # Update database
-        updated_orders, updated_customers = update_database(orders_to_add, customers_to_add, existing_orders_df, existing_customers_df)
+        updated_orders, updated_customers, changes = update_database(orders_to_add, customers_to_add, existing_orders_df, existing_customers_df)
         
         # Create summary report
-        create_summary_report(orders_to_add, customers_to_add)
+        create_summary_report(orders_to_add, customers_to_add, changes, time.time() - start)
         
         print("="*60)
         print("🎉 Extended Records Merge Completed Successfully!")
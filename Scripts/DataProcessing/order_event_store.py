@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Compact columnar store of order status events
+
+Built once from the order.updated log (CarePortals_Orders.xlsx order.updated
+tab, an order.updated CSV export, or order_tracking_full_log_ET.csv) and kept
+as plain .npy arrays that are memory-mapped on load:
+- order_ids      int32   one per event
+- status_codes   int8    index into the statuses vocabulary
+- times          int64   Eastern wall-clock time in nanoseconds
+- orders         int32   distinct order IDs, ascending
+- offsets        int64   events of orders[i] are rows offsets[i]:offsets[i+1]
+
+Events are sorted by (order, time), so any order's timeline is a slice of
+the arrays: a dense position table maps order ID -> i in O(1).
+
+The store directory records the source file's size and mtime; load_event_store()
+rebuilds it only when the source changed.
+
+Usage:
+    python order_event_store.py                      # build from CarePortals_Orders.xlsx
+    python order_event_store.py --source ../../CarePortals/Data/order_tracking_full_log_ET.csv
+    python order_event_store.py --order 1234         # print one order's timeline
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sheet_stream import sheet_header
+from workbook_cache import read_sheet
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+CAREPORTALS_ORDERS_PATH = REPO_ROOT / 'GoogleSheets' / 'CarePortals_Orders.xlsx'
+FULL_LOG_PATH = REPO_ROOT / 'CarePortals' / 'Data' / 'order_tracking_full_log_ET.csv'
+DEFAULT_STORE_DIR = REPO_ROOT / 'CarePortals' / 'Data' / 'order_event_store'
+ORDER_UPDATED_SHEET = 'order.updated'
+
+ARRAYS = ['order_ids', 'status_codes', 'times', 'orders', 'offsets']
+MAX_DENSE_ORDER_ID = 1 << 24  # Larger IDs fall back to binary search
+
+# Source layouts: (order column, status column, time column, time format)
+SOURCE_LAYOUTS = [
+    ('Order ID', 'Status', 'Timestamp', '%m/%d/%Y, %I:%M:%S %p'),  # order.updated tab / CSV export
+    ('Order #', 'Status', 'Last Update', 'ISO8601'),  # order_tracking_full_log_ET.csv
+    ('order_id', 'updated_status', 'Datetime Updated', '%m/%d/%Y, %I:%M:%S %p'),  # webhook format
+]
+
+
+# ============================================================================
+# SOURCES
+# ============================================================================
+
+def _parse_times(values, time_format):
+    """Parse distinct time values once; unparseable values become NaT"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        parsed = pd.DatetimeIndex(values)
+        return parsed.tz_localize(None) if parsed.tz is not None else parsed
+    codes, uniques = pd.factorize(values.astype(str).str.strip())
+    parsed = pd.to_datetime(uniques, format=time_format, errors='coerce')
+    failed = parsed.isna()
+    if failed.any():
+        parsed = parsed.where(~failed, pd.to_datetime(uniques, format='mixed', errors='coerce'))
+    parsed = pd.DatetimeIndex(parsed)
+    if parsed.tz is not None:
+        parsed = parsed.tz_localize(None)
+    return pd.DatetimeIndex(parsed.values[codes])
+
+
+def read_events(source=CAREPORTALS_ORDERS_PATH):
+    """
+    Read (order ID, status, time) events from a workbook or CSV log.
+
+    Returns:
+        pd.DataFrame: order_id, status, time columns (raw, unsorted)
+    """
+    source = Path(source)
+    workbook = source.suffix.lower() in ('.xlsx', '.xls')
+    if workbook:
+        columns = sheet_header(source, ORDER_UPDATED_SHEET)
+    else:
+        df = pd.read_csv(source, dtype=str)
+        columns = list(df.columns)
+
+    for order_column, status_column, time_column, time_format in SOURCE_LAYOUTS:
+        if {order_column, status_column, time_column} <= set(columns):
+            break
+    else:
+        raise ValueError(f"Unrecognized order event layout in {source}: {columns}")
+
+    if workbook:
+        # Only the three event columns are parsed
+        df = read_sheet(source, ORDER_UPDATED_SHEET, columns=[order_column, status_column, time_column])
+
+    return pd.DataFrame({
+        'order_id': pd.to_numeric(df[order_column], errors='coerce'),
+        'status': df[status_column].astype(str).str.strip(),
+        'time': _parse_times(df[time_column], time_format),
+    })
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class OrderEventStore:
+    """Order status events as sorted columnar arrays with per-order offsets"""
+
+    def __init__(self, order_ids, status_codes, times, statuses, orders=None, offsets=None, meta=None):
+        self.order_ids = order_ids
+        self.status_codes = status_codes
+        self.times = times
+        self.statuses = np.asarray(statuses, dtype=object)
+        if orders is None or offsets is None:
+            orders, starts = np.unique(order_ids, return_index=True)
+            offsets = np.append(starts, len(order_ids)).astype(np.int64)
+        self.orders = orders
+        self.offsets = offsets
+        self.meta = meta or {}
+        self._status_index = {status: code for code, status in enumerate(self.statuses)}
+
+        # Dense order ID -> position table for O(1) lookups
+        self._positions = None
+        if len(orders) and 0 <= orders[0] and orders[-1] < MAX_DENSE_ORDER_ID:
+            self._positions = np.full(int(orders[-1]) + 1, -1, dtype=np.int32)
+            self._positions[orders] = np.arange(len(orders), dtype=np.int32)
+
+    @classmethod
+    def from_frame(cls, events, meta=None):
+        """
+        Encode and sort an order_id/status/time frame (read_events() output).
+
+        Rows without a numeric order ID, status or parseable time are dropped.
+        """
+        valid = events['order_id'].notna() & events['time'].notna() & ~events['status'].isin(['', 'nan', 'None'])
+        events = events[valid]
+
+        order_ids = events['order_id'].to_numpy(dtype=np.int64).astype(np.int32)
+        status_codes, statuses = pd.factorize(events['status'], sort=True)
+        times = events['time'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        if len(statuses) > np.iinfo(np.int8).max:
+            raise ValueError(f"Too many distinct statuses for int8 codes: {len(statuses)}")
+
+        order = np.lexsort((times, order_ids))
+        meta = dict(meta or {}, rows=int(len(order)), dropped=int((~valid).sum()))
+        return cls(order_ids[order], status_codes.astype(np.int8)[order], times[order],
+                   list(statuses), meta=meta)
+
+    @classmethod
+    def build(cls, source=CAREPORTALS_ORDERS_PATH):
+        """Build a store from a source file"""
+        return cls.from_frame(read_events(source), meta=_source_meta(source))
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, directory=DEFAULT_STORE_DIR):
+        """Write the arrays and metadata to a directory (built next to it, then swapped in)"""
+        directory = Path(directory)
+        temp_dir = directory.with_name(directory.name + '.partial')
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        temp_dir.mkdir(parents=True)
+        for name in ARRAYS:
+            np.save(temp_dir / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+        meta = dict(self.meta, statuses=list(self.statuses), built_at=datetime.now().isoformat(timespec='seconds'))
+        with open(temp_dir / 'meta.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(temp_dir, directory)
+
+    @classmethod
+    def load(cls, directory=DEFAULT_STORE_DIR, mmap=True):
+        """Load a saved store; arrays are memory-mapped unless mmap=False"""
+        directory = Path(directory)
+        with open(directory / 'meta.json') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode='r' if mmap else None) for name in ARRAYS}
+        return cls(statuses=meta['statuses'], meta=meta, **arrays)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.order_ids)
+
+    @property
+    def n_orders(self):
+        return len(self.orders)
+
+    def position(self, order_id):
+        """Index of an order in self.orders, or -1 if it has no events"""
+        order_id = int(order_id)
+        if self._positions is not None:
+            return int(self._positions[order_id]) if 0 <= order_id < len(self._positions) else -1
+        i = int(np.searchsorted(self.orders, order_id))
+        return i if i < len(self.orders) and self.orders[i] == order_id else -1
+
+    def bounds(self, order_id):
+        """(start, end) row range of an order's events ((0, 0) if unknown)"""
+        i = self.position(order_id)
+        return (int(self.offsets[i]), int(self.offsets[i + 1])) if i >= 0 else (0, 0)
+
+    def status_code(self, status):
+        """Code of a status name, or -1 if it never occurs"""
+        return self._status_index.get(status, -1)
+
+    def timeline(self, order_id):
+        """
+        An order's events in time order.
+
+        Returns:
+            tuple: (datetime64[ns] times, status names) - array views, no copy of the log
+        """
+        start, end = self.bounds(order_id)
+        return self.times[start:end].view('datetime64[ns]'), self.statuses[self.status_codes[start:end]]
+
+    def order_frame(self, order_id):
+        """An order's events as a Timestamp/Status DataFrame"""
+        times, statuses = self.timeline(order_id)
+        return pd.DataFrame({'Timestamp': times, 'Status': statuses})
+
+    def to_frame(self):
+        """All events as an Order ID/Status/Timestamp DataFrame (categorical statuses)"""
+        return pd.DataFrame({
+            'Order ID': self.order_ids,
+            'Status': pd.Categorical.from_codes(self.status_codes, categories=list(self.statuses)),
+            'Timestamp': np.asarray(self.times).view('datetime64[ns]'),
+        })
+
+    def orders_with_status(self, status, since=None):
+        """Distinct order IDs with a `status` event (at or after `since`)"""
+        mask = self.status_codes == self.status_code(status)
+        if since is not None:
+            mask &= self.times >= np.datetime64(pd.Timestamp(since), 'ns').astype(np.int64)
+        return np.unique(self.order_ids[mask])
+
+
+# ============================================================================
+# CACHED LOADING
+# ============================================================================
+
+def _source_meta(source):
+    stat = Path(source).stat()
+    return {'source': str(Path(source).resolve()), 'source_size': stat.st_size, 'source_mtime': stat.st_mtime}
+
+
+def load_event_store(source=CAREPORTALS_ORDERS_PATH, store_dir=DEFAULT_STORE_DIR, rebuild=False):
+    """
+    Load the event store, rebuilding it when the source file changed.
+
+    Args:
+        source (str): order.updated workbook or CSV log
+        store_dir (str): Store directory
+        rebuild (bool): Rebuild even if the saved store is current
+
+    Returns:
+        OrderEventStore: Memory-mapped store
+    """
+    store_dir = Path(store_dir)
+    if not rebuild and (store_dir / 'meta.json').exists():
+        with open(store_dir / 'meta.json') as f:
+            meta = json.load(f)
+        current = _source_meta(source)
+        if all(meta.get(key) == value for key, value in current.items()):
+            return OrderEventStore.load(store_dir)
+
+    OrderEventStore.build(source).save(store_dir)
+    return OrderEventStore.load(store_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or inspect the columnar order event store')
+    parser.add_argument('--source', default=str(CAREPORTALS_ORDERS_PATH),
+                        help='order.updated workbook or CSV log (default: CarePortals_Orders.xlsx)')
+    parser.add_argument('--store', default=str(DEFAULT_STORE_DIR), help='Store directory')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild even if the store is current')
+    parser.add_argument('--order', type=int, help='Print the timeline of one order')
+    args = parser.parse_args()
+
+    try:
+        store = load_event_store(args.source, args.store, rebuild=args.rebuild)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    print(f"✅ Order event store: {args.store}")
+    print(f"   Events: {len(store):,} ({store.meta.get('dropped', 0):,} invalid rows dropped)")
+    print(f"   Orders: {store.n_orders:,}")
+    print(f"   Statuses: {', '.join(store.statuses)}")
+    print(f"   Source: {store.meta.get('source')}")
+
+    if args.order is not None:
+        frame = store.order_frame(args.order)
+        if frame.empty:
+            print(f"\n⚠️  No events for order {args.order}")
+        else:
+            print(f"\nOrder {args.order}:")
+            print(frame.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Single-pass core order flow analysis
+
+Computes, for every order in the order event store, when it first reached
+each core business stage:
+
+    awaiting_requirements → awaiting_script → awaiting_shipment → shipped
+
+Events are already sorted by (order, time) in the store, so the first (or
+last) occurrence of every (order, stage) pair is one np.unique over a
+combined key, scattered into an orders × stages matrix. Creation dates are
+joined by index instead of being looked up order by order, and stage
+timings are column differences over the whole table.
+
+"Going back" (a regression) is a core stage event whose stage rank is lower
+than the previous core stage event of the same order, e.g.
+awaiting_shipment → awaiting_requirements. Regressions are found with one
+shifted comparison over the rank array, masked at order boundaries, and
+aggregated into regression rates per product, pharmacy and week.
+
+Usage:
+    python order_flow_engine.py                       # last 60 days of shipped orders
+    python order_flow_engine.py --days 30 --output stage_table.csv
+    python order_flow_engine.py --source ../../CarePortals/Data/order_tracking_full_log_ET.csv
+    python order_flow_engine.py --all --regressions-output regressions.csv
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from order_event_store import CAREPORTALS_ORDERS_PATH, REPO_ROOT, load_event_store
+from workbook_cache import read_sheet
+
+DATABASE_PATH = REPO_ROOT / 'GoogleSheets' / 'Database_CarePortals.xlsx'
+
+# CORE BUSINESS FLOW - ONLY THESE 4 STAGES MATTER
+CORE_STAGES = [
+    'awaiting_requirements',  # Stage 1
+    'awaiting_script',        # Stage 2
+    'awaiting_shipment',      # Stage 3
+    'shipped'                 # Stage 4 (final)
+]
+
+# Timing name -> (from column, to column) of the stage table
+CORE_TIMINGS = {
+    'requirements_to_script': ('awaiting_requirements', 'awaiting_script'),
+    'script_to_shipment': ('awaiting_script', 'awaiting_shipment'),
+    'shipment_to_shipped': ('awaiting_shipment', 'shipped'),
+    'creation_to_shipped': ('created_at', 'shipped'),
+}
+MAX_TIMING_HOURS = 720  # Max 30 days
+RECENT_DAYS = 60
+REGRESSION_GROUPS = ['product', 'pharmacy', 'week']
+
+
+# ============================================================================
+# STAGE TABLE
+# ============================================================================
+
+def event_positions(store):
+    """Order position (index into store.orders) of every event"""
+    return np.repeat(np.arange(store.n_orders), np.diff(store.offsets))
+
+
+def stage_ranks(store, stages=CORE_STAGES):
+    """Stage index (0-based) of every event, -1 for statuses outside `stages`"""
+    rank_of_code = np.full(len(store.statuses), -1, dtype=np.int8)
+    for rank, stage in enumerate(stages):
+        code = store.status_code(stage)
+        if code >= 0:
+            rank_of_code[code] = rank
+    return rank_of_code[store.status_codes]
+
+
+def reached_times(store, stages=CORE_STAGES, last=False, positions=None):
+    """
+    First (or last) time each order reached each stage.
+
+    Returns:
+        pd.DataFrame: order_id index, one datetime64 column per stage (NaT if never reached)
+    """
+    if positions is None:
+        positions = event_positions(store)
+    ranks = stage_ranks(store, stages)
+    rows = np.flatnonzero(ranks >= 0)
+    if last:
+        rows = rows[::-1]
+
+    key = positions[rows].astype(np.int64) * len(stages) + ranks[rows]
+    _, first = np.unique(key, return_index=True)
+    rows = rows[first]
+
+    matrix = np.full((store.n_orders, len(stages)), np.iinfo(np.int64).min, dtype=np.int64)
+    matrix[positions[rows], ranks[rows]] = store.times[rows]
+    return pd.DataFrame(matrix.view('datetime64[ns]'), columns=stages,
+                        index=pd.Index(store.orders, name='order_id'))
+
+
+def order_activity(store, positions=None):
+    """
+    Per-order event counts and ranges.
+
+    Returns:
+        pd.DataFrame: events, distinct_statuses, first_event, last_event by order_id
+    """
+    if positions is None:
+        positions = event_positions(store)
+    pairs = np.unique(positions.astype(np.int64) * (len(store.statuses) + 1) + store.status_codes)
+    distinct = np.bincount(pairs // (len(store.statuses) + 1), minlength=store.n_orders)
+    starts, ends = store.offsets[:-1], store.offsets[1:]
+    return pd.DataFrame({
+        'events': np.diff(store.offsets),
+        'distinct_statuses': distinct,
+        'first_event': store.times[starts].view('datetime64[ns]'),
+        'last_event': store.times[ends - 1].view('datetime64[ns]'),
+    }, index=pd.Index(store.orders, name='order_id'))
+
+
+def creation_dates(orders_created):
+    """order_id -> created_at from order.created (first row per order)"""
+    created = orders_created.drop_duplicates('order_id').set_index('order_id')['created_at']
+    return pd.to_datetime(created)
+
+
+def stage_table(store, orders_created=None, stages=CORE_STAGES):
+    """
+    One row per order: activity, creation date, first time at each stage,
+    core stage event count and last shipped time.
+
+    Args:
+        store (OrderEventStore): Order events
+        orders_created (pd.DataFrame): order.created rows (order_id, created_at)
+        stages (list): Stage sequence
+
+    Returns:
+        pd.DataFrame: Stage table indexed by order_id
+    """
+    positions = event_positions(store)
+    table = order_activity(store, positions)
+    ranks = stage_ranks(store, stages)
+    table['stage_events'] = np.bincount(positions[ranks >= 0], minlength=store.n_orders)
+
+    created = creation_dates(orders_created) if orders_created is not None else pd.Series(dtype='datetime64[ns]')
+    table['created_at'] = created.reindex(table.index).to_numpy(dtype='datetime64[ns]')
+
+    table = table.join(reached_times(store, stages, positions=positions))
+    if 'shipped' in stages:
+        table['last_shipped'] = reached_times(store, ['shipped'], last=True, positions=positions)['shipped']
+    return table
+
+
+def select_core_flow_orders(table, since, stages=CORE_STAGES):
+    """
+    Orders with a complete core flow: shipped at or after `since` (any
+    shipped event), creation data, at least 2 core stage events.
+    """
+    return table[(table['last_shipped'] >= pd.Timestamp(since))
+                 & table['created_at'].notna()
+                 & (table['stage_events'] >= 2)]
+
+
+# ============================================================================
+# TIMINGS
+# ============================================================================
+
+def stage_timings(table, timings=CORE_TIMINGS, max_hours=MAX_TIMING_HOURS):
+    """
+    Hours between stage columns for every order.
+
+    Durations outside (0, max_hours) are NaN, like the per-order scripts did.
+
+    Returns:
+        pd.DataFrame: One column per timing, indexed by order_id
+    """
+    durations = {}
+    for name, (start, end) in timings.items():
+        hours = (table[end] - table[start]).dt.total_seconds() / 3600
+        durations[name] = hours.where((hours > 0) & (hours < max_hours))
+    return pd.DataFrame(durations, index=table.index)
+
+
+def timing_distribution(durations):
+    """Count, mean, median and percentiles per timing column"""
+    summary = durations.describe(percentiles=[0.25, 0.5, 0.75, 0.9]).T
+    return summary.rename(columns={'50%': 'median'})
+
+
+# ============================================================================
+# REGRESSIONS
+# ============================================================================
+
+def stage_regressions(store, stages=CORE_STAGES, positions=None):
+    """
+    Every backward transition between consecutive core stage events.
+
+    Returns:
+        pd.DataFrame: order_id, from_stage, to_stage, stages_back, entered_at
+        (first event of the from-stage run), regressed_at, dwell_hours (time
+        spent in the from-stage before going back)
+    """
+    if positions is None:
+        positions = event_positions(store)
+    ranks = stage_ranks(store, stages)
+    rows = np.flatnonzero(ranks >= 0)
+    rank = ranks[rows].astype(np.int16)
+    order = positions[rows]
+    times = np.asarray(store.times)[rows]
+
+    same_order = order[1:] == order[:-1]
+    back = same_order & (rank[1:] < rank[:-1])
+    # Start of each run of equal consecutive stages, so dwell covers repeated updates
+    run_start = np.ones(len(rows), dtype=bool)
+    run_start[1:] = ~same_order | (rank[1:] != rank[:-1])
+    run_first = np.maximum.accumulate(np.where(run_start, np.arange(len(rows)), 0))
+
+    prev = np.flatnonzero(back)
+    curr = prev + 1
+    entered = times[run_first[prev]]
+    stage_names = np.asarray(stages, dtype=object)
+    return pd.DataFrame({
+        'order_id': store.orders[order[curr]],
+        'from_stage': stage_names[rank[prev]],
+        'to_stage': stage_names[rank[curr]],
+        'stages_back': rank[prev] - rank[curr],
+        'entered_at': entered.view('datetime64[ns]'),
+        'regressed_at': times[curr].view('datetime64[ns]'),
+        'dwell_hours': (times[curr] - entered) / 3.6e12,
+    })
+
+
+def order_attributes(orders_created, products=None):
+    """
+    Product and pharmacy per order from order.created (and products Short_name).
+
+    Returns:
+        pd.DataFrame: product, pharmacy indexed by order_id ('Unknown' if missing)
+    """
+    orders = orders_created.drop_duplicates('order_id').set_index('order_id')
+    product = orders['product_id']
+    if products is not None:
+        names = products.drop_duplicates('product_id').set_index('product_id')['Short_name']
+        product = product.map(names).fillna(product)
+    return pd.DataFrame({
+        'product': product.fillna('Unknown'),
+        'pharmacy': orders['pharmacy_assigned'].fillna('Unknown'),
+    })
+
+
+def regression_rates(table, regressions, attributes=None, by=REGRESSION_GROUPS):
+    """
+    Share of orders that went back in the core flow, per group.
+
+    Orders count when they have at least 2 core stage events. Weeks are the
+    Monday of the week the order was created (first event if unknown).
+
+    Returns:
+        dict: group name -> DataFrame (orders, regressed_orders, regressions, rate %)
+    """
+    orders = table[table['stage_events'] >= 2]
+    counts = regressions['order_id'].value_counts()
+    frame = pd.DataFrame({'regressions': counts.reindex(orders.index, fill_value=0)}, index=orders.index)
+    frame['regressed'] = frame['regressions'] > 0
+    if attributes is not None:
+        frame = frame.join(attributes.reindex(orders.index).fillna('Unknown'))
+    started = orders['created_at'].fillna(orders['first_event'])
+    frame['week'] = started.dt.to_period('W-SUN').dt.start_time.dt.date
+
+    rates = {}
+    for group in by:
+        if group not in frame.columns:
+            continue
+        summary = frame.groupby(group).agg(orders=('regressed', 'size'), regressed_orders=('regressed', 'sum'),
+                                           regressions=('regressions', 'sum'))
+        summary['rate'] = summary['regressed_orders'] / summary['orders'] * 100
+        rates[group] = summary.sort_index() if group == 'week' else summary.sort_values('orders', ascending=False)
+    return rates
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def load_orders_created(workbook_path=DATABASE_PATH):
+    """order.created rows with parsed creation dates"""
+    orders_created = read_sheet(workbook_path, 'order.created')
+    orders_created['created_at'] = pd.to_datetime(orders_created['created_at'])
+    return orders_created
+
+
+def load_products(workbook_path=DATABASE_PATH):
+    """products sheet (product_id, Short_name)"""
+    return read_sheet(workbook_path, 'products')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Core order flow stage table and stage timings')
+    parser.add_argument('--source', default=str(CAREPORTALS_ORDERS_PATH),
+                        help='order.updated workbook or CSV log (default: CarePortals_Orders.xlsx)')
+    parser.add_argument('--workbook', default=str(DATABASE_PATH),
+                        help='Database_CarePortals.xlsx with the order.created sheet')
+    parser.add_argument('--days', type=int, default=RECENT_DAYS,
+                        help=f'Only orders shipped in the last N days (default: {RECENT_DAYS})')
+    parser.add_argument('--all', action='store_true', help='Include every order, not only complete core flows')
+    parser.add_argument('--output', help='Write the per-order stage table to this CSV')
+    parser.add_argument('--timings-output', help='Write per-order stage timings (hours) to this CSV')
+    parser.add_argument('--regressions-output', help='Write every backward core stage transition to this CSV')
+    args = parser.parse_args()
+
+    try:
+        store = load_event_store(args.source)
+        orders_created = load_orders_created(args.workbook)
+        products = load_products(args.workbook)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    print(f"✓ Loaded {len(store)} order updates ({store.n_orders} orders)")
+    print(f"✓ Loaded {len(orders_created)} orders from order.created")
+
+    table = stage_table(store, orders_created)
+    if not args.all:
+        cutoff_date = datetime.now() - timedelta(days=args.days)
+        table = select_core_flow_orders(table, cutoff_date)
+        print(f"\nOrders with complete core flow (shipped in last {args.days} days): {len(table)}")
+    else:
+        print(f"\nOrders: {len(table)}")
+
+    durations = stage_timings(table)
+    print(f"\n=== CORE STAGE TIMING ANALYSIS ===")
+    for name, row in timing_distribution(durations).iterrows():
+        if row['count']:
+            print(f"  {name}: {row['mean']:.2f} hours avg, {row['median']:.2f} median, "
+                  f"{row['90%']:.2f} p90 ({int(row['count'])} samples)")
+        else:
+            print(f"  {name}: No samples")
+
+    reached = table[CORE_STAGES].notna().sum()
+    print(f"\n=== STAGE COVERAGE ===")
+    for stage in CORE_STAGES:
+        print(f"  {stage}: {reached[stage]} orders")
+
+    regressions = stage_regressions(store)
+    regressions = regressions[regressions['order_id'].isin(table.index)]
+    rates = regression_rates(table, regressions, order_attributes(orders_created, products))
+    going_back = regressions['order_id'].nunique()
+    analyzed = int((table['stage_events'] >= 2).sum())
+    print(f"\n=== GOING BACK IN CORE FLOW ===")
+    print(f"Regressions: {len(regressions)} in {going_back} of {analyzed} orders "
+          f"({going_back / analyzed * 100 if analyzed else 0:.2f}%)")
+    if len(regressions):
+        transitions = regressions.groupby(['from_stage', 'to_stage']).agg(
+            count=('order_id', 'size'), median_dwell_hours=('dwell_hours', 'median'))
+        for (from_stage, to_stage), row in transitions.sort_values('count', ascending=False).iterrows():
+            print(f"  {from_stage} → {to_stage}: {int(row['count'])} (median dwell {row['median_dwell_hours']:.1f}h)")
+    for group, summary in rates.items():
+        print(f"\n  By {group}:")
+        for key, row in summary.head(10).iterrows():
+            print(f"    {key}: {row['rate']:.1f}% ({int(row['regressed_orders'])}/{int(row['orders'])})")
+
+    if args.output:
+        table.to_csv(args.output)
+        print(f"\n✅ Stage table saved to: {args.output}")
+    if args.timings_output:
+        durations.to_csv(args.timings_output)
+        print(f"✅ Stage timings saved to: {args.timings_output}")
+    if args.regressions_output:
+        regressions.to_csv(args.regressions_output, index=False)
+        print(f"✅ Regressions saved to: {args.regressions_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Stripe ↔ CarePortals reconciliation
+
+Joins the Stripe exports (stripe_charges.csv / stripe_refunds.csv) against
+order.created and payment_succesful and classifies every record:
+
+    matched                 Order found and paid amount equals total_amount
+    amount_mismatch         Order found but paid amount differs from total_amount
+    orphan_charge           Succeeded charge that resolves to no order
+    order_without_payment   Order with total_amount > 0 and no succeeded charge
+    orphan_refund           Refund whose charge resolves to no order in order.created
+
+Charges are resolved to orders through hash indexes, first key wins:
+
+    1. metadata_resource_id  → order.created.care_portals_internal_order_id
+    2. payment_intent_id     → payment_succesful.payment_intent_id → order_number
+    3. "Order #1234" in the charge description → order_id
+    4. customer (email via customers, or Stripe customer via payment_succesful)
+       → nearest unclaimed order of that customer within --customer-window days
+
+Every step is a vectorized map/merge, so the cost is linear in the number of
+rows. Amounts are compared per order (sum of succeeded charges), which keeps
+split and retried payments from showing up as mismatches.
+
+Usage:
+    python reconcile_stripe_orders.py
+    python reconcile_stripe_orders.py --store ../../GoogleSheets/careportals.db --output exceptions.csv
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from workbook_cache import read_sheets
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_WORKBOOK_PATH = REPO_ROOT / 'GoogleSheets' / 'Database_CarePortals.xlsx'
+STRIPE_DIR = Path(__file__).resolve().parent / 'Stripe'
+DEFAULT_CHARGES_PATH = STRIPE_DIR / 'stripe_charges.csv'
+DEFAULT_REFUNDS_PATH = STRIPE_DIR / 'stripe_refunds.csv'
+DEFAULT_EXCEPTIONS_PATH = STRIPE_DIR / 'stripe_reconciliation_exceptions.csv'
+
+MATCHED = 'matched'
+AMOUNT_MISMATCH = 'amount_mismatch'
+ORPHAN_CHARGE = 'orphan_charge'
+ORDER_WITHOUT_PAYMENT = 'order_without_payment'
+ORPHAN_REFUND = 'orphan_refund'
+
+MATCH_KEYS = ['metadata_resource_id', 'payment_intent_id', 'description', 'customer']
+AMOUNT_TOLERANCE = 0.01  # Dollars
+CUSTOMER_WINDOW_DAYS = 3
+
+CHARGE_COLUMNS = ['charge_id', 'amount', 'status', 'datetime', 'description', 'customer_id', 'email',
+                  'receipt_email', 'metadata_resource_id', 'payment_intent_id']
+REFUND_COLUMNS = ['refund_id', 'charge_id', 'amount', 'datetime', 'customer_id']
+
+REPORT_COLUMNS = ['record_type', 'record_id', 'classification', 'order_id', 'match_key',
+                  'stripe_amount', 'order_amount', 'difference', 'refunded_amount',
+                  'customer_id', 'email', 'datetime']
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def load_sources(charges_path=DEFAULT_CHARGES_PATH, refunds_path=DEFAULT_REFUNDS_PATH,
+                 workbook_path=DEFAULT_WORKBOOK_PATH, store=None):
+    """
+    Load the Stripe exports and the CarePortals sheets.
+
+    Returns:
+        dict: charges, refunds, orders, payments, customers DataFrames
+    """
+    sources = {
+        'charges': pd.read_csv(charges_path, dtype=str, keep_default_na=False,
+                               usecols=lambda column: column in CHARGE_COLUMNS),
+        'refunds': pd.read_csv(refunds_path, dtype=str, keep_default_na=False,
+                               usecols=lambda column: column in REFUND_COLUMNS)
+        if Path(refunds_path).exists() else pd.DataFrame(columns=REFUND_COLUMNS),
+    }
+    sheets = {'orders': 'order.created', 'payments': 'payment_succesful', 'customers': 'customers'}
+    if store is not None:
+        sources.update({name: store.read_sheet(sheet) for name, sheet in sheets.items()})
+    else:
+        workbook = read_sheets(workbook_path, list(sheets.values()))
+        sources.update({name: workbook[sheet] for name, sheet in sheets.items()})
+    return sources
+
+
+def _key(series):
+    """Normalize an identifier column for hashing: str, '' → NaN, 1310.0 → '1310'"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('Int64').astype('string').astype(object).where(series.notna())
+    keys = series.astype(object)
+    return keys.mask(keys.isin(['', 'nan', 'None']) | keys.isna())
+
+
+def _email(series):
+    emails = series.astype('string').str.strip().str.lower()
+    return emails.mask(emails.isin(['', 'nan', 'none'])).astype(object)
+
+
+def _index(keys, values):
+    """Hash index key → value (last occurrence wins, missing keys dropped)"""
+    index = pd.Series(values.values, index=keys.values)
+    index = index[index.index.notna() & pd.Series(values.values).notna().values]
+    return index[~index.index.duplicated(keep='last')]
+
+
+# ============================================================================
+# MATCHING
+# ============================================================================
+
+def prepare_charges(charges):
+    """Normalized keys, amounts and timestamps for succeeded charges"""
+    succeeded = charges[charges['status'] == 'succeeded']
+    email = _email(succeeded['email']).combine_first(_email(succeeded['receipt_email']))
+    return pd.DataFrame({
+        'charge_id': succeeded['charge_id'].values,
+        'amount': pd.to_numeric(succeeded['amount'], errors='coerce').fillna(0).values,
+        'datetime': pd.to_datetime(succeeded['datetime'], errors='coerce').values,
+        'customer_id': _key(succeeded['customer_id']).values,
+        'email': email.values,
+        'metadata_resource_id': _key(succeeded['metadata_resource_id']).values,
+        'payment_intent_id': _key(succeeded['payment_intent_id']).values,
+        'description_order': succeeded['description'].str.extract(r'Order #(\d+)', expand=False).values,
+    })
+
+
+def prepare_orders(orders):
+    """Orders keyed by order_id (last occurrence wins)"""
+    prepared = pd.DataFrame({
+        'order_id': _key(orders['order_id']).values,
+        'internal_id': _key(orders['care_portals_internal_order_id']).values,
+        'customer_id': _key(orders['customer_id']).values,
+        'total_amount': pd.to_numeric(orders['total_amount'], errors='coerce').fillna(0).values,
+        'created_at': pd.to_datetime(orders['created_at'], errors='coerce').values,
+    })
+    prepared = prepared.dropna(subset=['order_id'])
+    return prepared.drop_duplicates(subset=['order_id'], keep='last').reset_index(drop=True)
+
+
+def _match_by_customer(charges, orders, customers, payments, claimed, window_days):
+    """
+    Resolve charges to the nearest unclaimed order of the same customer.
+
+    The CarePortals customer of a charge comes from its email (customers sheet)
+    or, failing that, from its Stripe customer via earlier webhook payments.
+    """
+    email_to_customer = _index(_email(customers['email']), _key(customers['customer_id']))
+    order_customer = _index(_key(orders['order_id']), _key(orders['customer_id']))
+    stripe_to_customer = _index(_key(payments['customer_id']), _key(payments['order_number']).map(order_customer))
+
+    candidates = charges.assign(
+        careportals_customer=charges['email'].map(email_to_customer)
+        .combine_first(charges['customer_id'].map(stripe_to_customer)))
+    candidates = candidates.dropna(subset=['careportals_customer', 'datetime'])
+    open_orders = orders[~orders['order_id'].isin(claimed) & orders['created_at'].notna()]
+    if len(candidates) == 0 or len(open_orders) == 0:
+        return pd.Series(dtype=object)
+
+    nearest = pd.merge_asof(
+        candidates.sort_values('datetime')[['charge_id', 'datetime', 'careportals_customer']],
+        open_orders.sort_values('created_at')[['order_id', 'customer_id', 'created_at']],
+        left_on='datetime', right_on='created_at',
+        left_by='careportals_customer', right_by='customer_id',
+        direction='nearest', tolerance=pd.Timedelta(days=window_days))
+    # One order per customer match; the closest charge keeps it
+    nearest = nearest.dropna(subset=['order_id'])
+    nearest['_distance'] = (nearest['datetime'] - nearest['created_at']).abs()
+    nearest = nearest.sort_values('_distance').drop_duplicates(subset=['order_id'], keep='first')
+    return pd.Series(nearest['order_id'].values, index=nearest['charge_id'].values)
+
+
+def match_charges(charges, orders, payments, customers, window_days=CUSTOMER_WINDOW_DAYS):
+    """
+    Resolve each succeeded charge to an order_id.
+
+    Args:
+        charges (pd.DataFrame): prepare_charges output
+        orders (pd.DataFrame): prepare_orders output
+        payments, customers (pd.DataFrame): payment_succesful and customers sheets
+
+    Returns:
+        pd.DataFrame: charges with order_id and match_key columns
+    """
+    known_orders = set(orders['order_id'])
+    by_resource = _index(orders['internal_id'], orders['order_id'])
+    by_intent = _index(_key(payments['payment_intent_id']), _key(payments['order_number']))
+
+    resolved = {
+        'metadata_resource_id': charges['metadata_resource_id'].map(by_resource),
+        'payment_intent_id': charges['payment_intent_id'].map(by_intent),
+        'description': charges['description_order'],
+    }
+    order_id = pd.Series(pd.NA, index=charges.index, dtype=object)
+    match_key = pd.Series(pd.NA, index=charges.index, dtype=object)
+    for key, candidates in resolved.items():
+        usable = order_id.isna() & candidates.isin(known_orders)
+        order_id = order_id.mask(usable, candidates)
+        match_key = match_key.mask(usable, key)
+
+    unresolved = order_id.isna()
+    if unresolved.any():
+        by_customer = _match_by_customer(charges[unresolved], orders, customers, payments,
+                                         set(order_id.dropna()), window_days)
+        candidates = charges['charge_id'].map(by_customer)
+        usable = unresolved & candidates.notna()
+        order_id = order_id.mask(usable, candidates)
+        match_key = match_key.mask(usable, 'customer')
+
+    return charges.assign(order_id=order_id, match_key=match_key)
+
+
+# ============================================================================
+# CLASSIFICATION
+# ============================================================================
+
+def reconcile(sources, tolerance=AMOUNT_TOLERANCE, window_days=CUSTOMER_WINDOW_DAYS):
+    """
+    Classify every charge, refund and order.
+
+    Args:
+        sources (dict): load_sources output
+
+    Returns:
+        pd.DataFrame: One row per record with REPORT_COLUMNS
+    """
+    orders = prepare_orders(sources['orders'])
+    charges = match_charges(prepare_charges(sources['charges']), orders,
+                            sources['payments'], sources['customers'], window_days)
+
+    # Refunds follow their charge; refunds of charges outside the export fall back to payment_succesful
+    refunds = sources['refunds']
+    charge_order = _index(charges['charge_id'], charges['order_id'])
+    by_charge = _index(_key(sources['payments']['charge_id']), _key(sources['payments']['order_number']))
+    refund_order = _key(refunds['charge_id']).map(charge_order).combine_first(
+        _key(refunds['charge_id']).map(by_charge)) if len(refunds) else pd.Series(dtype=object)
+    # Like charges, a refund only matches an order present in order.created
+    refund_order = refund_order.where(refund_order.isin(set(orders['order_id'])))
+    refund_amount = pd.to_numeric(refunds.get('amount'), errors='coerce').fillna(0) \
+        if len(refunds) else pd.Series(dtype=float)
+
+    paid = charges.groupby('order_id')['amount'].sum()
+    refunded = refund_amount.groupby(refund_order.values).sum()
+    orders = orders.assign(paid=orders['order_id'].map(paid), refunded=orders['order_id'].map(refunded))
+    orders['difference'] = (orders['paid'].fillna(0) - orders['total_amount']).round(2)
+    orders['classification'] = MATCHED
+    orders.loc[orders['difference'].abs() > tolerance, 'classification'] = AMOUNT_MISMATCH
+    # Orders newer than the export cannot be judged
+    export_end = charges['datetime'].max()
+    unpaid = orders['paid'].isna() & (orders['total_amount'] > 0) & (orders['created_at'] <= export_end)
+    orders.loc[unpaid, 'classification'] = ORDER_WITHOUT_PAYMENT
+    judged = orders['paid'].notna() | unpaid
+    order_status = orders.set_index('order_id')
+
+    charge_rows = pd.DataFrame({
+        'record_type': 'charge',
+        'record_id': charges['charge_id'],
+        'classification': charges['order_id'].map(order_status['classification']).fillna(ORPHAN_CHARGE),
+        'order_id': charges['order_id'],
+        'match_key': charges['match_key'],
+        'stripe_amount': charges['amount'],
+        'order_amount': charges['order_id'].map(order_status['total_amount']),
+        'difference': charges['order_id'].map(order_status['difference']),
+        'refunded_amount': charges['order_id'].map(order_status['refunded']),
+        'customer_id': charges['customer_id'],
+        'email': charges['email'],
+        'datetime': charges['datetime'],
+    })
+    order_rows = pd.DataFrame({
+        'record_type': 'order',
+        'record_id': orders['order_id'],
+        'classification': orders['classification'],
+        'order_id': orders['order_id'],
+        'stripe_amount': orders['paid'],
+        'order_amount': orders['total_amount'],
+        'difference': orders['difference'],
+        'refunded_amount': orders['refunded'],
+        'customer_id': orders['customer_id'],
+        'datetime': orders['created_at'],
+    })[judged.values]
+    refund_rows = pd.DataFrame({
+        'record_type': 'refund',
+        'record_id': refunds['refund_id'].values if len(refunds) else [],
+        'classification': refund_order.notna().map({True: MATCHED, False: ORPHAN_REFUND}).values,
+        'order_id': refund_order.values,
+        'stripe_amount': refund_amount.values,
+        'customer_id': _key(refunds['customer_id']).values if 'customer_id' in refunds else None,
+        'datetime': pd.to_datetime(refunds.get('datetime'), errors='coerce').values if len(refunds) else [],
+    })
+    frames = [frame for frame in (charge_rows, refund_rows, order_rows) if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    return pd.concat(frames, ignore_index=True).reindex(columns=REPORT_COLUMNS)
+
+
+def exceptions(results):
+    """Rows needing attention (everything not matched)"""
+    return results[results['classification'] != MATCHED].sort_values(
+        ['classification', 'record_type', 'datetime'], na_position='last')
+
+
+def summarize(results):
+    """Return {(record_type, classification): count}"""
+    return results.groupby(['record_type', 'classification']).size().to_dict()
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Reconcile Stripe charges/refunds with CarePortals orders')
+    parser.add_argument('--charges', default=str(DEFAULT_CHARGES_PATH), help='stripe_charges.csv path')
+    parser.add_argument('--refunds', default=str(DEFAULT_REFUNDS_PATH), help='stripe_refunds.csv path')
+    parser.add_argument('--workbook', default=str(DEFAULT_WORKBOOK_PATH), help='Database_CarePortals.xlsx path')
+    parser.add_argument('--store', help='Read orders/payments/customers from this SQLite store instead')
+    parser.add_argument('--output', default=str(DEFAULT_EXCEPTIONS_PATH), help='Exceptions report CSV path')
+    parser.add_argument('--full-output', help='Also write every classified record to this CSV')
+    parser.add_argument('--tolerance', type=float, default=AMOUNT_TOLERANCE, help='Amount tolerance in dollars')
+    parser.add_argument('--customer-window', type=float, default=CUSTOMER_WINDOW_DAYS,
+                        help='Days between charge and order for customer-based matches')
+    args = parser.parse_args()
+
+    if not Path(args.charges).exists():
+        print(f"❌ Charges file not found: {args.charges}")
+        print("   Run Stripe/stripe_exporter.py first")
+        return 1
+
+    store = None
+    if args.store:
+        from careportals_store import CarePortalsStore
+        store = CarePortalsStore(args.store)
+    sources = load_sources(args.charges, args.refunds, args.workbook, store)
+    if store is not None:
+        store.close()
+    print(f"📥 {len(sources['charges'])} charges, {len(sources['refunds'])} refunds, "
+          f"{len(sources['orders'])} orders, {len(sources['payments'])} webhook payments")
+
+    results = reconcile(sources, args.tolerance, args.customer_window)
+
+    print("\n🔗 RECONCILIATION")
+    for (record_type, classification), count in sorted(summarize(results).items()):
+        icon = '✅' if classification == MATCHED else '⚠️ '
+        print(f"   {icon} {record_type:<7} {classification:<22} {count}")
+    charges = results[results['record_type'] == 'charge']
+    if len(charges):
+        keys = charges['match_key'].value_counts()
+        print("   🔑 Charge match keys: " + ', '.join(f"{key}: {keys.get(key, 0)}" for key in MATCH_KEYS))
+
+    report = exceptions(results)
+    report.to_csv(args.output, index=False)
+    print(f"\n📄 {len(report)} exceptions saved to {args.output}")
+    if args.full_output:
+        results.to_csv(args.full_output, index=False)
+        print(f"📄 All {len(results)} records saved to {args.full_output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Persistent charge/refund ID index for orphan-refund checks
+
+Keeps every charge_id / payment_intent_id seen and every refund in a small
+SQLite database, so cross-reference checks only process new rows:
+- refunds whose charge (or payment intent) is not known yet stay open
+- open refunds are resolved automatically once their charge shows up
+- per-source datetime watermarks let read_new_rows() stop reading a
+  newest-first CSV (stripe_exporter.py output) at the first already indexed row
+
+Each update costs O(new rows + open orphans) regardless of history size.
+
+Usage:
+    with RefundIndex('stripe_refund_index.db') as index:
+        charges = index.read_new_rows('stripe_charges.csv', 'charges', CHARGE_ID_COLUMNS)
+        refunds = index.read_new_rows('stripe_refunds.csv', 'refunds', REFUND_ID_COLUMNS)
+        result = index.update(charges, refunds)
+        print(result['orphans'], index.orphans().head())
+"""
+
+import sqlite3
+import time
+
+import pandas as pd
+
+REFUND_INDEX_PATH = "stripe_refund_index.db"
+CHARGE_ID_COLUMNS = ['charge_id', 'payment_intent_id', 'datetime']
+REFUND_ID_COLUMNS = ['refund_id', 'charge_id', 'payment_intent_id', 'datetime']
+CHUNK_SIZE = 50_000
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS charges ('
+    'charge_id TEXT PRIMARY KEY, payment_intent_id TEXT, seen_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS charges_payment_intent ON charges (payment_intent_id)',
+    'CREATE TABLE IF NOT EXISTS refunds ('
+    'refund_id TEXT PRIMARY KEY, charge_id TEXT, payment_intent_id TEXT, datetime TEXT, '
+    'seen_at REAL NOT NULL, resolved_at REAL, resolved_by TEXT)',
+    # Partial index: resolution only ever scans open refunds
+    'CREATE INDEX IF NOT EXISTS refunds_open ON refunds (charge_id) WHERE resolved_at IS NULL',
+    'CREATE TABLE IF NOT EXISTS sources ('
+    'name TEXT PRIMARY KEY, watermark TEXT, rows INTEGER NOT NULL, updated_at REAL NOT NULL)',
+]
+
+
+def _column(df, name):
+    """Column values as a list with '' for missing"""
+    if df is None or name not in df.columns:
+        return [''] * (0 if df is None else len(df))
+    return df[name].fillna('').astype(str).str.strip().tolist()
+
+
+class RefundIndex:
+    """On-disk index of charges and refunds with open (orphaned) refund tracking."""
+
+    def __init__(self, path: str = REFUND_INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+        self._pending = {}
+
+    # ------------------------------------------------------------------
+    # New rows
+    # ------------------------------------------------------------------
+
+    def watermark(self, source: str):
+        row = self.conn.execute('SELECT watermark FROM sources WHERE name = ?', (source,)).fetchone()
+        return row[0] if row else None
+
+    def read_new_rows(self, path: str, source: str, columns, datetime_column: str = 'datetime',
+                      chunksize: int = CHUNK_SIZE) -> pd.DataFrame:
+        """
+        Read rows at or after the source watermark from a newest-first CSV.
+
+        The new watermark is recorded by the next update() call, so a failed
+        update re-reads the same rows next time.
+        """
+        watermark = self.watermark(source)
+        frames = []
+        for chunk in pd.read_csv(path, usecols=lambda column: column in columns, dtype=str,
+                                 keep_default_na=False, chunksize=chunksize):
+            if watermark is None or datetime_column not in chunk.columns:
+                frames.append(chunk)
+                continue
+            new = chunk[chunk[datetime_column] >= watermark]
+            frames.append(new)
+            if len(new) < len(chunk):
+                break  # Older rows are already indexed
+
+        new_rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+        if datetime_column in new_rows.columns and len(new_rows):
+            latest = new_rows[datetime_column].max()
+            self._pending[source] = max(latest, watermark) if watermark else latest
+        return new_rows
+
+    # ------------------------------------------------------------------
+    # Update
+    # ------------------------------------------------------------------
+
+    def update(self, charges: pd.DataFrame = None, refunds: pd.DataFrame = None) -> dict:
+        """
+        Add new charges/refunds and resolve open refunds in one transaction.
+
+        Returns:
+            dict: new_charges, new_refunds, resolved (previously open refunds
+            matched now), new_orphans, orphans (open after the update)
+        """
+        now = time.time()
+        rows = {'charges': 0 if charges is None else len(charges),
+                'refunds': 0 if refunds is None else len(refunds)}
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO charges (charge_id, payment_intent_id, seen_at) VALUES (?, ?, ?)',
+                [(charge_id, intent, now) for charge_id, intent
+                 in zip(_column(charges, 'charge_id'), _column(charges, 'payment_intent_id')) if charge_id])
+            new_charges = self.conn.total_changes - before
+
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO refunds (refund_id, charge_id, payment_intent_id, datetime, seen_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(refund_id, charge_id, intent, created, now) for refund_id, charge_id, intent, created
+                 in zip(_column(refunds, 'refund_id'), _column(refunds, 'charge_id'),
+                        _column(refunds, 'payment_intent_id'), _column(refunds, 'datetime')) if refund_id])
+            new_refunds = self.conn.total_changes - before
+
+            # Scans open refunds only (partial index) with one charge lookup each
+            before = self.conn.total_changes
+            self.conn.execute(
+                "UPDATE refunds SET resolved_at = ?, resolved_by = 'charge_id' WHERE resolved_at IS NULL "
+                "AND EXISTS (SELECT 1 FROM charges WHERE charges.charge_id = refunds.charge_id)", (now,))
+            self.conn.execute(
+                "UPDATE refunds SET resolved_at = ?, resolved_by = 'payment_intent_id' WHERE resolved_at IS NULL "
+                "AND payment_intent_id != '' "
+                "AND EXISTS (SELECT 1 FROM charges WHERE charges.payment_intent_id = refunds.payment_intent_id)",
+                (now,))
+            resolved_total = self.conn.total_changes - before
+
+            for source, watermark in self._pending.items():
+                self.conn.execute(
+                    'INSERT INTO sources (name, watermark, rows, updated_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (name) DO UPDATE SET watermark = excluded.watermark, '
+                    'rows = sources.rows + excluded.rows, updated_at = excluded.updated_at',
+                    (source, watermark, rows.get(source, 0), now))
+            self._pending = {}
+
+        orphans = self.open_count()
+        new_orphans = self.conn.execute(
+            'SELECT COUNT(*) FROM refunds WHERE resolved_at IS NULL AND seen_at = ?', (now,)).fetchone()[0]
+        return {
+            'new_charges': new_charges,
+            'new_refunds': new_refunds,
+            'resolved': resolved_total - (new_refunds - new_orphans),
+            'new_orphans': new_orphans,
+            'orphans': orphans,
+        }
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def open_count(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM refunds WHERE resolved_at IS NULL').fetchone()[0]
+
+    def orphans(self, limit: int = None) -> pd.DataFrame:
+        """Open refunds (charge not seen yet), oldest first"""
+        sql = ('SELECT refund_id, charge_id, payment_intent_id, datetime FROM refunds '
+               'WHERE resolved_at IS NULL ORDER BY datetime')
+        return pd.read_sql_query(sql + (f' LIMIT {int(limit)}' if limit else ''), self.conn)
+
+    def stats(self) -> dict:
+        charges, intents = self.conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT NULLIF(payment_intent_id, '')) FROM charges").fetchone()
+        refunds, by_charge, by_intent = self.conn.execute(
+            "SELECT COUNT(*), SUM(resolved_by = 'charge_id'), SUM(resolved_by = 'payment_intent_id') "
+            "FROM refunds").fetchone()
+        return {
+            'charges': charges,
+            'payment_intents': intents,
+            'refunds': refunds,
+            'matched_by_charge_id': by_charge or 0,
+            'matched_by_payment_intent': by_intent or 0,
+            'orphans': self.open_count(),
+        }
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
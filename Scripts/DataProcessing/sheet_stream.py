@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Streaming read-only sheet reader with column projection and typed parsing
+
+Reads one sheet with openpyxl in read-only mode, row by row, keeping only
+the requested columns (and, optionally, only rows accepted by a predicate).
+Rows are converted to typed columns in chunks while streaming, so neither a
+full-width DataFrame nor the whole sheet as Python objects is ever held:
+- dtypes declared in GoogleSheets/DATABASE_CAREPORTALS_SCHEMA.md are applied
+  to Database_CarePortals sheets (int64 / float64 / datetime64[ns] / object)
+- other columns (and other workbooks) get pandas' inferred dtype
+
+workbook_cache.read_sheet(..., columns=[...]) uses this reader on a cache
+miss, so a projection is parsed once per workbook version.
+
+Usage:
+    from sheet_stream import read_columns, sheet_header
+    events = read_columns('GoogleSheets/CarePortals_Orders.xlsx', 'order.updated',
+                          ['Order ID', 'Status', 'Timestamp'],
+                          where=lambda row: row['Status'] == 'shipped')
+
+    python sheet_stream.py ../../GoogleSheets/CarePortals_Orders.xlsx order.updated --columns "Order ID" Status Timestamp
+"""
+
+import argparse
+import re
+import sys
+import time
+from functools import lru_cache
+from operator import itemgetter
+from pathlib import Path
+
+import numpy as np
+import openpyxl
+from openpyxl.cell.cell import TYPE_ERROR
+import pandas as pd
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+SCHEMA_DOC_PATH = REPO_ROOT / 'GoogleSheets' / 'DATABASE_CAREPORTALS_SCHEMA.md'
+SCHEMA_WORKBOOK_PREFIX = 'Database_CarePortals'
+CHUNK_ROWS = 50_000  # Rows buffered as Python objects before typed conversion
+
+# Text cells read_excel treats as missing (its default na_values)
+NA_STRINGS = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+              '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+_SHEET_HEADING = re.compile(r'^###\s+\d+\.\s+(\S+)')
+_SAME_STRUCTURE = re.compile(r'Same structure as\s+(\S+)')
+_CELL_SEPARATOR = re.compile(r'(?<!\\)\|')
+_UNNAMED = re.compile(r'Unnamed: (\d+)')
+
+
+# ============================================================================
+# DECLARED SCHEMA
+# ============================================================================
+
+@lru_cache(maxsize=None)
+def load_declared_dtypes(schema_path=SCHEMA_DOC_PATH):
+    """
+    Column dtypes per sheet from the schema documentation tables.
+
+    Returns:
+        dict: sheet name -> {column: dtype}
+    """
+    declared = {}
+    sheet = None
+    with open(schema_path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            heading = _SHEET_HEADING.match(line)
+            if heading:
+                sheet = heading.group(1)
+                declared[sheet] = {}
+                continue
+            if sheet is None:
+                continue
+            same = _SAME_STRUCTURE.search(line)
+            if same and same.group(1) in declared:
+                declared[sheet] = dict(declared[same.group(1)])
+                continue
+            if line.startswith('|'):
+                cells = [cell.strip() for cell in _CELL_SEPARATOR.split(line.strip('|'))]
+                if len(cells) >= 2 and cells[0] not in ('Column', '') and not cells[0].startswith('-'):
+                    declared[sheet][cells[0].replace('\\|', '|')] = cells[1]
+    return declared
+
+
+def schema_dtypes(workbook_path, sheet_name):
+    """Declared dtypes for a sheet, or {} if the workbook is not Database_CarePortals"""
+    if not Path(workbook_path).name.startswith(SCHEMA_WORKBOOK_PREFIX) or not SCHEMA_DOC_PATH.exists():
+        return {}
+    return load_declared_dtypes().get(sheet_name, {})
+
+
+def _cell(value):
+    """Cell value as read_excel sees it: NA strings blank, integral floats int"""
+    if isinstance(value, str):
+        return None if value in NA_STRINGS else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _convert(values, dtype):
+    """
+    Series from a list of cell values: typed for declared numeric/datetime
+    columns, still object (NA strings blanked) for the rest.
+    """
+    series = pd.Series([_cell(value) for value in values], dtype=object)
+    if dtype in ('int64', 'float64'):
+        numeric = pd.to_numeric(series, errors='coerce')
+        if dtype == 'int64' and numeric.notna().all():
+            return numeric.astype('int64')
+        return numeric.astype('float64')
+    if dtype == 'datetime64[ns]':
+        return pd.to_datetime(series, format='mixed', errors='coerce')
+    return series
+
+
+def _infer(series):
+    """read_excel-style dtype for a whole object column"""
+    if len(series) and series.isna().all():
+        return series.astype('float64')
+    series = series.infer_objects()
+    if not len(series) or not (series.dtype == object or pd.api.types.is_string_dtype(series)):
+        return series
+    try:
+        # read_excel parses numeric text ('1680.0') and bools mixed with gaps/numbers as numbers
+        return pd.to_numeric(series)
+    except (TypeError, ValueError):
+        return series if series.dtype != object else series.where(series.notna(), np.nan)
+
+
+def apply_dtypes(df, dtypes):
+    """
+    Coerce the declared columns of a read_excel frame the way read_columns
+    does, so cached full sheets and streamed projections agree.
+    """
+    declared = {column: dtype for column, dtype in dtypes.items()
+                if column in df.columns and dtype in ('int64', 'float64', 'datetime64[ns]')}
+    if not declared:
+        return df
+    return df.assign(**{column: _convert(df[column].tolist(), dtype).values
+                        for column, dtype in declared.items()})
+
+
+# ============================================================================
+# STREAMING READ
+# ============================================================================
+
+def _is_blank(value):
+    return value is None or value == ''
+
+
+def _row_width(row):
+    """Number of cells up to the last non-blank one"""
+    width = len(row)
+    while width and _is_blank(row[width - 1]):
+        width -= 1
+    return width
+
+
+def _header_names(header, width=None):
+    """
+    Column labels like read_excel: header cells keep their value (integral
+    floats -> int), blank ones are 'Unnamed: i' and repeats 'name.1'.
+    width defaults to the last non-blank header cell; read_columns widens it
+    to the widest data row, as read_excel does.
+    """
+    header = list(header)
+    width = _row_width(header) if width is None else width
+    header = (header + [None] * width)[:width]
+    names, seen = [], {}
+    for i, cell in enumerate(header):
+        if isinstance(cell, float) and cell.is_integer():
+            cell = int(cell)
+        name = f"Unnamed: {i}" if _is_blank(cell) else cell
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def sheet_header(workbook_path, sheet_name):
+    """Column names of a sheet (reads only the first row)"""
+    workbook = openpyxl.load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        header = next(workbook[sheet_name].iter_rows(max_row=1, values_only=True), ())
+        return _header_names(header)
+    finally:
+        workbook.close()
+
+
+def _row_values(worksheet):
+    """Cell values row by row; error cells (#DIV/0!, #ERROR!) are None, as read_excel reads them"""
+    for row in worksheet.iter_rows():
+        yield tuple(None if cell.data_type == TYPE_ERROR else cell.value for cell in row)
+
+
+def read_columns(workbook_path, sheet_name, columns=None, where=None, dtypes=None, chunk_rows=CHUNK_ROWS):
+    """
+    Stream selected columns of a sheet into a DataFrame.
+
+    Args:
+        workbook_path (str): Workbook path
+        sheet_name (str): Sheet name
+        columns (list): Columns to keep, in output order (None: all)
+        where (callable): Optional row predicate, called with a dict of the
+            selected columns' raw cell values; rows it rejects are skipped
+        dtypes (dict): column -> dtype; defaults to the declared schema for
+            Database_CarePortals sheets, other columns are inferred
+        chunk_rows (int): Rows buffered before typed conversion
+
+    Returns:
+        pd.DataFrame: Selected rows and columns (trailing blank rows dropped,
+        like read_excel)
+    """
+    if dtypes is None:
+        dtypes = schema_dtypes(workbook_path, sheet_name)
+
+    workbook = openpyxl.load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        rows = _row_values(workbook[sheet_name])
+        header = next(rows, ())
+        header_width = _row_width(header)
+        names = _header_names(header, header_width)
+
+        def name_of(index):
+            # Columns past the header exist only if some data row reaches them
+            return names[index] if index < header_width else f"Unnamed: {index}"
+
+        if columns is None:
+            indices = None
+            blank_values = ()
+        else:
+            columns = list(columns)
+            indices, missing = [], []
+            for column in columns:
+                unnamed = _UNNAMED.fullmatch(column) if isinstance(column, str) else None
+                if column in names:
+                    indices.append(names.index(column))
+                elif unnamed and int(unnamed.group(1)) >= header_width:
+                    indices.append(int(unnamed.group(1)))
+                else:
+                    missing.append(column)
+            if missing:
+                raise ValueError(f"Columns {missing} not in sheet '{sheet_name}': {names}")
+            if not columns:
+                return pd.DataFrame()
+            width = max(indices) + 1
+            pick = itemgetter(*indices) if len(indices) > 1 else (lambda row: (row[indices[0]],))
+            blank_values = (None,) * len(columns)
+        # The data width is only needed to expand or validate columns past the header
+        track_width = indices is None or max(indices) >= header_width
+        data_width = header_width
+
+        chunk_lengths = []
+        chunks = {}  # column index -> {chunk number: Series}
+        buffer = []
+        keep_blank = where is None or where(dict.fromkeys(names if columns is None else columns))
+        pending_blank = 0
+
+        def flush():
+            if buffer:
+                number = len(chunk_lengths)
+                chunk_lengths.append(len(buffer))
+                if indices is None:
+                    span = max(len(values) for values in buffer)
+                    block = [values + (None,) * (span - len(values)) for values in buffer]
+                    positions = range(span)
+                else:
+                    block, positions = buffer, indices
+                for position, values in zip(positions, zip(*block)):
+                    chunks.setdefault(position, {})[number] = _convert(list(values), dtypes.get(name_of(position)))
+                buffer.clear()
+
+        for row in rows:
+            # Blank rows count only if a later row has data anywhere (read_excel trims trailing ones)
+            if all(_is_blank(value) for value in row):
+                pending_blank += 1
+                continue
+            if pending_blank and keep_blank:
+                buffer.extend([blank_values] * pending_blank)
+            pending_blank = 0
+            if track_width:
+                row_width = _row_width(row)
+                data_width = max(data_width, row_width)
+            if indices is None:
+                values = row[:row_width]
+                if where is not None and not where({name_of(i): value for i, value in enumerate(values)}):
+                    continue
+            else:
+                if len(row) < width:
+                    row = row + (None,) * (width - len(row))
+                values = pick(row)
+                if where is not None and not where(dict(zip(columns, values))):
+                    continue
+            buffer.append(values)
+            if len(buffer) >= chunk_rows:
+                flush()
+        flush()
+    finally:
+        workbook.close()
+
+    if indices is None:
+        indices = list(range(data_width))
+        columns = [name_of(index) for index in indices]
+    else:
+        beyond = [column for column, index in zip(columns, indices) if index >= data_width]
+        if beyond:
+            raise ValueError(f"Columns {beyond} not in sheet '{sheet_name}': "
+                             f"{[name_of(index) for index in range(data_width)]}")
+
+    data = {}
+    for column, position in zip(columns, indices):
+        dtype = dtypes.get(column)
+        converted = chunks.get(position, {})
+        parts = [converted[number] if number in converted else _convert([None] * length, dtype)
+                 for number, length in enumerate(chunk_lengths)] or [_convert([], dtype)]
+        data[column] = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        if dtype not in ('int64', 'float64', 'datetime64[ns]'):
+            data[column] = _infer(data[column])
+    return pd.DataFrame(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream selected columns of a workbook sheet')
+    parser.add_argument('workbook', help='Workbook path')
+    parser.add_argument('sheet', help='Sheet name')
+    parser.add_argument('--columns', nargs='+', help='Columns to read (default: all)')
+    parser.add_argument('--compare', action='store_true', help='Also time a full pd.read_excel of the sheet')
+    args = parser.parse_args()
+
+    start = time.time()
+    try:
+        df = read_columns(args.workbook, args.sheet, args.columns)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    elapsed = time.time() - start
+
+    print(f"✅ {args.sheet}: {len(df):,} rows x {len(df.columns)} columns in {elapsed:.2f}s "
+          f"({df.memory_usage(deep=True).sum() / 1e6:.1f} MB)")
+    for column, dtype in df.dtypes.items():
+        print(f"   {column}: {dtype}")
+
+    if args.compare:
+        start = time.time()
+        full = pd.read_excel(args.workbook, sheet_name=args.sheet, engine='openpyxl')
+        print(f"   pd.read_excel (all {len(full.columns)} columns): {time.time() - start:.2f}s "
+              f"({full.memory_usage(deep=True).sum() / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
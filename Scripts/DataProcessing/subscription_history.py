@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Point-in-time ("as-of") subscription history
+
+Builds validity intervals per SubscriptionID and status from
+subscription.full_log (webhook events plus the lifecycle events written by
+update_database_subscriptions.py), so questions like "how many active
+subscriptions did we have on 2025-08-01" no longer need old workbook copies.
+
+Each interval is [Valid From, Valid To) with an open end for the current
+status. The interval index keeps, per status, the sorted start and end
+timestamps plus cumulative MRR, so counts and MRR for any set of dates are
+two searchsorted calls instead of a log replay:
+
+    count(t) = #starts <= t - #ends <= t
+
+Subscriptions with no logged events (created before the log existed) are
+active from Datetime Created and in their current status from Last Updated;
+subscriptions whose first event comes after Datetime Created are assumed
+active until then.
+
+Usage:
+    python subscription_history.py --as-of 2025-08-01
+    python subscription_history.py --daily 2025-08-01 2025-09-30 --output daily.csv
+    python subscription_history.py --store ../../GoogleSheets/careportals.db --save
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from subscription_lifecycle import STATUSES, STATUS_SHEETS, FULL_LOG_SHEET
+from workbook_cache import read_sheet, read_sheets
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_WORKBOOK_PATH = REPO_ROOT / 'GoogleSheets' / 'Database_CarePortals.xlsx'
+
+INTERVALS_TABLE = 'subscription_status_intervals'
+OPEN_END = np.iinfo(np.int64).max
+
+
+# ============================================================================
+# EVENTS
+# ============================================================================
+
+def events_from_workbook(workbook_path=DEFAULT_WORKBOOK_PATH):
+    """
+    Load status events and current subscriptions from the workbook.
+
+    Returns:
+        tuple: (full_log DataFrame, current subscriptions DataFrame)
+    """
+    sheets = read_sheets(workbook_path, [FULL_LOG_SHEET] + list(STATUS_SHEETS.values()))
+    current = pd.concat([sheets[name] for name in STATUS_SHEETS.values()], ignore_index=True)
+    return sheets[FULL_LOG_SHEET], current
+
+
+def events_from_store(store):
+    """Load status events and current subscriptions from the SQLite store"""
+    full_log = store.query(
+        'SELECT subscription_id AS SubscriptionID, product_id AS ProductID, status AS Status, '
+        'created_at AS "Datetime Created", updated_at AS "Last Updated", '
+        'webhook_received_at AS "Datetime Received" FROM subscriptions_audit_log')
+    current = store.query(' UNION ALL '.join(
+        f'SELECT subscription_id AS SubscriptionID, product_id AS ProductID, status AS Status, '
+        f'created_at AS "Datetime Created", updated_at AS "Last Updated" FROM subscriptions_{status}'
+        for status in STATUSES))
+    return full_log, current
+
+
+# ============================================================================
+# INTERVALS
+# ============================================================================
+
+def build_intervals(full_log, current):
+    """
+    Build validity intervals from the event log and current subscriptions.
+
+    Args:
+        full_log (pd.DataFrame): subscription.full_log rows
+        current (pd.DataFrame): Union of the subscription.* status sheets
+
+    Returns:
+        pd.DataFrame: SubscriptionID, Status, ProductID, Valid From, Valid To (NaT = open)
+    """
+    current = current.drop_duplicates(subset=['SubscriptionID'], keep='last')
+    # full_log ProductID can be "[object Object]" (webhook payload), the status sheets are authoritative
+    product_ids = current.set_index('SubscriptionID')['ProductID']
+
+    log = pd.DataFrame({
+        'SubscriptionID': full_log['SubscriptionID'].values,
+        'Status': full_log['Status'].str.lower().values,
+        'Effective At': pd.to_datetime(full_log['Last Updated'], errors='coerce')
+        .fillna(pd.to_datetime(full_log['Datetime Received'], errors='coerce')).values,
+        'Datetime Created': pd.to_datetime(full_log['Datetime Created'], errors='coerce').values,
+    })
+    log = log[log['Status'].isin(STATUSES) & log['Effective At'].notna()]
+
+    # Subscriptions never logged: active from creation, current status from Last Updated
+    unlogged = current[~current['SubscriptionID'].isin(log['SubscriptionID'])]
+    created = pd.to_datetime(unlogged['Datetime Created'], errors='coerce')
+    updated = pd.to_datetime(unlogged['Last Updated'], errors='coerce')
+    unlogged_status = unlogged['Status'].str.lower()
+    changed_later = (unlogged_status != 'active') & updated.notna() & (updated > created)
+    baseline = pd.DataFrame({
+        'SubscriptionID': np.concatenate([unlogged['SubscriptionID'].values,
+                                          unlogged.loc[changed_later, 'SubscriptionID'].values]),
+        'Status': np.concatenate([unlogged_status.where(~changed_later, 'active').values,
+                                  unlogged_status[changed_later].values]),
+        'Effective At': np.concatenate([created.values, updated[changed_later].values]),
+    })
+
+    # Logged subscriptions created before their first event start as active
+    first = log.sort_values('Effective At', kind='stable').drop_duplicates(subset=['SubscriptionID'])
+    before_first = first[first['Datetime Created'] < first['Effective At']]
+    prefix = pd.DataFrame({
+        'SubscriptionID': before_first['SubscriptionID'].values,
+        'Status': 'active',
+        'Effective At': before_first['Datetime Created'].values,
+    })
+
+    events = pd.concat([baseline, prefix, log.drop(columns=['Datetime Created'])], ignore_index=True)
+    events = events[events['Effective At'].notna()]
+    events = events.sort_values(['SubscriptionID', 'Effective At'], kind='stable').reset_index(drop=True)
+
+    # Collapse repeated events with the same status (cycle renewals, re-sent webhooks)
+    same_sub = events['SubscriptionID'].eq(events['SubscriptionID'].shift())
+    repeated = same_sub & events['Status'].eq(events['Status'].shift())
+    events = events[~repeated].reset_index(drop=True)
+
+    next_sub = events['SubscriptionID'].shift(-1)
+    valid_to = events['Effective At'].shift(-1).where(next_sub.eq(events['SubscriptionID']))
+
+    intervals = pd.DataFrame({
+        'SubscriptionID': events['SubscriptionID'],
+        'Status': events['Status'],
+        'ProductID': events['SubscriptionID'].map(product_ids),
+        'Valid From': events['Effective At'],
+        'Valid To': valid_to,
+    })
+    return intervals[intervals['Valid To'].isna() | (intervals['Valid To'] > intervals['Valid From'])] \
+        .reset_index(drop=True)
+
+
+def monthly_revenue(products):
+    """ProductID -> monthly recurring revenue (renewal_price / renewal_cycle_duration months)"""
+    duration = pd.to_numeric(products['renewal_cycle_duration'], errors='coerce').replace(0, np.nan)
+    mrr = pd.to_numeric(products['renewal_price'], errors='coerce') / duration
+    return pd.Series(mrr.values, index=products['product_id'].values).dropna()
+
+
+# ============================================================================
+# INTERVAL INDEX
+# ============================================================================
+
+def _to_ns(values):
+    """Datetimes -> int64 nanoseconds (NaT -> open end)"""
+    values = pd.to_datetime(pd.Series(values)).astype('datetime64[ns]')
+    ns = values.values.astype('int64')
+    ns[values.isna().values] = OPEN_END
+    return ns
+
+
+class SubscriptionHistory:
+    """Sorted interval index answering as-of counts and MRR with one sweep"""
+
+    def __init__(self, intervals, mrr_by_product=None):
+        self.intervals = intervals
+        mrr = intervals['ProductID'].map(mrr_by_product) if mrr_by_product is not None else None
+        self._index = {}
+        for status in STATUSES:
+            in_status = (intervals['Status'] == status).values
+            starts = _to_ns(intervals.loc[in_status, 'Valid From'])
+            ends = _to_ns(intervals.loc[in_status, 'Valid To'])
+            values = (mrr[in_status].fillna(0).values if mrr is not None
+                      else np.zeros(in_status.sum()))
+
+            start_order = np.argsort(starts, kind='stable')
+            end_order = np.argsort(ends, kind='stable')
+            self._index[status] = {
+                'starts': starts[start_order],
+                'ends': ends[end_order],
+                'start_mrr': np.concatenate([[0.0], np.cumsum(values[start_order])]),
+                'end_mrr': np.concatenate([[0.0], np.cumsum(values[end_order])]),
+            }
+
+    def _positions(self, status, dates):
+        index = self._index[status]
+        t = _to_ns(dates)
+        started = np.searchsorted(index['starts'], t, side='right')
+        ended = np.searchsorted(index['ends'], t, side='right')
+        return index, started, ended
+
+    def count_as_of(self, dates, status='active'):
+        """Number of subscriptions in status at each date"""
+        _, started, ended = self._positions(status, dates)
+        return started - ended
+
+    def mrr_as_of(self, dates, status='active'):
+        """Monthly recurring revenue of subscriptions in status at each date"""
+        index, started, ended = self._positions(status, dates)
+        return index['start_mrr'][started] - index['end_mrr'][ended]
+
+    def as_of(self, date):
+        """Counts per status and active MRR at one date"""
+        row = {status: int(self.count_as_of([date], status)[0]) for status in STATUSES}
+        row['mrr'] = float(self.mrr_as_of([date])[0])
+        return row
+
+    def daily_series(self, start, end):
+        """Counts per status and active MRR at the end of every day in [start, end]"""
+        days = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq='D')
+        cutoffs = days + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+        series = pd.DataFrame(index=days)
+        series.index.name = 'date'
+        for status in STATUSES:
+            series[status] = self.count_as_of(cutoffs, status)
+        series['mrr'] = self.mrr_as_of(cutoffs)
+        return series
+
+
+# ============================================================================
+# STORE PERSISTENCE
+# ============================================================================
+
+def save_intervals(store, intervals):
+    """Persist intervals to the store (rebuilt on every run)"""
+    store.conn.execute(
+        f'CREATE TABLE IF NOT EXISTS {INTERVALS_TABLE} ('
+        'subscription_id TEXT NOT NULL, status TEXT NOT NULL, product_id TEXT, '
+        'valid_from TIMESTAMP NOT NULL, valid_to TIMESTAMP)')
+    store.conn.execute(
+        f'CREATE INDEX IF NOT EXISTS {INTERVALS_TABLE}_status_range '
+        f'ON {INTERVALS_TABLE} (status, valid_from, valid_to)')
+    return store.replace_table(INTERVALS_TABLE, intervals.rename(columns={
+        'SubscriptionID': 'subscription_id', 'Status': 'status', 'ProductID': 'product_id',
+        'Valid From': 'valid_from', 'Valid To': 'valid_to'}))
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='As-of queries over subscription history')
+    parser.add_argument('--workbook', default=str(DEFAULT_WORKBOOK_PATH), help='Database_CarePortals.xlsx path')
+    parser.add_argument('--store', help='Read events from this SQLite store instead of the workbook')
+    parser.add_argument('--as-of', action='append', default=[], help='Date to report (repeatable)')
+    parser.add_argument('--daily', nargs=2, metavar=('START', 'END'), help='Daily series between two dates')
+    parser.add_argument('--output', help='CSV path for the daily series')
+    parser.add_argument('--save', action='store_true', help='Persist intervals to the store')
+    args = parser.parse_args()
+
+    store = None
+    if args.store:
+        from careportals_store import CarePortalsStore
+        store = CarePortalsStore(args.store)
+        full_log, current = events_from_store(store)
+        products = store.query('SELECT product_id, renewal_price, renewal_cycle_duration FROM products')
+    else:
+        full_log, current = events_from_workbook(args.workbook)
+        products = read_sheet(args.workbook, 'products')
+
+    intervals = build_intervals(full_log, current)
+    history = SubscriptionHistory(intervals, monthly_revenue(products))
+    print(f"📚 {len(intervals)} intervals for {intervals['SubscriptionID'].nunique()} subscriptions")
+
+    for date in args.as_of:
+        row = history.as_of(date)
+        counts = ', '.join(f"{status}: {row[status]}" for status in STATUSES)
+        print(f"  📅 {date} → {counts}, MRR: ${row['mrr']:,.2f}")
+
+    if args.daily:
+        series = history.daily_series(*args.daily)
+        if args.output:
+            series.to_csv(args.output)
+            print(f"  ✅ Daily series saved to {args.output}")
+        else:
+            print(series.to_string())
+
+    if args.save:
+        if store is None:
+            print("  ❌ --save requires --store")
+            return 1
+        result = save_intervals(store, intervals)
+        print(f"  ✅ {INTERVALS_TABLE}: {result['written']} rows")
+
+    if store is not None:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
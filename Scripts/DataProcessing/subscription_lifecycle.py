@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Subscription lifecycle diff engine
+
+Compares an incoming subscription snapshot (sheet column names: SubscriptionID,
+CustomerID, ProductID, Cycle, Status, Datetime Created, Last Updated) with the
+stored state in a single hash join on SubscriptionID and emits one event per
+new subscription or status transition (active→paused, paused→cancelled, ...).
+
+Events are then applied either to the workbook sheets or to the SQLite store:
+- the subscription is moved out of its old status sheet/table into the new one
+  (manual CustomerID/ProductID/Cycle values are carried over)
+- one audit row per event is appended to subscription.full_log /
+  subscriptions_audit_log, using the same layout as the subscriptions webhook
+
+Only changed subscriptions are read back and written, so the cost of applying
+a snapshot is proportional to the number of changes.
+"""
+
+import json
+from datetime import datetime
+
+import pandas as pd
+import pytz
+
+from keyed_upsert import keyed_upsert, FILL_IF_EMPTY, OVERWRITE
+
+STATUSES = ['active', 'paused', 'cancelled']
+STATUS_SHEETS = {status: f'subscription.{status}' for status in STATUSES}
+STATUS_TABLES = {status: f'subscriptions_{status}' for status in STATUSES}
+FULL_LOG_SHEET = 'subscription.full_log'
+
+SUBSCRIPTION_COLUMNS = ['SubscriptionID', 'CustomerID', 'ProductID', 'Cycle', 'Status',
+                        'Datetime Created', 'Last Updated']
+FULL_LOG_COLUMNS = ['Datetime Received', 'Trigger Type', 'SubscriptionID', 'CustomerID', 'ProductID',
+                    'Cycle', 'Status', 'Datetime Created', 'Last Updated', 'Raw Data']
+
+# Same policies as the subscription updater: manual values win, status follows the snapshot
+MOVE_POLICIES = {
+    'CustomerID': FILL_IF_EMPTY,
+    'ProductID': FILL_IF_EMPTY,
+    'Cycle': FILL_IF_EMPTY,
+    'Datetime Created': FILL_IF_EMPTY,
+    'Status': OVERWRITE,
+    'Last Updated': OVERWRITE,
+}
+
+SHEET_TO_TABLE_COLUMNS = {
+    'SubscriptionID': 'subscription_id',
+    'CustomerID': 'customer_id',
+    'ProductID': 'product_id',
+    'Cycle': 'cycle',
+    'Status': 'status',
+    'Datetime Created': 'created_at',
+    'Last Updated': 'updated_at',
+    'Datetime Received': 'webhook_received_at',
+    'Trigger Type': 'trigger_type',
+    'Raw Data': 'raw_data',
+}
+
+
+def eastern_now():
+    """Current Eastern time as a naive datetime (database convention)"""
+    return datetime.now(pytz.timezone('US/Eastern')).replace(tzinfo=None)
+
+
+# ============================================================================
+# STORED STATE
+# ============================================================================
+
+def stored_state_from_sheets(existing_data):
+    """
+    Build the stored state from the subscription.* sheets.
+
+    Args:
+        existing_data (dict): sheet name -> DataFrame (load_existing_data output)
+
+    Returns:
+        pd.DataFrame: SubscriptionID, Stored Status, Last Updated (one row per location)
+    """
+    frames = []
+    for status, sheet_name in STATUS_SHEETS.items():
+        df = existing_data.get(sheet_name)
+        if df is None or len(df) == 0:
+            continue
+        frames.append(pd.DataFrame({
+            'SubscriptionID': df['SubscriptionID'].values,
+            'Stored Status': status,
+            'Last Updated': df['Last Updated'].values if 'Last Updated' in df.columns else None,
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['SubscriptionID', 'Stored Status', 'Last Updated'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def stored_state_from_store(store):
+    """Build the stored state from the subscriptions_* tables"""
+    union = ' UNION ALL '.join(
+        f"SELECT subscription_id AS SubscriptionID, '{status}' AS \"Stored Status\", "
+        f"updated_at AS \"Last Updated\" FROM {table}"
+        for status, table in STATUS_TABLES.items()
+    )
+    return store.query(union)
+
+
+def _current_status(stored_df):
+    """Collapse stored locations to one status per subscription (latest update wins)"""
+    latest = stored_df.assign(_updated=pd.to_datetime(stored_df['Last Updated'], errors='coerce'))
+    latest = latest.sort_values('_updated', na_position='first', kind='stable')
+    latest = latest.drop_duplicates(subset=['SubscriptionID'], keep='last')
+    return latest[['SubscriptionID', 'Stored Status']]
+
+
+# ============================================================================
+# DIFF
+# ============================================================================
+
+def diff_snapshot(snapshot_df, stored_df, observed_at=None):
+    """
+    Compare the incoming snapshot with the stored state in one hashed pass.
+
+    Args:
+        snapshot_df (pd.DataFrame): Incoming subscriptions (sheet columns)
+        stored_df (pd.DataFrame): stored_state_from_sheets/_from_store output
+        observed_at (datetime): Event timestamp (defaults to now, Eastern)
+
+    Returns:
+        pd.DataFrame: One row per event with the snapshot columns plus
+        From Status, Transition and Datetime Received
+    """
+    observed_at = observed_at or eastern_now()
+    incoming = snapshot_df.drop_duplicates(subset=['SubscriptionID'], keep='last')
+    incoming = incoming[incoming['Status'].isin(STATUSES)]
+
+    joined = incoming.merge(_current_status(stored_df), on='SubscriptionID', how='left')
+    changed = joined['Stored Status'].isna() | (joined['Stored Status'] != joined['Status'])
+
+    events = joined[changed].rename(columns={'Stored Status': 'From Status'}).reset_index(drop=True)
+    events['Transition'] = events['From Status'].fillna('new') + '→' + events['Status']
+    events['Datetime Received'] = observed_at
+    # Stamp status changes only; new subscriptions keep Last Updated empty
+    stamp = events['Last Updated'].isna() & events['From Status'].notna()
+    events['Last Updated'] = events['Last Updated'].astype(object).mask(stamp, pd.Timestamp(observed_at))
+    return events
+
+
+def audit_rows(events):
+    """Format events as subscription.full_log rows"""
+    raw_data = [
+        json.dumps({'source': 'snapshot_diff',
+                    'from_status': None if pd.isna(from_status) else from_status,
+                    'to_status': to_status})
+        for from_status, to_status in zip(events['From Status'], events['Status'])
+    ]
+    # Like webhook log rows, every audit row carries its update time (new subscriptions: the event time)
+    last_updated = events['Last Updated'].astype(object).where(events['Last Updated'].notna(),
+                                                               events['Datetime Received'])
+    rows = events.assign(**{'Trigger Type': events['Status'], 'Raw Data': raw_data, 'Last Updated': last_updated})
+    return rows.reindex(columns=FULL_LOG_COLUMNS)
+
+
+def summarize_events(events):
+    """Return transition -> count"""
+    if len(events) == 0:
+        return {}
+    return events['Transition'].value_counts().to_dict()
+
+
+def _moved_rows(events, stored_rows):
+    """Merge stored rows of moved subscriptions with the snapshot values (extra stored columns kept)"""
+    snapshot_rows = events.reindex(columns=SUBSCRIPTION_COLUMNS)
+    if len(stored_rows) == 0:
+        return snapshot_rows
+    merged, _ = keyed_upsert(stored_rows.drop_duplicates(subset=['SubscriptionID'], keep='last'),
+                             snapshot_rows, 'SubscriptionID', MOVE_POLICIES)
+    return merged
+
+
+# ============================================================================
+# APPLY: WORKBOOK SHEETS
+# ============================================================================
+
+def apply_events_to_sheets(existing_data, events):
+    """
+    Move changed subscriptions between status sheets and build audit rows.
+
+    Args:
+        existing_data (dict): sheet name -> DataFrame
+        events (pd.DataFrame): diff_snapshot output
+
+    Returns:
+        tuple: (updated sheet dict, full_log rows DataFrame)
+    """
+    updated = dict(existing_data)
+    if len(events) == 0:
+        return updated, audit_rows(events)
+
+    event_ids = set(events['SubscriptionID'])
+    stored_rows = []
+    for sheet_name in STATUS_SHEETS.values():
+        df = existing_data.get(sheet_name, pd.DataFrame())
+        if len(df) == 0:
+            continue
+        in_events = df['SubscriptionID'].isin(event_ids)
+        if in_events.any():
+            stored_rows.append(df[in_events])
+            updated[sheet_name] = df[~in_events].reset_index(drop=True)
+
+    stored_rows = pd.concat(stored_rows, ignore_index=True) if stored_rows else pd.DataFrame()
+    moved = _moved_rows(events, stored_rows)
+
+    for status, sheet_name in STATUS_SHEETS.items():
+        rows = moved[moved['Status'] == status]
+        if len(rows) == 0:
+            continue
+        target = updated.get(sheet_name, pd.DataFrame())
+        updated[sheet_name] = pd.concat([target, rows], ignore_index=True) if len(target) else rows
+
+    return updated, audit_rows(events)
+
+
+# ============================================================================
+# APPLY: SQLITE STORE
+# ============================================================================
+
+def _to_table_columns(df):
+    return df.rename(columns=SHEET_TO_TABLE_COLUMNS)
+
+
+def _to_sheet_columns(df):
+    return df.rename(columns={v: k for k, v in SHEET_TO_TABLE_COLUMNS.items()})
+
+
+def apply_events_to_store(store, events):
+    """
+    Move changed subscriptions between status tables and append the audit log,
+    all in one transaction.
+
+    Args:
+        store (CarePortalsStore): Open store
+        events (pd.DataFrame): diff_snapshot output
+
+    Returns:
+        dict: {'moved': n, 'audit_rows': n, 'skipped': n}
+    """
+    if len(events) == 0:
+        return {'moved': 0, 'audit_rows': 0, 'skipped': 0}
+
+    event_ids = events['SubscriptionID'].tolist()
+    placeholders = ', '.join('?' for _ in event_ids)
+    select_columns = ', '.join(SHEET_TO_TABLE_COLUMNS[c] for c in SUBSCRIPTION_COLUMNS)
+    stored_rows = pd.concat([
+        _to_sheet_columns(store.query(
+            f'SELECT {select_columns} FROM {table} WHERE subscription_id IN ({placeholders})', event_ids))
+        for table in STATUS_TABLES.values()
+    ], ignore_index=True)
+    moved = _moved_rows(events, stored_rows)
+
+    skipped = 0
+    with store.transaction() as conn:
+        for table in STATUS_TABLES.values():
+            store.delete(table, 'subscription_id', event_ids, conn=conn)
+        for status, table in STATUS_TABLES.items():
+            rows = moved[moved['Status'] == status]
+            if len(rows):
+                skipped += store.upsert(table, _to_table_columns(rows), conn=conn)['skipped']
+        audit = store.upsert('subscriptions_audit_log', _to_table_columns(audit_rows(events)), conn=conn)
+
+    return {'moved': len(moved) - skipped, 'audit_rows': audit['written'], 'skipped': skipped}
+
+
+def sync_snapshot_to_store(store, snapshot_df, observed_at=None):
+    """Diff a snapshot against the store and apply the resulting events"""
+    events = diff_snapshot(snapshot_df, stored_state_from_store(store), observed_at)
+    return events, apply_events_to_store(store, events)
@@ -5,13 +5,37 @@ FINAL CORRECTED Script to update Database_CarePortals.xlsx
 - Preserva Last Updated de registros existentes  
 - Preserva Customer IDs agregados manualmente
 - Hace merge inteligente sin sobrescribir datos existentes
+- Con --store: lee y escribe las suscripciones en el store SQLite
+  (careportals_store.py) en lugar del Excel
+
+Usage:
+    python3 update_database_subscriptions.py
+    python3 update_database_subscriptions.py --store GoogleSheets/careportals.db
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 import os
+import re
+import difflib
 from datetime import datetime
 import pytz
+from keyed_upsert import keyed_upsert, FILL_IF_EMPTY, OVERWRITE
+from workbook_cache import read_sheet, read_sheets, sheet_names
+from workbook_patcher import patch_sheets
+from careportals_store import CarePortalsStore, SHEET_MAPPINGS
+from subscription_lifecycle import (diff_snapshot, stored_state_from_sheets, apply_events_to_sheets,
+                                    summarize_events, FULL_LOG_SHEET)
+
+_TOKEN_RE = re.compile(r'\w+')
+
+SUBSCRIPTION_MERGE_POLICIES = {
+    'CustomerID': FILL_IF_EMPTY,
+    'ProductID': FILL_IF_EMPTY,
+    'Cycle': FILL_IF_EMPTY,
+    'Status': OVERWRITE,
+}
 
 def clean_test_entries(df):
     """Remove test entries from the subscriptions dataframe"""
@@ -64,54 +88,149 @@ def clean_test_entries(df):
     
     return cleaned_df
 
-def lookup_ids(df, customer_dict, product_dict):
+def _tokenize(text):
+    """Split a label into lowercase word tokens"""
+    return _TOKEN_RE.findall(str(text).lower())
+
+def build_resolution_index(customer_dict, product_dict):
+    """Prebuild hash maps for customer/product name resolution
+
+    - customer_exact / customer_casefold: nombre normalizado -> Customer ID
+    - product_exact: label normalizado -> product_id
+    - product_tokens: token -> posiciones de labels (índice invertido)
+    El primer registro del diccionario gana, igual que el iloc[0] original.
+    """
+    
+    customers = customer_dict[customer_dict['Customer Name'].notna()]
+    customer_names = customers['Customer Name'].astype(str).str.strip()
+    customer_ids = customers['Customer ID'].tolist()
+    
+    customer_exact = {}
+    customer_casefold = {}
+    for name, customer_id in zip(customer_names.tolist(), customer_ids):
+        customer_exact.setdefault(name, customer_id)
+        customer_casefold.setdefault(name.lower(), customer_id)
+    
+    products = product_dict[product_dict['label'].notna()]
+    product_labels = products['label'].astype(str).str.strip().tolist()
+    product_ids = products['product_id'].tolist()
+    
+    product_exact = {}
+    product_tokens = {}
+    for position, (label, product_id) in enumerate(zip(product_labels, product_ids)):
+        product_exact.setdefault(label, product_id)
+        for token in set(_tokenize(label)):
+            product_tokens.setdefault(token, set()).add(position)
+    
+    return {
+        'customer_exact': customer_exact,
+        'customer_casefold': customer_casefold,
+        'customer_names': list(customer_exact.keys()),
+        'product_exact': product_exact,
+        'product_labels': product_labels,
+        'product_labels_lower': [label.lower() for label in product_labels],
+        'product_ids': product_ids,
+        'product_tokens': product_tokens,
+    }
+
+def resolve_partial_product(index, product_name):
+    """Resolve a product name contained in a label using the token index
+    
+    Si el nombre está contenido en un label, sus tokens interiores son tokens
+    completos del label, el primero es sufijo y el último prefijo de alguno.
+    Eso reduce los candidatos antes de verificar la subcadena.
+    """
+    
+    query = str(product_name).lower()
+    query_tokens = _tokenize(query)
+    product_tokens = index['product_tokens']
+    
+    candidates = None
+    last = len(query_tokens) - 1
+    for position, token in enumerate(query_tokens):
+        if last == 0:
+            matching = [t for t in product_tokens if token in t]
+        elif position == 0:
+            matching = [t for t in product_tokens if t.endswith(token)]
+        elif position == last:
+            matching = [t for t in product_tokens if t.startswith(token)]
+        else:
+            matching = [token] if token in product_tokens else []
+        
+        postings = set()
+        for t in matching:
+            postings |= product_tokens[t]
+        candidates = postings if candidates is None else candidates & postings
+        if not candidates:
+            return None
+    
+    if candidates is None:
+        candidates = range(len(index['product_labels']))
+    
+    labels_lower = index['product_labels_lower']
+    for position in sorted(candidates):
+        if query in labels_lower[position]:
+            return index['product_ids'][position]
+    return None
+
+def report_unmatched(names, vocabulary, label, limit=20):
+    """Print unmatched names together with their closest candidates"""
+    
+    unmatched = sorted({str(name) for name in names})
+    if not unmatched:
+        return
+    
+    print(f"  ⚠️  {label} sin coincidencia: {len(unmatched)} nombres únicos")
+    for name in unmatched[:limit]:
+        closest = difflib.get_close_matches(name, vocabulary, n=3, cutoff=0.6)
+        suggestion = ', '.join(f"'{c}'" for c in closest) if closest else 'sin candidatos'
+        print(f"    • '{name}' → {suggestion}")
+    if len(unmatched) > limit:
+        print(f"    • ... y {len(unmatched) - limit} más")
+
+def lookup_ids(df, customer_dict, product_dict, index=None):
     """Lookup customer and product IDs"""
     
     print("\n🔍 Buscando IDs de Customer y Product:")
     print("=" * 40)
     
+    if index is None:
+        index = build_resolution_index(customer_dict, product_dict)
+    
     result_df = df.copy()
-    result_df['Customer ID'] = None
-    result_df['Product ID'] = None
     
-    customer_found = 0
-    product_found = 0
+    # Los IDs se resuelven como objetos (dtype object) para que los IDs enteros
+    # no pasen a float (101 -> 101.0) al mezclarse con valores no encontrados
     
-    for idx, row in df.iterrows():
-        # Customer ID lookup
-        subscription_name = str(row['Name']).strip()
-        
-        # Try exact match first
-        exact_match = customer_dict[customer_dict['Customer Name'].str.strip() == subscription_name]
-        if not exact_match.empty:
-            result_df.at[idx, 'Customer ID'] = exact_match.iloc[0]['Customer ID']
-            customer_found += 1
-        else:
-            # Try case-insensitive match
-            case_match = customer_dict[customer_dict['Customer Name'].str.lower().str.strip() == subscription_name.lower()]
-            if not case_match.empty:
-                result_df.at[idx, 'Customer ID'] = case_match.iloc[0]['Customer ID']
-                customer_found += 1
-        
-        # Product ID lookup
-        product_name = str(row['Product Name']).strip()
-        
-        # Try exact match
-        exact_match = product_dict[product_dict['label'].str.strip() == product_name]
-        if not exact_match.empty:
-            result_df.at[idx, 'Product ID'] = exact_match.iloc[0]['product_id']
-            product_found += 1
-        else:
-            # Try partial match
-            partial_matches = product_dict[product_dict['label'].str.contains(product_name, case=False, na=False)]
-            if not partial_matches.empty:
-                result_df.at[idx, 'Product ID'] = partial_matches.iloc[0]['product_id']
-                product_found += 1
+    # Customer ID: match exacto, luego sin distinción de mayúsculas
+    subscription_names = df['Name'].astype(str).str.strip()
+    customer_exact, customer_casefold = index['customer_exact'], index['customer_casefold']
+    customer_ids = pd.Series(
+        [customer_exact.get(name, customer_casefold.get(name.lower())) for name in subscription_names],
+        index=df.index, dtype=object)
+    
+    # Product ID: match exacto, luego parcial por nombre único (no por fila)
+    product_names = df['Product Name'].astype(str).str.strip()
+    product_exact = index['product_exact']
+    unresolved = [name for name in product_names.unique() if name not in product_exact]
+    partial = {name: resolve_partial_product(index, name) for name in unresolved}
+    product_ids = pd.Series(
+        [product_exact[name] if name in product_exact else partial[name] for name in product_names],
+        index=df.index, dtype=object)
+    
+    result_df['Customer ID'] = customer_ids.where(customer_ids.notna(), None)
+    result_df['Product ID'] = product_ids.where(product_ids.notna(), None)
+    
+    customer_found = int(customer_ids.notna().sum())
+    product_found = int(product_ids.notna().sum())
     
     total_count = len(df)
     print(f"  ✅ Customer IDs encontrados: {customer_found}/{total_count} ({customer_found/total_count*100:.1f}%)")
     print(f"  ✅ Product IDs encontrados: {product_found}/{total_count} ({product_found/total_count*100:.1f}%)")
     
+    report_unmatched(subscription_names[customer_ids.isna()], index['customer_names'], 'Customers')
+    report_unmatched(product_names[product_ids.isna()], index['product_labels'], 'Productos')
+    
     return result_df
 
 def convert_ct_to_et(ct_datetime_str):
@@ -172,12 +291,13 @@ def load_existing_data(database_path):
     existing_data = {}
     
     try:
-        db = pd.ExcelFile(database_path)
         subscription_sheets = ['subscription.active', 'subscription.paused', 'subscription.cancelled']
+        available = sheet_names(database_path)
+        sheets = read_sheets(database_path, [name for name in subscription_sheets if name in available])
         
         for sheet_name in subscription_sheets:
-            if sheet_name in db.sheet_names:
-                df = pd.read_excel(database_path, sheet_name=sheet_name)
+            if sheet_name in sheets:
+                df = sheets[sheet_name]
                 existing_data[sheet_name] = df
                 print(f"  ✅ {sheet_name}: {len(df)} registros existentes")
             else:
@@ -191,6 +311,19 @@ def load_existing_data(database_path):
     
     return existing_data
 
+def load_existing_data_from_store(store):
+    """Load existing subscription rows from the SQLite store (same layout as the sheets)"""
+    
+    print("\n📂 Cargando Datos Existentes (store):")
+    print("=" * 40)
+    
+    existing_data = {}
+    for sheet_name in ['subscription.active', 'subscription.paused', 'subscription.cancelled']:
+        existing_data[sheet_name] = store.read_sheet(sheet_name)
+        print(f"  ✅ {sheet_name}: {len(existing_data[sheet_name])} registros existentes")
+    
+    return existing_data
+
 def format_for_database(df, existing_data):
     """Format data with original structure and preserve existing data"""
     
@@ -215,6 +348,14 @@ def format_for_database(df, existing_data):
     
     print(f"  📊 Nuevas entradas formateadas: {len(new_entries)}")
     
+    # Detectar suscripciones nuevas y cambios de status contra el estado guardado
+    events = diff_snapshot(new_entries, stored_state_from_sheets(existing_data))
+    existing_data, log_rows = apply_events_to_sheets(existing_data, events)
+    
+    print(f"  🔀 Eventos de ciclo de vida: {len(events)}")
+    for transition, count in summarize_events(events).items():
+        print(f"    • {transition}: {count}")
+    
     # Merge inteligente por status
     merged_data = {}
     
@@ -246,7 +387,7 @@ def format_for_database(df, existing_data):
             print(f"    • Nuevas: {new_count}")  
             print(f"    • Final: {final_count}")
     
-    return merged_data
+    return merged_data, log_rows
 
 def merge_preserve_existing(existing_df, new_df):
     """Merge preserving existing data - don't overwrite manual changes"""
@@ -257,93 +398,101 @@ def merge_preserve_existing(existing_df, new_df):
     if len(new_df) == 0:
         return existing_df
     
-    # Crear copia de datos existentes
-    merged_df = existing_df.copy()
+    # CustomerID/ProductID/Cycle solo se llenan si están vacíos (cambios manuales),
+    # Status se actualiza (puede haber cambiado); nuevas entradas se agregan al final
+    merged_df, report = keyed_upsert(existing_df, new_df, 'SubscriptionID', SUBSCRIPTION_MERGE_POLICIES)
     
-    # Para cada nueva entrada
-    for idx, new_row in new_df.iterrows():
-        subscription_id = new_row['SubscriptionID']
-        
-        # Buscar si ya existe
-        existing_mask = existing_df['SubscriptionID'] == subscription_id
-        
-        if existing_mask.any():
-            # Ya existe - preservar datos existentes, pero actualizar algunos campos si están vacíos
-            existing_idx = existing_df[existing_mask].index[0]
-            existing_row = existing_df.loc[existing_idx]
-            
-            # Solo actualizar campos que están vacíos en datos existentes
-            updates_made = []
+    changes = report['changes']
+    for subscription_id, fields in changes.groupby('SubscriptionID', sort=False)['column']:
+        print(f"    • Actualizado {str(subscription_id)[:12]}...: {', '.join(fields)}")
+    
+    return merged_df
+
+def update_database(merged_data, database_path, log_rows=None):
+    """Update database with merged data and append lifecycle events to subscription.full_log"""
+    
+    print(f"\n📝 Actualizando Base de Datos:")
+    print("=" * 35)
+    
+    full_log = None
+    if log_rows is not None and len(log_rows) > 0:
+        try:
+            full_log = read_sheet(database_path, FULL_LOG_SHEET)
+            full_log = pd.concat([full_log, log_rows], ignore_index=True)
+        except ValueError:
+            full_log = log_rows
+    
+    # Solo se reescriben las hojas modificadas; las demás se copian sin cambios
+    sheets = {}
+    total_subscriptions = 0
+    
+    for sheet_name, df in merged_data.items():
+        if len(df) > 0:
+            # Asegurar que las columnas estén en el orden correcto
+            column_order = ['SubscriptionID', 'CustomerID', 'ProductID', 'Cycle', 'Status', 'Datetime Created', 'Last Updated']
             
-            # CustomerID - preservar si ya tiene valor (cambios manuales)
-            if pd.isna(existing_row['CustomerID']) and not pd.isna(new_row['CustomerID']):
-                merged_df.at[existing_idx, 'CustomerID'] = new_row['CustomerID']
-                updates_made.append('CustomerID')
+            # Reordenar columnas si existen
+            existing_cols = [col for col in column_order if col in df.columns]
+            df_ordered = df[existing_cols]
             
-            # ProductID - actualizar si está vacío
-            if pd.isna(existing_row['ProductID']) and not pd.isna(new_row['ProductID']):
-                merged_df.at[existing_idx, 'ProductID'] = new_row['ProductID']
-                updates_made.append('ProductID')
+            sheets[sheet_name] = df_ordered
             
-            # Cycle - actualizar si está vacío
-            if pd.isna(existing_row['Cycle']) and not pd.isna(new_row['Cycle']):
-                merged_df.at[existing_idx, 'Cycle'] = new_row['Cycle']
-                updates_made.append('Cycle')
+            # Estadísticas
+            status = sheet_name.replace('subscription.', '').upper()
+            total_subscriptions += len(df_ordered)
             
-            # Status - actualizar (puede haber cambiado)
-            if existing_row['Status'] != new_row['Status']:
-                merged_df.at[existing_idx, 'Status'] = new_row['Status']
-                updates_made.append('Status')
+            # Contar datos preservados
+            manual_customers = df_ordered['CustomerID'].notna().sum()
+            missing_customers = df_ordered['CustomerID'].isna().sum()
+            preserved_updates = df_ordered['Last Updated'].notna().sum()
             
-            if updates_made:
-                print(f"    • Actualizado {subscription_id[:12]}...: {', '.join(updates_made)}")
+            print(f"  ✅ {status}: {len(df_ordered)} suscripciones")
+            print(f"    • CustomerID preservados: {manual_customers}")
+            print(f"    • Last Updated preservados: {preserved_updates}")
+            if missing_customers > 0:
+                print(f"    • CustomerID en blanco: {missing_customers}")
         else:
-            # Nueva entrada - agregar al final
-            merged_df = pd.concat([merged_df, new_row.to_frame().T], ignore_index=True)
+            # Crear hoja vacía con headers
+            sheets[sheet_name] = pd.DataFrame(columns=['SubscriptionID', 'CustomerID', 'ProductID', 'Cycle', 'Status', 'Datetime Created', 'Last Updated'])
+            print(f"  ⚪ {sheet_name}: vacío")
     
-    return merged_df
+    if full_log is not None:
+        sheets[FULL_LOG_SHEET] = full_log
+        print(f"  📜 {FULL_LOG_SHEET}: +{len(log_rows)} eventos ({len(full_log)} total)")
+    
+    patch_sheets(database_path, sheets)
+    
+    print(f"\n📊 Resumen Final:")
+    print(f"  Total suscripciones procesadas: {total_subscriptions}")
+    
+    return total_subscriptions
 
-def update_database(merged_data, database_path):
-    """Update database with merged data"""
+def update_store(merged_data, store, log_rows=None):
+    """Write merged subscriptions and lifecycle events to the store in one transaction"""
     
-    print(f"\n📝 Actualizando Base de Datos:")
+    print(f"\n📝 Actualizando Store SQLite:")
     print("=" * 35)
     
-    # Usar modo 'a' para preservar otras hojas
-    with pd.ExcelWriter(database_path, mode='a', if_sheet_exists='replace', engine='openpyxl') as writer:
-        
-        total_subscriptions = 0
-        
+    total_subscriptions = 0
+    with store.transaction() as conn:
         for sheet_name, df in merged_data.items():
+            table, column_mapping = SHEET_MAPPINGS[sheet_name]
+            
+            # Las suscripciones que ya no están en esta hoja (movidas de status) se eliminan de su tabla
+            keep_ids = set(df['SubscriptionID'].astype(str)) if len(df) > 0 else set()
+            stored_ids = set(store.query(f'SELECT subscription_id FROM {table}')['subscription_id'])
+            removed = store.delete(table, 'subscription_id', stored_ids - keep_ids, conn=conn)
+            
+            written = 0
             if len(df) > 0:
-                # Asegurar que las columnas estén en el orden correcto
-                column_order = ['SubscriptionID', 'CustomerID', 'ProductID', 'Cycle', 'Status', 'Datetime Created', 'Last Updated']
-                
-                # Reordenar columnas si existen
-                existing_cols = [col for col in column_order if col in df.columns]
-                df_ordered = df[existing_cols]
-                
-                df_ordered.to_excel(writer, sheet_name=sheet_name, index=False)
-                
-                # Estadísticas
-                status = sheet_name.replace('subscription.', '').upper()
-                total_subscriptions += len(df_ordered)
-                
-                # Contar datos preservados
-                manual_customers = df_ordered['CustomerID'].notna().sum()
-                missing_customers = df_ordered['CustomerID'].isna().sum()
-                preserved_updates = df_ordered['Last Updated'].notna().sum()
-                
-                print(f"  ✅ {status}: {len(df_ordered)} suscripciones")
-                print(f"    • CustomerID preservados: {manual_customers}")
-                print(f"    • Last Updated preservados: {preserved_updates}")
-                if missing_customers > 0:
-                    print(f"    • CustomerID en blanco: {missing_customers}")
-            else:
-                # Crear hoja vacía con headers
-                empty_df = pd.DataFrame(columns=['SubscriptionID', 'CustomerID', 'ProductID', 'Cycle', 'Status', 'Datetime Created', 'Last Updated'])
-                empty_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                print(f"  ⚪ {sheet_name}: vacío")
+                written = store.upsert(table, df.rename(columns=column_mapping), conn=conn)['written']
+            total_subscriptions += written
+            print(f"  ✅ {table}: {written} suscripciones ({removed} eliminadas/movidas)")
+        
+        if log_rows is not None and len(log_rows) > 0:
+            table, column_mapping = SHEET_MAPPINGS[FULL_LOG_SHEET]
+            audit = store.upsert(table, log_rows.rename(columns=column_mapping), conn=conn)
+            print(f"  📜 {table}: +{audit['written']} eventos")
     
     print(f"\n📊 Resumen Final:")
     print(f"  Total suscripciones procesadas: {total_subscriptions}")
@@ -353,6 +502,11 @@ def update_database(merged_data, database_path):
 def main():
     """Main execution function"""
     
+    parser = argparse.ArgumentParser(description='Update subscriptions in Database_CarePortals.xlsx')
+    parser.add_argument('--store', help='SQLite store (careportals_store.py) to update instead of the workbook')
+    args = parser.parse_args()
+    store_path = os.path.abspath(args.store) if args.store else None
+    
     print("🚀 ACTUALIZACIÓN FINAL - Base de Datos Suscripciones")
     print("=" * 60)
     
@@ -375,11 +529,22 @@ def main():
     # Step 2: Lookup IDs
     subs_with_ids = lookup_ids(clean_subs, customer_dict, product_dict)
     
+    if store_path:
+        # Steps 3-6 against the store: only rows are read and written, no workbook copy
+        with CarePortalsStore(store_path) as store:
+            existing_data = load_existing_data_from_store(store)
+            merged_data, log_rows = format_for_database(subs_with_ids, existing_data)
+            total_processed = update_store(merged_data, store, log_rows)
+        print(f"\n🎉 ¡ACTUALIZACIÓN COMPLETADA! ({store_path})")
+        print(f"   ✅ {total_processed} suscripciones procesadas")
+        print(f"   💡 Exportar a Excel: careportals_store.py export")
+        return
+    
     # Step 3: Load existing data (preserve manual changes)
     existing_data = load_existing_data('LATEST_Database_CarePortals.xlsx')
     
     # Step 4: Format and merge intelligently
-    merged_data = format_for_database(subs_with_ids, existing_data)
+    merged_data, log_rows = format_for_database(subs_with_ids, existing_data)
     
     # Step 5: Copy LATEST as base (to preserve other sheets)
     print(f"\n🔄 Preparando base de datos...")
@@ -388,7 +553,7 @@ def main():
     print("  ✅ Copiado LATEST_Database_CarePortals.xlsx como base")
     
     # Step 6: Update database
-    total_processed = update_database(merged_data, 'Database_CarePortals.xlsx')
+    total_processed = update_database(merged_data, 'Database_CarePortals.xlsx', log_rows)
     
     print(f"\n🎉 ¡ACTUALIZACIÓN COMPLETADA!")
     print(f"   ✅ Estructura original preservada")
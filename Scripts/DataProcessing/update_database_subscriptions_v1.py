@@ -8,6 +8,8 @@ import numpy as np
 import os
 from datetime import datetime
 
+from workbook_patcher import patch_sheets
+
 def clean_test_entries(df):
     """Remove test entries from the subscriptions dataframe"""
     
@@ -159,27 +161,28 @@ def update_database(formatted_df, database_path):
     print(f"\n📝 Updating Database:")
     print("=" * 25)
     
-    # Load existing database
-    with pd.ExcelWriter(database_path, mode='a', if_sheet_exists='replace', engine='openpyxl') as writer:
-        
-        # Group by status and write to appropriate sheets
-        status_counts = {}
+    # Only the subscription sheets are rewritten; other sheets are copied unchanged
+    sheets = {}
+    
+    # Group by status and write to appropriate sheets
+    status_counts = {}
+    
+    for status in ['active', 'paused', 'cancelled']:
+        status_data = formatted_df[formatted_df['status'] == status]
+        status_counts[status] = len(status_data)
         
-        for status in ['active', 'paused', 'cancelled']:
-            status_data = formatted_df[formatted_df['status'] == status]
-            status_counts[status] = len(status_data)
-            
-            if len(status_data) > 0:
-                # Write to corresponding sheet
-                sheet_name = f'subscription.{status}'
-                status_data.to_excel(writer, sheet_name=sheet_name, index=False)
-                print(f"  ✅ Updated {sheet_name}: {len(status_data)} entries")
-            else:
-                # Create empty sheet with headers
-                sheet_name = f'subscription.{status}'
-                empty_df = pd.DataFrame(columns=formatted_df.columns)
-                empty_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                print(f"  ⚪ {sheet_name}: 0 entries (empty)")
+        if len(status_data) > 0:
+            # Write to corresponding sheet
+            sheet_name = f'subscription.{status}'
+            sheets[sheet_name] = status_data
+            print(f"  ✅ Updated {sheet_name}: {len(status_data)} entries")
+        else:
+            # Create empty sheet with headers
+            sheet_name = f'subscription.{status}'
+            sheets[sheet_name] = pd.DataFrame(columns=formatted_df.columns)
+            print(f"  ⚪ {sheet_name}: 0 entries (empty)")
+    
+    patch_sheets(database_path, sheets)
     
     print(f"\n📊 Final Status Breakdown:")
     for status, count in status_counts.items():
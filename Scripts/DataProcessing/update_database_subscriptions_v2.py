@@ -12,6 +12,8 @@ import os
 from datetime import datetime
 import pytz
 
+from workbook_patcher import patch_sheets
+
 def clean_test_entries(df):
     """Remove test entries from the subscriptions dataframe"""
     
@@ -236,36 +238,37 @@ def update_database(formatted_df, database_path):
     print(f"\n📝 Updating Database:")
     print("=" * 25)
     
-    # Load existing database
-    with pd.ExcelWriter(database_path, mode='a', if_sheet_exists='replace', engine='openpyxl') as writer:
-        
-        # Group by status and write to appropriate sheets
-        status_counts = {}
+    # Only the subscription sheets are rewritten; other sheets are copied unchanged
+    sheets = {}
+    
+    # Group by status and write to appropriate sheets
+    status_counts = {}
+    
+    for status in ['active', 'paused', 'cancelled']:
+        status_data = formatted_df[formatted_df['status'] == status]
+        status_counts[status] = len(status_data)
         
-        for status in ['active', 'paused', 'cancelled']:
-            status_data = formatted_df[formatted_df['status'] == status]
-            status_counts[status] = len(status_data)
+        if len(status_data) > 0:
+            # Write to corresponding sheet
+            sheet_name = f'subscription.{status}'
+            sheets[sheet_name] = status_data
+            
+            # Count entries with missing IDs in this status
+            missing_cust = status_data['customer_id'].isna().sum()
+            missing_prod = status_data['product_id'].isna().sum()
             
-            if len(status_data) > 0:
-                # Write to corresponding sheet
-                sheet_name = f'subscription.{status}'
-                status_data.to_excel(writer, sheet_name=sheet_name, index=False)
-                
-                # Count entries with missing IDs in this status
-                missing_cust = status_data['customer_id'].isna().sum()
-                missing_prod = status_data['product_id'].isna().sum()
-                
-                print(f"  ✅ Updated {sheet_name}: {len(status_data)} entries")
-                if missing_cust > 0:
-                    print(f"    ⚪ ({missing_cust} without customer_id)")
-                if missing_prod > 0:
-                    print(f"    ⚪ ({missing_prod} without product_id)")
-            else:
-                # Create empty sheet with headers
-                sheet_name = f'subscription.{status}'
-                empty_df = pd.DataFrame(columns=formatted_df.columns)
-                empty_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                print(f"  ⚪ {sheet_name}: 0 entries (empty)")
+            print(f"  ✅ Updated {sheet_name}: {len(status_data)} entries")
+            if missing_cust > 0:
+                print(f"    ⚪ ({missing_cust} without customer_id)")
+            if missing_prod > 0:
+                print(f"    ⚪ ({missing_prod} without product_id)")
+        else:
+            # Create empty sheet with headers
+            sheet_name = f'subscription.{status}'
+            sheets[sheet_name] = pd.DataFrame(columns=formatted_df.columns)
+            print(f"  ⚪ {sheet_name}: 0 entries (empty)")
+    
+    patch_sheets(database_path, sheets)
     
     print(f"\n📊 Final Status Breakdown:")
     for status, count in status_counts.items():
@@ -4,76 +4,114 @@ Stripe Data Validation Script
 
 This script analyzes the stripe webhook data to identify missing fields,
 data quality issues, and provides recommendations for improvement.
+
+Each CSV is profiled in a single chunked pass (data_profiler.py); the
+analysis functions read the resulting profiles, which can also be saved as
+JSON with --report and diffed between runs.
 """
 
 import pandas as pd
+import argparse
 import json
-from datetime import datetime, timedelta
 import sys
 import os
 
-def analyze_stripe_webhook_data(charges_file, refunds_file):
+from data_profiler import profile_csv, save_report
+from refund_index import RefundIndex, REFUND_INDEX_PATH, CHARGE_ID_COLUMNS, REFUND_ID_COLUMNS
+
+CHARGE_NUMERIC_COLUMNS = ['amount', 'amount_refunded', 'application_fee_amount']
+REFUND_NUMERIC_COLUMNS = ['amount']
+DATE_COLUMNS = ['datetime']
+
+def load_profile(file_path, numeric_columns, label):
+    """
+    Profile a CSV, or return None if it cannot be read.
+    """
+    try:
+        profile = profile_csv(file_path, numeric_columns=numeric_columns, date_columns=DATE_COLUMNS)
+        print(f"✅ Loaded {profile['rows']} {label} records")
+        return profile
+    except Exception as e:
+        print(f"❌ Error loading {label}s: {e}")
+        return None
+
+def analyze_stripe_webhook_data(charges_file, refunds_file, report_file=None, index_path=None):
     """
     Analyze stripe webhook data for completeness and quality issues.
     """
     print("🔍 Analyzing Stripe Webhook Data Quality")
     print("=" * 50)
 
-    # Load data
-    try:
-        charges_df = pd.read_csv(charges_file)
-        print(f"✅ Loaded {len(charges_df)} charge records")
-    except Exception as e:
-        print(f"❌ Error loading charges: {e}")
-        charges_df = pd.DataFrame()
-
-    try:
-        refunds_df = pd.read_csv(refunds_file)
-        print(f"✅ Loaded {len(refunds_df)} refund records")
-    except Exception as e:
-        print(f"❌ Error loading refunds: {e}")
-        refunds_df = pd.DataFrame()
+    # Profile data
+    charges_profile = load_profile(charges_file, CHARGE_NUMERIC_COLUMNS, 'charge')
+    refunds_profile = load_profile(refunds_file, REFUND_NUMERIC_COLUMNS, 'refund')
 
     print()
 
     # Analyze charges data
-    if not charges_df.empty:
-        analyze_charges_data(charges_df)
+    if charges_profile and charges_profile['rows']:
+        analyze_charges_data(charges_profile)
     else:
         print("⚠️  No charges data to analyze")
 
     print()
 
     # Analyze refunds data
-    if not refunds_df.empty:
-        analyze_refunds_data(refunds_df)
+    if refunds_profile and refunds_profile['rows']:
+        analyze_refunds_data(refunds_profile)
     else:
         print("⚠️  No refunds data to analyze")
 
     print()
 
-    # Cross-reference analysis
-    if not charges_df.empty and not refunds_df.empty:
-        analyze_cross_references(charges_df, refunds_df)
+    # Cross-reference analysis (only the ID columns are loaded)
+    if charges_profile and charges_profile['rows'] and refunds_profile and refunds_profile['rows']:
+        if index_path:
+            # Only rows newer than the last run are read and indexed
+            with RefundIndex(index_path) as index:
+                analyze_cross_references(index.read_new_rows(charges_file, 'charges', CHARGE_ID_COLUMNS),
+                                         index.read_new_rows(refunds_file, 'refunds', REFUND_ID_COLUMNS),
+                                         index)
+        else:
+            id_columns = lambda column: column in ('charge_id', 'payment_intent_id')
+            analyze_cross_references(pd.read_csv(charges_file, usecols=id_columns),
+                                     pd.read_csv(refunds_file, usecols=id_columns))
+
+    if report_file:
+        save_report({'charges': charges_profile, 'refunds': refunds_profile}, report_file)
+        print(f"\n📄 Profile report saved to {report_file}")
+
+    return {'charges': charges_profile, 'refunds': refunds_profile}
 
-def analyze_charges_data(df):
+def print_completeness(columns, fields, total_records):
     """
-    Analyze charges data for missing fields and quality issues.
+    Print completeness lines for optional fields.
+    """
+    for field in fields:
+        if field in columns:
+            missing_count = columns[field]['missing']
+            missing_pct = columns[field]['missing_pct']
+            print(f"   {field}: {total_records - missing_count}/{total_records} ({100-missing_pct:.1f}% complete)")
+        else:
+            print(f"   {field}: Column not found")
+
+def analyze_charges_data(profile):
+    """
+    Analyze a charges profile for missing fields and quality issues.
     """
     print("💳 CHARGES DATA ANALYSIS")
     print("-" * 30)
 
-    total_records = len(df)
+    columns = profile['columns']
+    total_records = profile['rows']
 
     # Check for missing critical fields
     critical_fields = ['charge_id', 'payment_intent_id', 'amount', 'status', 'datetime']
-    missing_analysis = {}
 
     for field in critical_fields:
-        if field in df.columns:
-            missing_count = df[field].isna().sum() + (df[field] == '').sum()
-            missing_pct = (missing_count / total_records) * 100
-            missing_analysis[field] = {'count': missing_count, 'percentage': missing_pct}
+        if field in columns:
+            missing_count = columns[field]['missing']
+            missing_pct = columns[field]['missing_pct']
 
             if missing_count > 0:
                 print(f"⚠️  {field}: {missing_count} missing ({missing_pct:.1f}%)")
@@ -87,50 +125,43 @@ def analyze_charges_data(df):
     # Check optional but useful fields
     optional_fields = ['order_number', 'customer_id', 'card_last4', 'card_brand', 'description']
     print("📋 Optional Field Completeness:")
-
-    for field in optional_fields:
-        if field in df.columns:
-            missing_count = df[field].isna().sum() + (df[field] == '').sum()
-            missing_pct = (missing_count / total_records) * 100
-            print(f"   {field}: {total_records - missing_count}/{total_records} ({100-missing_pct:.1f}% complete)")
-        else:
-            print(f"   {field}: Column not found")
+    print_completeness(columns, optional_fields, total_records)
 
     print()
 
     # Analyze data patterns
-    if 'amount' in df.columns:
-        amounts = pd.to_numeric(df['amount'], errors='coerce')
+    amounts = columns.get('amount')
+    if amounts and amounts.get('valid'):
         print(f"💰 Amount Analysis:")
-        print(f"   Range: ${amounts.min():.2f} - ${amounts.max():.2f}")
-        print(f"   Average: ${amounts.mean():.2f}")
-        print(f"   Zero amounts: {(amounts == 0).sum()}")
+        print(f"   Range: ${amounts['min']:.2f} - ${amounts['max']:.2f}")
+        print(f"   Average: ${amounts['mean']:.2f}")
+        print(f"   Zero amounts: {amounts['zeros']}")
 
-    if 'status' in df.columns:
-        status_counts = df['status'].value_counts()
+    if 'status' in columns:
         print(f"📊 Status Distribution:")
-        for status, count in status_counts.items():
+        for status, count in columns['status']['top_values']:
             print(f"   {status}: {count}")
 
-    if 'datetime' in df.columns:
-        analyze_datetime_field(df, 'datetime', 'charges')
+    if 'datetime' in columns:
+        analyze_datetime_field(columns['datetime'], total_records, 'charges')
 
-def analyze_refunds_data(df):
+def analyze_refunds_data(profile):
     """
-    Analyze refunds data for missing fields and quality issues.
+    Analyze a refunds profile for missing fields and quality issues.
     """
     print("💸 REFUNDS DATA ANALYSIS")
     print("-" * 30)
 
-    total_records = len(df)
+    columns = profile['columns']
+    total_records = profile['rows']
 
     # Check for missing critical fields
     critical_fields = ['refund_id', 'charge_id', 'amount', 'status', 'datetime']
 
     for field in critical_fields:
-        if field in df.columns:
-            missing_count = df[field].isna().sum() + (df[field] == '').sum()
-            missing_pct = (missing_count / total_records) * 100
+        if field in columns:
+            missing_count = columns[field]['missing']
+            missing_pct = columns[field]['missing_pct']
 
             if missing_count > 0:
                 print(f"⚠️  {field}: {missing_count} missing ({missing_pct:.1f}%)")
@@ -144,69 +175,58 @@ def analyze_refunds_data(df):
     # Check optional fields
     optional_fields = ['reason', 'payment_intent_id']
     print("📋 Optional Field Completeness:")
-
-    for field in optional_fields:
-        if field in df.columns:
-            missing_count = df[field].isna().sum() + (df[field] == '').sum()
-            missing_pct = (missing_count / total_records) * 100
-            print(f"   {field}: {total_records - missing_count}/{total_records} ({100-missing_pct:.1f}% complete)")
+    print_completeness(columns, [field for field in optional_fields if field in columns], total_records)
 
     print()
 
     # Analyze refund patterns
-    if 'amount' in df.columns:
-        amounts = pd.to_numeric(df['amount'], errors='coerce')
+    amounts = columns.get('amount')
+    if amounts and amounts.get('valid'):
         print(f"💰 Refund Amount Analysis:")
-        print(f"   Range: ${amounts.min():.2f} - ${amounts.max():.2f}")
-        print(f"   Average: ${amounts.mean():.2f}")
-        print(f"   Total refunded: ${amounts.sum():.2f}")
+        print(f"   Range: ${amounts['min']:.2f} - ${amounts['max']:.2f}")
+        print(f"   Average: ${amounts['mean']:.2f}")
+        print(f"   Total refunded: ${amounts['sum']:.2f}")
 
-    if 'reason' in df.columns:
-        reason_counts = df['reason'].value_counts()
+    if 'reason' in columns:
         print(f"📊 Refund Reasons:")
-        for reason, count in reason_counts.items():
-            if pd.notna(reason) and reason != '':
-                print(f"   {reason}: {count}")
+        for reason, count in columns['reason']['top_values']:
+            print(f"   {reason}: {count}")
 
-    if 'datetime' in df.columns:
-        analyze_datetime_field(df, 'datetime', 'refunds')
+    if 'datetime' in columns:
+        analyze_datetime_field(columns['datetime'], total_records, 'refunds')
 
-def analyze_datetime_field(df, field, data_type):
+def analyze_datetime_field(column, total_records, data_type):
     """
-    Analyze datetime field for patterns and issues.
+    Print the datetime statistics of a profiled column.
     """
     print(f"📅 {data_type.title()} Datetime Analysis:")
 
-    try:
-        # Try to parse datetimes
-        dt_series = pd.to_datetime(df[field], errors='coerce')
-        valid_dates = dt_series.dropna()
-
-        if len(valid_dates) > 0:
-            print(f"   Valid dates: {len(valid_dates)}/{len(df)}")
-            print(f"   Date range: {valid_dates.min()} to {valid_dates.max()}")
-
-            # Check for recent activity
-            now = datetime.now()
-            recent = valid_dates[valid_dates > (now - timedelta(days=7))]
-            print(f"   Recent (last 7 days): {len(recent)}")
-
-            # Check for timezone issues
-            sample_dates = valid_dates.head(3)
-            print(f"   Sample dates: {list(sample_dates.dt.strftime('%Y-%m-%d %H:%M:%S'))}")
-        else:
-            print(f"   ❌ No valid dates found")
+    if column.get('valid'):
+        print(f"   Valid dates: {column['valid']}/{total_records}")
+        print(f"   Date range: {column['min']} to {column['max']}")
 
-    except Exception as e:
-        print(f"   ❌ Error parsing dates: {e}")
+        # Check for recent activity
+        print(f"   Recent (last 7 days): {column['recent_7d']}")
 
-def analyze_cross_references(charges_df, refunds_df):
+        # Check for timezone issues
+        print(f"   Sample dates: {column['samples']}")
+    else:
+        print(f"   ❌ No valid dates found")
+
+def analyze_cross_references(charges_df, refunds_df, index=None):
     """
     Analyze relationships between charges and refunds.
+
+    With a RefundIndex, charges_df/refunds_df are the new rows only and the
+    counts come from the persistent index.
     """
     print("🔗 CROSS-REFERENCE ANALYSIS")
     print("-" * 30)
 
+    if index is not None:
+        analyze_indexed_cross_references(charges_df, refunds_df, index)
+        return
+
     # Check charge_id relationships
     if 'charge_id' in charges_df.columns and 'charge_id' in refunds_df.columns:
         charge_ids_in_charges = set(charges_df['charge_id'].dropna())
@@ -238,6 +258,25 @@ def analyze_cross_references(charges_df, refunds_df):
         print(f"   Payment intents in refunds: {len(pi_ids_in_refunds)}")
         print(f"   Matched payment intents: {len(matched_pis)}")
 
+def analyze_indexed_cross_references(charges_df, refunds_df, index):
+    """
+    Add new rows to the refund index and report orphans from it.
+    """
+    result = index.update(charges_df, refunds_df)
+    stats = index.stats()
+
+    print(f"💳 Charge ID Matching (index: {index.path}):")
+    print(f"   New rows this run: {len(charges_df)} charges, {len(refunds_df)} refunds")
+    print(f"   Total unique charges: {stats['charges']}")
+    print(f"   Total refunds: {stats['refunds']}")
+    print(f"   Refunds with matching charges: {stats['matched_by_charge_id']}")
+    print(f"   Refunds matched by payment intent: {stats['matched_by_payment_intent']}")
+    print(f"   Orphaned refunds: {result['orphans']} "
+          f"({result['new_orphans']} new, {result['resolved']} resolved this run)")
+
+    if result['orphans']:
+        print(f"   ⚠️  Sample orphaned refund charge_ids: {index.orphans(5)['charge_id'].tolist()}")
+
 def check_webhook_completeness():
     """
     Check if webhook data appears complete based on expected patterns.
@@ -284,7 +323,7 @@ def generate_recommendations(charges_file, refunds_file):
     print("   - Set up alerts for webhook failures")
     print("   - Monitor data completeness daily")
     print("   - Check Stripe webhook event logs regularly")
-    print("   - Validate order_number matching with CarePortals")
+    print("   - Reconcile payments with CarePortals orders: python3 Scripts/DataProcessing/reconcile_stripe_orders.py")
     print()
 
     print("4. 🛠️ IMMEDIATE ACTIONS:")
@@ -297,6 +336,12 @@ def main():
     """
     Main function to run the analysis.
     """
+    parser = argparse.ArgumentParser(description='Validate Stripe charges/refunds CSV data')
+    parser.add_argument('--report', help='Save the JSON profile report (charges and refunds) to this path')
+    parser.add_argument('--refund-index', help=f'Refund index database (default: {REFUND_INDEX_PATH} next to the CSVs)')
+    parser.add_argument('--no-index', action='store_true', help='Rebuild charge/refund ID sets from the full CSVs')
+    args = parser.parse_args()
+
     print("🔧 Stripe Webhook Data Validation Tool")
     print("=====================================")
     print()
@@ -312,7 +357,9 @@ def main():
         refunds_file = "stripe_refunds.csv"
 
     if os.path.exists(charges_file) or os.path.exists(refunds_file):
-        analyze_stripe_webhook_data(charges_file, refunds_file)
+        index_path = None if args.no_index else \
+            args.refund_index or os.path.join(os.path.dirname(charges_file), REFUND_INDEX_PATH)
+        analyze_stripe_webhook_data(charges_file, refunds_file, args.report, index_path)
     else:
         print("⚠️  CSV files not found. Generating general recommendations...")
 
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Content-addressed sheet cache for Excel workbooks
+
+read_sheet()/read_sheets() return the same DataFrames as pd.read_excel, but
+each parsed sheet is stored in a columnar cache file keyed by the SHA-256
+of the workbook content and the sheet name:
+
+    GoogleSheets/.sheet_cache/<workbook>-<path hash>/<content hash>/<sheet>.parquet
+
+Repeat loads of an unchanged workbook skip openpyxl entirely. A changed
+workbook has a new hash, so its sheets are parsed once (all missing sheets
+in one workbook pass) and the previous hash directory of that workbook is
+removed. Workbooks are told apart by their resolved path, so two files with
+the same name (e.g. a CWD Database_CarePortals.xlsx and the GoogleSheets one)
+never evict each other.
+
+Parquet is used when pyarrow/fastparquet is installed; otherwise, or for
+frames Parquet cannot represent (mixed-type object columns), sheets are
+cached as pickles, which round-trip pandas dtypes exactly.
+
+read_sheet(..., columns=[...]) caches a column projection: if the full sheet
+is not cached, only those columns are parsed, streamed by sheet_stream.py.
+
+Usage:
+    from workbook_cache import read_sheet, read_sheets
+    orders = read_sheet('GoogleSheets/Database_CarePortals.xlsx', 'order.created')
+    sheets = read_sheets('GoogleSheets/Database_CarePortals.xlsx', ['customers', 'products'])
+    created = read_sheet('GoogleSheets/Database_CarePortals.xlsx', 'order.created', columns=['order_id', 'created_at'])
+
+    python workbook_cache.py GoogleSheets/Database_CarePortals.xlsx   # warm the cache
+    python workbook_cache.py --clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from sheet_stream import apply_dtypes, read_columns, schema_dtypes
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+CACHE_DIR = REPO_ROOT / 'GoogleSheets' / '.sheet_cache'
+HASH_CHUNK = 1 << 20
+STEM_CHARS = 64  # Readable part of a cache file name; the rest is a hash
+
+try:
+    pd.io.parquet.get_engine('auto')
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+_hash_memo = {}  # (path, size, mtime_ns) -> content hash, per process
+
+
+def workbook_hash(workbook_path):
+    """SHA-256 of the workbook file content"""
+    path = Path(workbook_path).resolve()
+    stat = path.stat()
+    memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _hash_memo:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_CHUNK), b''):
+                digest.update(block)
+        _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+
+def _sheet_stem(name, key=None):
+    """Filesystem-safe, length-capped file stem for a name (unique per key, default: the name)"""
+    safe = re.sub(r'[^A-Za-z0-9._-]+', '_', name)[:STEM_CHARS]
+    key = name if key is None else key
+    return f"{safe}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+
+class WorkbookCache:
+    """Sheet cache for one workbook version"""
+
+    def __init__(self, workbook_path, cache_dir=CACHE_DIR):
+        self.workbook_path = Path(workbook_path)
+        self.content_hash = workbook_hash(workbook_path)
+        resolved = str(self.workbook_path.resolve())
+        self.workbook_dir = Path(cache_dir) / _sheet_stem(self.workbook_path.stem, resolved)
+        self.directory = self.workbook_dir / self.content_hash[:16]
+
+    # ------------------------------------------------------------------
+    # Manifest (sheet names)
+    # ------------------------------------------------------------------
+
+    def sheet_names(self):
+        """Sheet names of the workbook (cached in the manifest)"""
+        manifest = self.directory / 'manifest.json'
+        if manifest.exists():
+            with open(manifest) as f:
+                return json.load(f)['sheets']
+        with pd.ExcelFile(self.workbook_path, engine='openpyxl') as workbook:
+            names = list(workbook.sheet_names)
+        self._prepare()
+        with open(manifest, 'w') as f:
+            json.dump({'workbook': str(self.workbook_path.resolve()), 'sha256': self.content_hash,
+                       'sheets': names}, f, indent=2)
+        return names
+
+    def _prepare(self):
+        """Create this version's directory and drop older versions of the workbook"""
+        if self.directory.exists():
+            return
+        if self.workbook_dir.exists():
+            for old in self.workbook_dir.iterdir():
+                shutil.rmtree(old, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Sheets
+    # ------------------------------------------------------------------
+
+    def _paths(self, sheet_name):
+        stem = _sheet_stem(sheet_name)
+        return self.directory / f"{stem}.parquet", self.directory / f"{stem}.pkl"
+
+    def get(self, sheet_name):
+        """Cached sheet, or None on a miss (or an unreadable cache file)"""
+        parquet_path, pickle_path = self._paths(sheet_name)
+        try:
+            if PARQUET_AVAILABLE and parquet_path.exists():
+                return pd.read_parquet(parquet_path)
+            if pickle_path.exists():
+                return pd.read_pickle(pickle_path)
+        except Exception:
+            return None  # Written by an incompatible pandas/pyarrow version: re-parse
+        return None
+
+    def put(self, sheet_name, df):
+        """Store a parsed sheet (Parquet if possible, else pickle)"""
+        self._prepare()
+        parquet_path, pickle_path = self._paths(sheet_name)
+        if PARQUET_AVAILABLE:
+            temp_path = f"{parquet_path}.partial"
+            try:
+                df.to_parquet(temp_path)
+                os.replace(temp_path, parquet_path)
+                return
+            except Exception:  # e.g. mixed-type object columns
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        temp_path = f"{pickle_path}.partial"
+        df.to_pickle(temp_path)
+        os.replace(temp_path, pickle_path)
+
+    def read(self, sheet_names):
+        """
+        Sheets by name; all cache misses are parsed in one read_excel call.
+
+        Returns:
+            dict: sheet name -> DataFrame
+        """
+        frames = {name: self.get(name) for name in sheet_names}
+        missing = [name for name, df in frames.items() if df is None]
+        if missing:
+            parsed = pd.read_excel(self.workbook_path, sheet_name=missing, engine='openpyxl')
+            for name in missing:
+                self.put(name, parsed[name])
+                frames[name] = parsed[name]
+        return frames
+
+    def read_columns(self, sheet_name, columns):
+        """
+        Some columns of a sheet: sliced from the cached full sheet if there is
+        one, else streamed (only these columns) and cached as a projection.
+        Both paths return the same dtypes.
+        """
+        columns = list(columns)
+        full = self.get(sheet_name)
+        if full is not None:
+            return apply_dtypes(full[columns], schema_dtypes(self.workbook_path, sheet_name))
+        key = f"{sheet_name}[{']['.join(str(column) for column in columns)}]"
+        df = self.get(key)
+        if df is None:
+            df = read_columns(self.workbook_path, sheet_name, columns)
+            self.put(key, df)
+        return df
+
+
+def read_sheets(workbook_path, sheet_names=None, cache_dir=CACHE_DIR):
+    """
+    Read several sheets through the cache (like pd.read_excel(sheet_name=[...])).
+
+    Args:
+        workbook_path (str): Workbook path
+        sheet_names (list): Sheet names (None: every sheet)
+        cache_dir (str): Cache root
+
+    Returns:
+        dict: sheet name -> DataFrame
+    """
+    cache = WorkbookCache(workbook_path, cache_dir)
+    if sheet_names is None:
+        sheet_names = cache.sheet_names()
+    return cache.read(list(sheet_names))
+
+
+def read_sheet(workbook_path, sheet_name, cache_dir=CACHE_DIR, columns=None):
+    """
+    Read one sheet through the cache (like pd.read_excel(sheet_name=name)).
+
+    With `columns`, only those columns are returned (and parsed, on a miss).
+    """
+    if columns is not None:
+        return WorkbookCache(workbook_path, cache_dir).read_columns(sheet_name, columns)
+    return read_sheets(workbook_path, [sheet_name], cache_dir)[sheet_name]
+
+
+def sheet_names(workbook_path, cache_dir=CACHE_DIR):
+    """Sheet names of a workbook (cached per content hash)"""
+    return WorkbookCache(workbook_path, cache_dir).sheet_names()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm or clear the workbook sheet cache')
+    parser.add_argument('workbooks', nargs='*', help='Workbooks to cache (all sheets)')
+    parser.add_argument('--cache-dir', default=str(CACHE_DIR), help='Cache directory')
+    parser.add_argument('--clear', action='store_true', help='Delete the whole cache')
+    args = parser.parse_args()
+
+    if args.clear:
+        shutil.rmtree(args.cache_dir, ignore_errors=True)
+        print(f"✅ Cleared {args.cache_dir}")
+
+    for workbook_path in args.workbooks:
+        try:
+            frames = read_sheets(workbook_path, cache_dir=args.cache_dir)
+        except (OSError, ValueError) as e:
+            print(f"❌ {workbook_path}: {e}")
+            sys.exit(1)
+        print(f"✅ {workbook_path}: {len(frames)} sheets cached ({'Parquet' if PARQUET_AVAILABLE else 'pickle'})")
+        for name, df in frames.items():
+            print(f"   {name}: {len(df):,} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Sheet-level in-place updates of .xlsx workbooks
+
+patch_sheets() replaces the cell data of the given sheets and leaves the rest
+of the workbook alone. pd.ExcelWriter(mode='a', if_sheet_exists='replace')
+instead loads every sheet into openpyxl and re-serializes the whole workbook.
+Inside the xlsx zip:
+- only the <sheetData> of each patched worksheet part is regenerated (with
+  its dimension, autoFilter, table and _FilterDatabase ranges); sheet views,
+  column widths, validations, drawings and table parts are kept
+- every other part (untouched sheets, sharedStrings, drawings, ...) is copied
+  unchanged; styles.xml only gains a date cell format if it has none
+- strings are written inline, so sharedStrings.xml is never rewritten
+- the result is written to a temporary file and swapped in atomically
+
+Header cells keep the style of the previous header row; data cells keep their
+column's previous style unless it would change how the value reads back
+(date formats only for dates). Sheets that do not exist yet are added.
+
+Usage:
+    from workbook_patcher import patch_sheets
+    patch_sheets('GoogleSheets/Database_CarePortals.xlsx', {'customers': customers_df})
+
+    python workbook_patcher.py ../../GoogleSheets/Database_CarePortals.xlsx customers customers.csv
+"""
+
+import argparse
+import html
+import math
+import os
+import posixpath
+import re
+import sys
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils import get_column_letter
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+WORKSHEET_TYPE = REL_NS + '/worksheet'
+TABLE_TYPE = REL_NS + '/table'
+WORKSHEET_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+CALC_CHAIN_PART = 'xl/calcChain.xml'
+
+EXCEL_EPOCH = datetime(1899, 12, 30)
+DATETIME_FORMAT_ID = 22  # m/d/yy h:mm (built-in)
+DATE_FORMAT_ID = 14  # mm-dd-yy (built-in)
+
+_ATTRIBUTE = re.compile(r'([\w:]+)="([^"]*)"')
+_ILLEGAL_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class WorkbookPatchError(ValueError):
+    """Workbook or data cannot be patched"""
+
+
+def _attributes(tag):
+    return {key: html.unescape(value) for key, value in _ATTRIBUTE.findall(tag)}
+
+
+def _escape(text):
+    return html.escape(_ILLEGAL_XML.sub('', text), quote=True)
+
+
+def _resolve(base_part, target):
+    """Zip part name of a relationship target"""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_part), target))
+
+
+def _rels_part(part):
+    return posixpath.join(posixpath.dirname(part), '_rels', posixpath.basename(part) + '.rels')
+
+
+# ============================================================================
+# STYLES
+# ============================================================================
+
+class _Styles:
+    """cellXfs of styles.xml: which styles are date formats, plus added date styles"""
+
+    def __init__(self, xml):
+        self.xml = xml
+        self.changed = False
+        custom = {int(attrs['numFmtId']): attrs.get('formatCode', '')
+                  for attrs in map(_attributes, re.findall(r'<numFmt\b[^>]*>', xml))}
+        match = re.search(r'<cellXfs\b[^>]*>(.*?)</cellXfs>', xml, re.S)
+        self.xfs = re.findall(r'<xf\b[^>]*?(?:/>|>.*?</xf>)', match.group(1), re.S) if match else []
+        self.format_ids = [int(_attributes(re.match(r'<xf\b[^>]*>', xf).group(0)).get('numFmtId', 0))
+                           for xf in self.xfs]
+        self.date_styles = {
+            i for i, format_id in enumerate(self.format_ids)
+            if is_date_format(custom.get(format_id, BUILTIN_FORMATS.get(format_id, 'General')))
+        }
+
+    def date_style(self, format_id):
+        """Index of a plain cell style with a built-in date format (added if missing)"""
+        xf = f'<xf numFmtId="{format_id}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        if xf in self.xfs:  # Added by an earlier patch
+            return self.xfs.index(xf)
+        match = re.search(r'<cellXfs\b[^>]*>(.*?)</cellXfs>', self.xml, re.S)
+        if not match:
+            raise WorkbookPatchError("styles.xml has no cellXfs")
+        self.xfs.append(xf)
+        self.format_ids.append(format_id)
+        self.date_styles.add(len(self.xfs) - 1)
+        self.xml = (self.xml[:match.start()] + f'<cellXfs count="{len(self.xfs)}">' + match.group(1) + xf
+                    + '</cellXfs>' + self.xml[match.end():])
+        self.changed = True
+        return len(self.xfs) - 1
+
+
+# ============================================================================
+# SHEET XML
+# ============================================================================
+
+def _row_styles(sheet_data, row_number):
+    """column letter -> style index of the cells of one row"""
+    match = re.search(rf'<row\b[^>]*\br="{row_number}"[^>]*?(?:/>|>(.*?)</row>)', sheet_data, re.S)
+    if not match or not match.group(1):
+        return {}
+    styles = {}
+    for cell in re.findall(r'<c\b[^>]*>', match.group(1)):
+        attrs = _attributes(cell)
+        if 's' in attrs and 'r' in attrs:
+            styles[re.sub(r'\d', '', attrs['r'])] = int(attrs['s'])
+    return styles
+
+
+def _serial(value):
+    """Excel serial number of a naive datetime"""
+    return (value - EXCEL_EPOCH) / timedelta(days=1)
+
+
+def _number(value):
+    text = repr(float(value))
+    return text[:-2] if text.endswith('.0') else text
+
+
+def _cell(ref, value, style, styles):
+    """<c> element for one value ('' for missing values)"""
+    if isinstance(value, str):
+        if value == '':
+            return ''
+        space = ' xml:space="preserve"' if value != value.strip() else ''
+        s = f' s="{style}"' if style is not None and style not in styles.date_styles else ''
+        return f'<c r="{ref}"{s} t="inlineStr"><is><t{space}>{_escape(value)}</t></is></c>'
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return ''  # None, NaN, NaT and pd.NA (nullable Int64/string/boolean columns)
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value)
+
+    if isinstance(value, (bool, np.bool_)):
+        text, kind, date_format = ('1' if value else '0'), ' t="b"', None
+    elif isinstance(value, (int, np.integer)):
+        text, kind, date_format = str(int(value)), '', None
+    elif isinstance(value, (float, np.floating)):
+        if math.isnan(value) or math.isinf(value):
+            return ''
+        text, kind, date_format = _number(value), '', None
+    elif isinstance(value, datetime):
+        if value.tzinfo is not None:
+            raise WorkbookPatchError("Excel does not support datetimes with timezones; "
+                                     "make the column timezone-naive first")
+        text, kind, date_format = _number(_serial(pd.Timestamp(value).to_pydatetime())), '', DATETIME_FORMAT_ID
+    elif isinstance(value, date):
+        text, kind, date_format = str(int(_serial(datetime(value.year, value.month, value.day)))), '', DATE_FORMAT_ID
+    elif isinstance(value, (timedelta, np.timedelta64)):
+        text, kind, date_format = _number(pd.Timedelta(value) / pd.Timedelta(days=1)), '', None
+    else:
+        return _cell(ref, str(value), style, styles)
+
+    if date_format is not None:
+        style = style if style in styles.date_styles else styles.date_style(date_format)
+    elif style in styles.date_styles:
+        style = None  # A date format would turn the number into a date
+    s = f' s="{style}"' if style is not None else ''
+    return f'<c r="{ref}"{s}{kind}><v>{text}</v></c>'
+
+
+def _sheet_rows(df, header_styles, data_styles, styles):
+    """<row> elements of a frame (header row first)"""
+    letters = [get_column_letter(i + 1) for i in range(len(df.columns))]
+    header = ''.join(
+        _cell(f"{letter}1", column, header_styles.get(letter), styles)
+        for letter, column in zip(letters, df.columns))
+    yield f'<row r="1">{header}</row>'
+
+    column_styles = [data_styles.get(letter) for letter in letters]
+    for row_number, values in enumerate(df.itertuples(index=False, name=None), start=2):
+        cells = ''.join(
+            _cell(f"{letter}{row_number}", value, style, styles)
+            for letter, style, value in zip(letters, column_styles, values))
+        if cells:
+            yield f'<row r="{row_number}">{cells}</row>'
+
+
+def _dimension(df):
+    last_column = get_column_letter(max(len(df.columns), 1))
+    return f"A1:{last_column}{len(df) + 1}"
+
+
+def _new_sheet_xml():
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<worksheet xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><dimension ref="A1"/><sheetData/></worksheet>')
+
+
+# ============================================================================
+# PATCHING
+# ============================================================================
+
+class _Package:
+    """Workbook-level parts of an xlsx zip needed to find and add worksheets"""
+
+    def __init__(self, zin):
+        self.zin = zin
+        self.names = set(zin.namelist())
+        self.workbook_part = self._workbook_part()
+        self.parts = {}  # part name -> new bytes (only changed parts)
+        self.workbook_xml = zin.read(self.workbook_part).decode('utf-8')
+        self.rels_part = _rels_part(self.workbook_part)
+        self.rels_xml = zin.read(self.rels_part).decode('utf-8')
+        self.content_types = zin.read('[Content_Types].xml').decode('utf-8')
+        self.styles_part = self._related(self.workbook_part, self.rels_xml, '/styles')
+
+        targets = {attrs['Id']: attrs for attrs in map(_attributes, re.findall(r'<Relationship\b[^>]*>', self.rels_xml))}
+        self.sheets = {}  # name -> (part, position)
+        for position, tag in enumerate(re.findall(r'<sheet\b[^>]*>', self.workbook_xml)):
+            attrs = _attributes(tag)
+            rel = targets.get(attrs.get('r:id'))
+            if rel:
+                self.sheets[attrs['name']] = (_resolve(self.workbook_part, rel['Target']), position)
+
+    def _workbook_part(self):
+        rels = self.zin.read('_rels/.rels').decode('utf-8')
+        for attrs in map(_attributes, re.findall(r'<Relationship\b[^>]*>', rels)):
+            if attrs.get('Type', '').endswith('/officeDocument'):
+                return attrs['Target'].lstrip('/')
+        raise WorkbookPatchError("Not an xlsx workbook (no officeDocument relationship)")
+
+    @staticmethod
+    def _related(base_part, rels_xml, type_suffix):
+        for attrs in map(_attributes, re.findall(r'<Relationship\b[^>]*>', rels_xml)):
+            if attrs.get('Type', '').endswith(type_suffix):
+                return _resolve(base_part, attrs['Target'])
+        return None
+
+    def read(self, part):
+        return self.parts[part] if part in self.parts else self.zin.read(part)
+
+    def add_sheet(self, name):
+        """Register a new empty worksheet part; returns its part name"""
+        numbers = [int(n) for n in re.findall(r'worksheets/sheet(\d+)\.xml$', '\n'.join(self.names), re.M)]
+        part = posixpath.join(posixpath.dirname(self.workbook_part), 'worksheets', f"sheet{max(numbers, default=0) + 1}.xml")
+        rel_ids = [int(n) for n in re.findall(r'Id="rId(\d+)"', self.rels_xml)]
+        rel_id = f"rId{max(rel_ids, default=0) + 1}"
+        sheet_ids = [int(n) for n in re.findall(r'sheetId="(\d+)"', self.workbook_xml)]
+
+        target = posixpath.relpath(part, posixpath.dirname(self.workbook_part))
+        self.rels_xml = self.rels_xml.replace(
+            '</Relationships>', f'<Relationship Id="{rel_id}" Type="{WORKSHEET_TYPE}" Target="{target}"/></Relationships>')
+        sheet_tag = f'<sheet name="{_escape(name)}" sheetId="{max(sheet_ids, default=0) + 1}" r:id="{rel_id}"/>'
+        self.workbook_xml = self.workbook_xml.replace('</sheets>', sheet_tag + '</sheets>')
+        self.content_types = self.content_types.replace(
+            '</Types>', f'<Override PartName="/{part}" ContentType="{WORKSHEET_CONTENT_TYPE}"/></Types>')
+
+        self.parts[part] = _new_sheet_xml().encode('utf-8')
+        self.names.add(part)
+        self.sheets[name] = (part, len(self.sheets))
+        return part
+
+    def drop_calc_chain(self):
+        """Remove calcChain.xml (formula cells of patched sheets are gone; Excel rebuilds it)"""
+        if CALC_CHAIN_PART not in self.names:
+            return
+        self.names.discard(CALC_CHAIN_PART)
+        self.rels_xml = re.sub(r'<Relationship\b[^>]*calcChain[^>]*/>', '', self.rels_xml)
+        self.content_types = re.sub(r'<Override\b[^>]*calcChain[^>]*/>', '', self.content_types)
+
+    def set_filter_range(self, name, position, ref):
+        """Point the sheet's _FilterDatabase defined name (if any) at the new range"""
+        absolute = '$' + ref.replace(':', ':$')
+        absolute = re.sub(r'([A-Z]+)(\d+)', r'\1$\2', absolute)
+
+        def replace(match):
+            attrs = _attributes(match.group(1))
+            if attrs.get('name') != '_xlnm._FilterDatabase' or attrs.get('localSheetId') != str(position):
+                return match.group(0)
+            sheet_ref = "'" + name.replace("'", "''") + "'" if re.search(r'[^\w.]', name) else name
+            return f'{match.group(1)}{_escape(sheet_ref)}!{absolute}</definedName>'
+
+        self.workbook_xml = re.sub(r'(<definedName\b[^>]*>)[^<]*</definedName>', replace, self.workbook_xml)
+
+    def finish(self):
+        self.parts[self.workbook_part] = self.workbook_xml.encode('utf-8')
+        self.parts[self.rels_part] = self.rels_xml.encode('utf-8')
+        self.parts['[Content_Types].xml'] = self.content_types.encode('utf-8')
+
+
+def _patch_sheet(package, styles, part, df):
+    """New worksheet XML for `part` with the frame's cells"""
+    xml = package.read(part).decode('utf-8')
+    match = re.search(r'<sheetData\b[^>]*?(?:/>|>.*?</sheetData>)', xml, re.S)
+    if not match:
+        raise WorkbookPatchError(f"{part} has no sheetData")
+    old_data = match.group(0)
+    rows = ''.join(_sheet_rows(df, _row_styles(old_data, 1), _row_styles(old_data, 2), styles))
+
+    ref = _dimension(df)
+    before, after = xml[:match.start()], xml[match.end():]
+    if re.search(r'<dimension\b', before):
+        before = re.sub(r'<dimension\b[^>]*/>', f'<dimension ref="{ref}"/>', before)
+    after = re.sub(r'(<autoFilter\b[^>]*\bref=")[^"]*(")', rf'\g<1>{ref}\2', after)
+    package.parts[part] = (before + f'<sheetData>{rows}</sheetData>' + after).encode('utf-8')
+
+    # Tables on the sheet follow the new range and header
+    rels_part = _rels_part(part)
+    if rels_part in package.names:
+        rels_xml = package.read(rels_part).decode('utf-8')
+        for attrs in map(_attributes, re.findall(r'<Relationship\b[^>]*>', rels_xml)):
+            if attrs.get('Type') == TABLE_TYPE:
+                table_part = _resolve(part, attrs['Target'])
+                package.parts[table_part] = _patch_table(package.read(table_part).decode('utf-8'), df).encode('utf-8')
+    return ref
+
+
+def _patch_table(xml, df):
+    if len(df.columns) == 0:
+        raise WorkbookPatchError("A sheet with a table needs at least one column")
+    ref = f"A1:{get_column_letter(len(df.columns))}{max(len(df), 1) + 1}"
+    xml = re.sub(r'(<table\b[^>]*\bref=")[^"]*(")', rf'\g<1>{ref}\2', xml, count=1)
+    xml = re.sub(r'(<autoFilter\b[^>]*\bref=")[^"]*(")', rf'\g<1>{ref}\2', xml)
+    columns = ''.join(f'<tableColumn name="{_escape(str(column))}" id="{i}"/>'
+                      for i, column in enumerate(df.columns, start=1))
+    return re.sub(r'<tableColumns\b[^>]*>.*?</tableColumns>',
+                  f'<tableColumns count="{len(df.columns)}">{columns}</tableColumns>', xml, count=1, flags=re.S)
+
+
+def patch_sheets(workbook_path, sheets, output_path=None):
+    """
+    Replace the data of some sheets, copying every other workbook part unchanged.
+
+    Args:
+        workbook_path (str): Existing .xlsx workbook
+        sheets (dict): sheet name -> DataFrame (written like to_excel(index=False));
+            sheets that do not exist are added at the end
+        output_path (str): Where to write (default: replace workbook_path atomically)
+
+    Returns:
+        dict: sheet name -> written range (e.g. 'A1:G207')
+    """
+    output_path = output_path or workbook_path
+    temp_path = f"{output_path}.partial"
+    written = {}
+
+    try:
+        with zipfile.ZipFile(workbook_path) as zin:
+            package = _Package(zin)
+            styles = _Styles(zin.read(package.styles_part).decode('utf-8')) if package.styles_part else None
+            if styles is None:
+                raise WorkbookPatchError("Workbook has no styles part")
+
+            for name, df in sheets.items():
+                if len(str(name)) > 31:
+                    raise WorkbookPatchError(f"Sheet name too long for Excel: '{name}'")
+                part = package.sheets[name][0] if name in package.sheets else package.add_sheet(name)
+                written[name] = _patch_sheet(package, styles, part, df)
+                package.set_filter_range(name, package.sheets[name][1], written[name])
+
+            package.drop_calc_chain()
+            package.finish()
+            if styles.changed:
+                package.parts[package.styles_part] = styles.xml.encode('utf-8')
+
+            with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as zout:
+                for info in zin.infolist():
+                    if info.filename not in package.names:
+                        continue
+                    if info.filename in package.parts:
+                        zout.writestr(info, package.parts.pop(info.filename), compress_type=zipfile.ZIP_DEFLATED)
+                    else:
+                        zout.writestr(info, zin.read(info))  # Untouched part: same bytes, same zip entry
+                for part, data in package.parts.items():  # Added sheets
+                    zout.writestr(part, data)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replace one sheet of an xlsx workbook with the rows of a CSV file')
+    parser.add_argument('workbook', help='Workbook to patch in place')
+    parser.add_argument('sheet', help='Sheet to replace (added if missing)')
+    parser.add_argument('csv', help='CSV with the new sheet content (header row = columns)')
+    args = parser.parse_args()
+
+    start = time.time()
+    try:
+        df = pd.read_csv(args.csv)
+        written = patch_sheets(args.workbook, {args.sheet: df})
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    print(f"✅ {args.sheet}: {len(df):,} rows written ({written[args.sheet]}) in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()